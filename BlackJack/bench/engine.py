@@ -0,0 +1,52 @@
+"""Microbenchmark: rounds per second through the headless RoundEngine vs. the
+prompting Round.play (stdout discarded), both standing on 17 from one shoe."""
+import contextlib
+import io
+import timeit
+from game.deck import Shoe
+from game.player import Player, Dealer
+from game.blackjack import Round
+from game import engine as E
+
+
+def engine_rounds(shoe, n, seats=1):
+    engine = E.RoundEngine(shoe, Dealer())
+    players = [Player(f"p{i}") for i in range(seats)]
+    for _ in range(n):
+        shoe.shuffle_if_needed()
+        engine.start(players)
+        if engine.phase == E.INSURING:
+            engine.close_insurance()
+        while engine.phase == E.PLAYING:
+            p = engine.players[engine.turn]
+            engine.act(p, E.HIT if p.hand_value() < 17 else E.STAND)
+
+
+def prompted_rounds(shoe, n):
+    player = Player("p0")
+    rnd = Round(shoe, player, Dealer())
+
+    def answer(prompt):
+        return "n" if prompt.startswith("Insurance") else ("h" if player.hand_value() < 17 else "s")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(n):
+            shoe.shuffle_if_needed()
+            rnd.play(answer, lambda p: None, lambda d: None)
+
+
+def main(n=100_000, repeat=3):
+    results = {}
+    for name, run in (("Round.play", prompted_rounds), ("RoundEngine", engine_rounds)):
+        shoe = Shoe()
+        best = min(timeit.repeat(lambda: run(shoe, n), number=1, repeat=repeat))
+        results[name] = best
+        print(f"{name:>12}: {n / best:12,.0f} rounds/sec")
+    print(f"     speedup: {results['Round.play'] / results['RoundEngine']:.2f}x")
+    shoe = Shoe()
+    best = min(timeit.repeat(lambda: engine_rounds(shoe, n // 5, seats=5), number=1, repeat=repeat))
+    print(f"   5 seats: {n // 5 / best:12,.0f} rounds/sec ({n / best:,.0f} hands/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Microbenchmark: dealer play-out with running hand totals vs. rescanning the hand."""
+import timeit
+from game.deck import Shoe
+from game.player import Dealer
+
+
+class RescanDealer(Dealer):
+    """Dealer using the previous O(n) hand_value/_is_soft, for comparison."""
+    def hand_value(self):
+        value = sum(card.value for card in self.hand)
+        aces = sum(1 for card in self.hand if card.rank == "A")
+        while value > 21 and aces:
+            value -= 10
+            aces -= 1
+        return value
+
+    def is_busted(self):
+        return self.hand_value() > 21
+
+    def _is_soft(self):
+        aces = sum(1 for c in self.hand if c.rank == "A")
+        if not aces:
+            return False
+        min_value = sum((1 if c.rank == "A" else c.value) for c in self.hand)
+        return min_value + 10 <= 21
+
+
+def play_outs(dealer_cls, shoe, n):
+    dealer = dealer_cls()
+    for _ in range(n):
+        dealer.clear_hand()
+        shoe.shuffle_if_needed()
+        dealer.play_out(shoe)
+        dealer.is_busted()
+
+
+def main(n=200_000, repeat=5):
+    results = {}
+    for cls in (RescanDealer, Dealer):
+        shoe = Shoe()
+        best = min(timeit.repeat(lambda: play_outs(cls, shoe, n), number=1, repeat=repeat))
+        results[cls.__name__] = best
+        print(f"{cls.__name__:>13}: {n / best:12,.0f} play-outs/sec")
+    print(f"      speedup: {results['RescanDealer'] / results['Dealer']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""Load generator: N scripted bots against a local server, results as JSON.
+
+    python -m bench.loadgen --engine asyncio --bots 50 --duration 30 --out results.json
+
+By default a server is started as a subprocess (so bots and server don't share
+a GIL) with a zero countdown; --engine external targets one already running.
+Measured: connect latency (connect to NAME), PING round trip, action to the
+server's ACTION broadcast, and rounds/hands per second.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from game.deck import CARDS
+from network import protocol as P
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+# --- policies: (my hand value, dealer upcard value or 0) -> "HIT" / "STAND" ---
+
+def stand_policy(value, up):
+    return "STAND"
+
+def dealer_policy(value, up):
+    return "HIT" if value < 17 else "STAND"
+
+def basic_policy(value, up):
+    if value <= 11:
+        return "HIT"
+    if value >= 17:
+        return "STAND"
+    if value == 12:
+        return "HIT" if up not in (4, 5, 6) else "STAND"
+    return "HIT" if up >= 7 or up == 11 else "STAND"
+
+def random_policy(value, up):
+    return random.choice(("HIT", "STAND")) if value < 21 else "STAND"
+
+POLICIES = {"stand": stand_policy, "dealer": dealer_policy, "basic": basic_policy, "random": random_policy}
+
+def load_policy(spec):
+    """A built-in policy name, or "module:function" for a custom one."""
+    if spec in POLICIES:
+        return POLICIES[spec]
+    module, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module), attr)
+
+
+def summarize(samples):
+    """Latency summary in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    s = sorted(samples)
+    pick = lambda q: round(s[min(len(s) - 1, int(q * len(s)))] * 1000, 3)
+    return {"count": len(s), "mean": round(sum(s) / len(s) * 1000, 3), "p50": pick(0.5),
+            "p90": pick(0.9), "p99": pick(0.99), "max": round(s[-1] * 1000, 3)}
+
+
+class Stats:
+    def __init__(self):
+        self.connect = []
+        self.ping = []
+        self.action = []
+        self.rounds = 0.0
+        self.hands = 0
+        self.messages = 0
+        self.errors = 0
+
+
+class Bot:
+    """One lean asyncio client that plays whenever its turn comes up."""
+    def __init__(self, name, host, port, policy, stats: Stats, binary=True, ping_interval=1.0):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.policy = policy
+        self.stats = stats
+        self.binary = binary
+        self.ping_interval = ping_interval
+        self.reader = self.writer = None
+        self.my_turn = False
+        self.value = 0
+        self.upcard = 0
+        self.pending_action = None
+        self.pings = []
+        self.round_results = 0
+        self.seated = False
+
+    async def run(self, stop: asyncio.Event):
+        started = time.perf_counter()
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        hello = f"{P.BINARY_HELLO} {self.name}" if self.binary else self.name
+        self.writer.write((hello + "\n").encode())
+        ping_task = None
+        try:
+            while not stop.is_set():
+                msg = await self.read()
+                if msg is None:
+                    break
+                self.stats.messages += 1
+                if msg[0] == P.NAME:
+                    self.name = msg[1]
+                    self.stats.connect.append(time.perf_counter() - started)
+                    ping_task = asyncio.get_running_loop().create_task(self.ping_loop(stop))
+                self.on_message(msg)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.stats.errors += 1
+        finally:
+            if ping_task:
+                ping_task.cancel()
+            self.writer.close()
+
+    async def read(self):
+        if self.binary:
+            (n,) = struct.unpack(">H", await self.reader.readexactly(2))
+            return P.from_frame(await self.reader.readexactly(n))
+        line = await self.reader.readline()
+        return P.parse_text(line.decode(errors="ignore").rstrip("\r\n")) if line else None
+
+    def send(self, word):
+        data = P.to_frame(P.command(word)) if self.binary else (word + "\n").encode()
+        self.writer.write(data)
+
+    async def ping_loop(self, stop):
+        while not stop.is_set():
+            self.pings.append(time.perf_counter())
+            self.send("PING")
+            await asyncio.sleep(self.ping_interval)
+
+    def act(self):
+        if self.value >= 21:
+            return
+        self.pending_action = time.perf_counter()
+        self.send(self.policy(self.value, self.upcard))
+
+    def on_message(self, msg):
+        t = msg[0]
+        if t == P.PING:
+            if self.pings:
+                self.stats.ping.append(time.perf_counter() - self.pings.pop(0))
+        elif t == P.STATE_PLAYER and msg[1] == self.name:
+            self.value = msg[3]
+        elif t == P.STATE_DEALER:
+            self.upcard = CARDS[msg[2][0]].value if msg[2] else 0
+        elif t == P.TURN:
+            self.my_turn = msg[1] == self.name
+            if self.my_turn:
+                self.act()
+        elif t == P.DELTA:
+            _, _, kind, name, _, value = msg
+            if kind == P.D_TURN:
+                self.my_turn = name == self.name
+                if self.my_turn:
+                    self.act()
+            elif kind == P.D_CARD and name == self.name:
+                self.value = value
+                if self.my_turn and self.pending_action is None:
+                    self.act()
+        elif t == P.ACTION and msg[1] == P.ACT_INSURANCE:
+            self.send("DECLINE")
+        elif t == P.ACTION and msg[2] == self.name:
+            if self.pending_action is not None and msg[1] in (P.ACT_HIT, P.ACT_STAND):
+                self.stats.action.append(time.perf_counter() - self.pending_action)
+                self.pending_action = None
+        elif t == P.RESULT:
+            self.round_results += 1
+            if msg[1] == self.name:
+                self.stats.hands += 1
+                self.seated = True
+        elif t == P.ROUND_END:
+            # Every seated bot sees the round end; each counts its share of it.
+            if self.seated:
+                self.stats.rounds += 1 / self.round_results
+            self.round_results = 0
+            self.seated = False
+            self.value = 0
+            self.my_turn = False
+            self.pending_action = None
+        elif t == P.ERROR:
+            self.stats.errors += 1
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(engine, port, turn_timeout, ledger, workers=None, countdown=0):
+    cmd = [sys.executable, MAIN, "--mode", "server", "--engine", engine, "--host", "127.0.0.1",
+           "--port", str(port), "--countdown", str(countdown), "--turn-timeout", str(turn_timeout), "--ledger", ledger,
+           "--history", os.path.join(ledger, "rounds.bjh")]
+    if engine == "cluster":
+        cmd += ["--control", os.path.join(ledger, "cluster.sock")]
+        if workers:
+            cmd += ["--workers", str(workers)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f"{engine} server did not start on port {port}")
+
+
+async def run_load(host, port, bots, duration, policy, binary=True, ping_interval=1.0, ramp=0.0):
+    stats = Stats()
+    stop = asyncio.Event()
+    tasks = []
+    for i in range(bots):
+        bot = Bot(f"bot{i}", host, port, policy, stats, binary, ping_interval)
+        tasks.append(asyncio.create_task(bot.run(stop)))
+        if ramp:
+            await asyncio.sleep(ramp / bots)
+    # The first measurement window starts once everyone has had a chance to seat.
+    await asyncio.sleep(0.5)
+    rounds0, hands0 = stats.rounds, stats.hands
+    started = time.perf_counter()
+    await asyncio.sleep(duration)
+    elapsed = time.perf_counter() - started
+    rounds, hands = stats.rounds - rounds0, stats.hands - hands0
+    stop.set()
+    for t in tasks:
+        t.cancel()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    stats.errors += sum(1 for r in results if isinstance(r, OSError))
+    return {"connect_ms": summarize(stats.connect), "ping_rtt_ms": summarize(stats.ping),
+            "action_to_broadcast_ms": summarize(stats.action), "rounds": round(rounds, 2),
+            "rounds_per_sec": round(rounds / elapsed, 3), "hands_per_sec": round(hands / elapsed, 3),
+            "messages": stats.messages, "errors": stats.errors, "elapsed": round(elapsed, 3)}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Blackjack server load generator.")
+    ap.add_argument("--engine", choices=["thread", "asyncio", "cluster", "external"], default="asyncio",
+                    help="Server to start locally, or 'external' to use --host/--port as is.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, help="Port (default: a free one, or 5555 for external).")
+    ap.add_argument("--bots", type=int, default=20)
+    ap.add_argument("--duration", type=float, default=10.0, help="Seconds to measure.")
+    ap.add_argument("--policy", default="basic", help="stand, dealer, basic, random or module:function.")
+    ap.add_argument("--text", action="store_true", help="Use the text protocol instead of binary frames.")
+    ap.add_argument("--ping-interval", type=float, default=1.0)
+    ap.add_argument("--ramp", type=float, default=0.0, help="Seconds over which to spread connects.")
+    ap.add_argument("--turn-timeout", type=float, default=5.0, help="Turn deadline for a started server.")
+    ap.add_argument("--workers", type=int, help="Worker processes for a started cluster (default: all cores).")
+    ap.add_argument("--out", help="Write results JSON here (default: stdout only).")
+    args = ap.parse_args(argv)
+
+    proc = None
+    port = args.port or (5555 if args.engine == "external" else free_port())
+    with tempfile.TemporaryDirectory() as ledger:
+        if args.engine != "external":
+            proc = start_server(args.engine, port, args.turn_timeout, ledger, args.workers)
+        try:
+            results = asyncio.run(run_load(args.host, port, args.bots, args.duration, load_policy(args.policy),
+                                           not args.text, args.ping_interval, args.ramp))
+        finally:
+            if proc:
+                proc.terminate()
+                proc.wait()
+    report = {"engine": args.engine, "bots": args.bots, "policy": args.policy,
+              "protocol": "text" if args.text else "binary", "duration": args.duration, **results}
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 # game/blackjack.py
 from game.player import Player, Dealer
 from game.deck import Deck
+from game import engine as E
+from game.engine import RoundEngine, evaluate_player_outcome, payout, insurance_payout
 
 class Round:
     """Encapsulate a single player vs dealer round."""
@@ -37,10 +39,14 @@ class Round:
         if not self.player.is_busted():
             self.dealer.play_out(self.deck)
 
-    def determine_winner(self):
-        pv = self.player.hand_value()
+    def determine_winner(self, hand=None):
+        """Result for one of the player's hands (by default the active one)."""
+        h = hand if hand is not None else self.player.active
+        pv = h.hand_value()
         dv = self.dealer.hand_value()
-        if self.player.is_busted():
+        if h.surrendered:
+            return "Surrender"
+        if h.is_busted():
             return "Dealer"
         if self.dealer.is_busted():
             return "Player"
@@ -50,61 +56,60 @@ class Round:
             return "Dealer"
         return "Push"
 
-    def play(self, input_func=input, show_player_fn=print, show_dealer_hidden_fn=lambda d: print(f"Dealer: {d.hand[0]}, Hidden")):
-        self.deal_initial()
-
-        if self.player.hand_value() == 21 or self.dealer.hand_value() == 21:
-            show_player_fn(self.player)
-            print("Dealer (before play):", ", ".join(str(c) for c in self.dealer.hand), f"(Value: {self.dealer.hand_value()})")
-            print("\n--- Reveal ---")
-            return self.determine_winner()
-
-        player_got_21 = False
+    def choices(self):
+        """The decisions open on the active hand, as (key, word) pairs."""
+        p = self.player
+        options = [("h", "Hit"), ("s", "Stand")]
+        if p.can_double():
+            options.append(("d", "Double"))
+        if p.can_split():
+            options.append(("p", "sPlit"))
+        if p.can_surrender():
+            options.append(("r", "suRrender"))
+        return options
 
+    def play(self, input_func=input, show_player_fn=print, show_dealer_hidden_fn=lambda d: print(f"Dealer: {d.hand[0]}, Hidden")):
+        """Play one round, prompting for each decision; returns the result of each
+        of the player's hands. The rules are RoundEngine's; this only does I/O."""
+        player, dealer = self.player, self.dealer
+        engine = RoundEngine(self.deck, dealer)
+        events = engine.start([player])
         while True:
-            show_player_fn(self.player)
-            show_dealer_hidden_fn(self.dealer)
-
-            if self.player.is_busted():
-                print("You busted!")
+            for ev in events:
+                self.show(ev, show_player_fn)
+            if not engine.in_round:
                 break
-
-            choice = input_func("Hit or Stand? (h/s): ").strip().lower()
-
-            if choice.startswith("h"):
-                self.player.add_card(self.deck.deal())
-
-                if self.player.hand_value() == 21:
-                    player_got_21 = True
-                    print("Player hit 21!")
-                    break
-
+            show_player_fn(player)
+            show_dealer_hidden_fn(dealer)
+            if engine.phase == E.INSURING:
+                events = engine.insure(player, input_func("Insurance? (y/n): ").strip().lower().startswith("y"))
                 continue
-            if choice.startswith("s"):
-                break
-
-        print("\n--- Reveal ---")
-        show_player_fn(self.player)
-        print("Dealer (before play):", ", ".join(str(c) for c in self.dealer.hand), f"(Value: {self.dealer.hand_value()})")
-
-        if not self.player.is_busted() and not player_got_21:
-            self.dealer.play_out(self.deck)
-
-        print("Dealer (final):", ", ".join(str(c) for c in self.dealer.hand), f"(Value: {self.dealer.hand_value()})")
-        return self.determine_winner()
+            options = self.choices()
+            if len(options) == 2:
+                prompt = "Hit or Stand? (h/s): "
+            else:
+                prompt = f"{', '.join(w for _, w in options)}? ({'/'.join(k for k, _ in options)}): "
+            choice = input_func(prompt).strip().lower()[:1]
+            events = engine.act(player, _KEYS[choice]) if choice in dict(options) else []
+        return [self.determine_winner(h) for h in player.hands]
+
+    def show(self, ev, show_player_fn=print):
+        """Print what a round event means to the player at the terminal."""
+        kind, dealer = ev[0], self.dealer
+        if kind == E.BUST:
+            print("You busted!")
+        elif kind == E.BLACKJACK:
+            print("Player hit 21!")
+        elif kind == E.REVEAL:
+            print("\n--- Reveal ---")
+            show_player_fn(self.player)
+            print("Dealer (before play):", ", ".join(str(c) for c in dealer.hand[:2]), f"(Value: {ev[2]})")
+        elif kind == E.SETTLE:
+            print("Dealer (final):", ", ".join(str(c) for c in dealer.hand), f"(Value: {dealer.hand_value()})")
+            if self.player.insurance:
+                print("Insurance pays 2:1." if dealer.is_natural() else "Insurance lost.")
 
-def evaluate_player_outcome(player, dealer):
-    pv = player.hand_value()
-    dv = dealer.hand_value()
-    if player.is_busted():
-        return "LOSE"
-    if dealer.is_busted():
-        return "WIN"
-    if pv > dv:
-        return "WIN"
-    if pv == dv:
-        return "PUSH"
-    return "LOSE"
+_KEYS = {"h": E.HIT, "s": E.STAND, "d": E.DOUBLE, "p": E.SPLIT, "r": E.SURRENDER}
 
 if __name__ == "__main__":
     deck = Deck()
@@ -114,10 +119,12 @@ if __name__ == "__main__":
     player = Player("Player")
     rnd = Round(deck, player, Dealer())
 
-    result = rnd.play()
-    if result == "Player":
-        print("Player wins!")
-    elif result == "Dealer":
-        print("Dealer wins!")
-    else:
-        print("Push (tie).")
\ No newline at end of file
+    for result in rnd.play():
+        if result == "Player":
+            print("Player wins!")
+        elif result == "Dealer":
+            print("Dealer wins!")
+        elif result == "Surrender":
+            print("Surrendered (half the bet back).")
+        else:
+            print("Push (tie).")
\ No newline at end of file
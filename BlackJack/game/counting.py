@@ -0,0 +1,130 @@
+"""Shoe composition and card counting, kept up to date one card at a time.
+
+A CompositionTracker handed to a Deck or Shoe is told about every card as it
+is dealt and is reset on every shuffle. It keeps the remaining count of each
+rank class (the same 10-slot layout as game.dealer_odds, so composition()
+can go straight to the EV engine) and a running count for each counting
+system it was asked for. Every query is a lookup or a division; nothing
+rescans the cards.
+
+Tags are per rank class: A, 2, 3, 4, 5, 6, 7, 8, 9, ten-valued.
+"""
+from game.dealer_odds import RANK_CLASSES, full_shoe, rank_class
+from game.deck import CARDS, Card, Deck
+
+
+class CountingSystem:
+    """A card-counting tag set. Unbalanced systems (tags over a deck do not sum
+    to zero) start from an initial running count so that zero is the pivot."""
+    __slots__ = ("name", "tags", "bias")
+
+    def __init__(self, name, tags):
+        if len(tags) != RANK_CLASSES:
+            raise ValueError(f"{name}: need {RANK_CLASSES} tags, got {len(tags)}.")
+        self.name = name
+        self.tags = tuple(tags)
+        self.bias = sum(t * n for t, n in zip(self.tags, full_shoe(1)))    # tag sum over one deck
+
+    @property
+    def balanced(self):
+        return self.bias == 0
+
+    def initial_count(self, decks):
+        """Running count off the top of a fresh shoe (KO: -4 per deck after the first)."""
+        return -self.bias * (decks - 1)
+
+    def __repr__(self):
+        return f"CountingSystem({self.name!r}, {self.tags})"
+
+
+#                                 A   2   3   4   5   6   7   8   9   T
+HI_LO = CountingSystem("hi-lo",   (-1, 1,  1,  1,  1,  1,  0,  0,  0, -1))
+KO = CountingSystem("ko",         (-1, 1,  1,  1,  1,  1,  1,  0,  0, -1))
+OMEGA_II = CountingSystem("omega-ii", (0, 1, 1,  2,  2,  2,  1,  0, -1, -2))
+
+SYSTEMS = {s.name: s for s in (HI_LO, KO, OMEGA_II)}
+
+_CLASS = {card: rank_class(card) for card in CARDS}
+_RANK_CLASS = {r: rank_class(Card("", r)) for r in Deck.ranks}
+
+
+class CompositionTracker:
+    """Remaining cards and running counts for a shoe of `decks` decks.
+
+    systems are names from SYSTEMS or CountingSystem objects; the first is the
+    default for running() and true_count().
+    """
+    def __init__(self, decks=1, systems=("hi-lo", "ko", "omega-ii")):
+        self.decks = decks
+        self.systems = tuple(SYSTEMS[s] if isinstance(s, str) else s for s in systems)
+        if not self.systems:
+            raise ValueError("Track at least one counting system.")
+        self._index = {s.name: i for i, s in enumerate(self.systems)}
+        # Per card: its rank class and its tag in every tracked system, so seen() is one lookup.
+        self._by_card = {card: (c, tuple(s.tags[c] for s in self.systems)) for card, c in _CLASS.items()}
+        self._full = full_shoe(decks)
+        self.total = sum(self._full)
+        self.reset()
+
+    def reset(self):
+        """A freshly shuffled shoe."""
+        self.counts = list(self._full)
+        self.left = self.total
+        self._running = [s.initial_count(self.decks) for s in self.systems]
+
+    def seen(self, card):
+        """Take one dealt card out of the shoe."""
+        c, tags = self._by_card[card]
+        self.counts[c] -= 1
+        self.left -= 1
+        running = self._running
+        for i, tag in enumerate(tags):
+            running[i] += tag
+
+    # --- queries ---
+
+    def remaining(self, rank):
+        """Cards left of a rank ("A", "7", "K" ...; every ten-valued rank counts together)."""
+        return self.counts[_RANK_CLASS[rank]]
+
+    def composition(self):
+        """Remaining counts by rank class, as StrategyEngine and dealer_odds take them."""
+        return tuple(self.counts)
+
+    @property
+    def dealt(self):
+        return self.total - self.left
+
+    @property
+    def decks_remaining(self):
+        return self.left / 52
+
+    def running(self, system=None):
+        return self._running[self._slot(system)]
+
+    def true_count(self, system=None):
+        """Running count per deck left to play.
+
+        For an unbalanced system the drift its bias adds as cards come out is
+        taken off first, so every system's true count is centred on zero.
+        """
+        i = self._slot(system)
+        s = self.systems[i]
+        drift = s.initial_count(self.decks) + s.bias * self.dealt / 52
+        if not self.left:
+            return 0.0
+        return (self._running[i] - drift) / self.decks_remaining
+
+    def _slot(self, system):
+        if system is None:
+            return 0
+        try:
+            return self._index[system if isinstance(system, str) else system.name]
+        except KeyError:
+            raise ValueError(f"{system!r} is not tracked here; tracking "
+                             f"{', '.join(self._index)}.") from None
+
+    def __str__(self):
+        counts = " ".join(f"{s.name}={self._running[i]:+d}/{self.true_count(s.name):+.2f}"
+                          for i, s in enumerate(self.systems))
+        return f"{self.left} cards left ({self.decks_remaining:.2f} decks): {counts}"
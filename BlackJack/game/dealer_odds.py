@@ -0,0 +1,138 @@
+import json
+import os
+from game.deck import Card, Deck
+
+# Shoe compositions are tuples of 10 counts indexed by rank class:
+# 0 = Ace, 1..8 = 2..9, 9 = any ten-valued card (10, J, Q, K).
+RANK_CLASSES = 10
+TEN = 9
+
+# Dealer final outcomes, in the order probability tuples are stored.
+OUTCOMES = ("17", "18", "19", "20", "21", "blackjack", "bust")
+_BUST = OUTCOMES.index("bust")
+_BLACKJACK = OUTCOMES.index("blackjack")
+
+
+def rank_class(card: Card) -> int:
+    """Map a Card to its composition index."""
+    if card.rank == "A":
+        return 0
+    return min(card.value, 10) - 1
+
+
+def full_shoe(decks=1):
+    """Composition of `decks` fresh decks."""
+    per_deck = [0] * RANK_CLASSES
+    for r in Deck.ranks:
+        per_deck[rank_class(Card("", r))] += len(Deck.suits)
+    return tuple(n * decks for n in per_deck)
+
+
+def _total(hard, aces):
+    if aces and hard + 10 <= 21:
+        return hard + 10, True
+    return hard, False
+
+
+def dealer_outcomes(up, comp, hit_on_soft_17=True, memo=None):
+    """Outcome probabilities for upcard class `up` with `comp` left to draw from.
+
+    `comp` must already exclude the upcard (and any other cards known to be out).
+    """
+    return _finish(up + 1, int(up == 0), 1, comp, hit_on_soft_17, {} if memo is None else memo)
+
+
+def _finish(hard, aces, ncards, comp, h17, memo):
+    total, soft = _total(hard, aces)
+    if total > 21:
+        return tuple(1.0 if i == _BUST else 0.0 for i in range(len(OUTCOMES)))
+    if ncards >= 2 and (total > 17 or (total == 17 and not (soft and h17))):
+        idx = _BLACKJACK if (ncards == 2 and total == 21) else total - 17
+        return tuple(1.0 if i == idx else 0.0 for i in range(len(OUTCOMES)))
+
+    key = (hard, bool(aces), ncards == 1, comp)
+    hit = memo.get(key)
+    if hit is not None:
+        return hit
+
+    remaining = sum(comp)
+    acc = [0.0] * len(OUTCOMES)
+    for c, count in enumerate(comp):
+        if not count:
+            continue
+        nxt = list(comp)
+        nxt[c] -= 1
+        sub = _finish(hard + c + 1, aces + (c == 0), ncards + 1, tuple(nxt), h17, memo)
+        w = count / remaining
+        for i, p in enumerate(sub):
+            acc[i] += w * p
+    result = tuple(acc)
+    memo[key] = result
+    return result
+
+
+class DealerOdds:
+    """Exact dealer finishing probabilities per upcard for one shoe and rule set.
+
+    The upcard is removed from the shoe, the hole card and any hits are drawn
+    without replacement, and the dealer follows Dealer.should_hit. Results are
+    computed once with a memoized recursion and then looked up per upcard.
+    A two-card 21 is reported as "blackjack" rather than "21".
+    """
+    def __init__(self, composition=None, hit_on_soft_17=True, tables=None):
+        self.composition = tuple(composition or full_shoe(6))
+        self.hit_on_soft_17 = hit_on_soft_17
+        self.tables = tables or [self._compute(up) for up in range(RANK_CLASSES)]
+
+    def probabilities(self, upcard) -> dict:
+        """Return {outcome: probability} for an upcard (Card or rank class)."""
+        idx = upcard if isinstance(upcard, int) else rank_class(upcard)
+        return dict(zip(OUTCOMES, self.tables[idx]))
+
+    def bust_probability(self, upcard) -> float:
+        return self.probabilities(upcard)["bust"]
+
+    def _compute(self, up):
+        comp = list(self.composition)
+        if not comp[up]:
+            return (0.0,) * len(OUTCOMES)
+        comp[up] -= 1
+        return dealer_outcomes(up, tuple(comp), self.hit_on_soft_17)
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"composition": self.composition,
+                       "hit_on_soft_17": self.hit_on_soft_17,
+                       "tables": self.tables}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["composition"], data["hit_on_soft_17"],
+                   [tuple(t) for t in data["tables"]])
+
+
+_cache = {}
+
+def dealer_odds(composition=None, hit_on_soft_17=True, path=None) -> DealerOdds:
+    """Return DealerOdds for a shoe and rule set, reusing earlier results.
+
+    With `path`, tables are loaded from that file when it matches the request and
+    written there after computing otherwise.
+    """
+    composition = tuple(composition or full_shoe(6))
+    key = (composition, hit_on_soft_17)
+    odds = _cache.get(key)
+    if odds is not None:
+        return odds
+    if path and os.path.exists(path):
+        odds = DealerOdds.load(path)
+        if (odds.composition, odds.hit_on_soft_17) != key:
+            odds = None
+    if odds is None:
+        odds = DealerOdds(composition, hit_on_soft_17)
+        if path:
+            odds.save(path)
+    _cache[key] = odds
+    return odds
@@ -23,21 +23,84 @@ class Deck:
     suits = ["Hearts", "Diamonds", "Clubs", "Spades"]
     ranks = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"]
 
-    def __init__(self):
-        self.cards = [Card(s, r) for s in Deck.suits for r in Deck.ranks]
+    def __init__(self, rng=None, tracker=None):
+        """rng: anything with a shuffle(seq) method (see game.rng); by default a
+        random.Random of this deck's own. tracker: an optional
+        game.counting.CompositionTracker told about every card dealt."""
+        self.rng = rng if rng is not None else random.Random()
+        self.tracker = tracker
+        self.cards = list(CARDS)
         self.shuffle()
 
     def shuffle(self):
-        random.shuffle(self.cards)
+        self.rng.shuffle(self.cards)
+        if self.tracker is not None:
+            self.tracker.reset()
 
     def deal(self):
         if not self.cards:
             print("Deck empty — reshuffling a new one!")
-            self.__init__()
-        return self.cards.pop()
+            self.__init__(self.rng, self.tracker)
+        card = self.cards.pop()
+        if self.tracker is not None:
+            self.tracker.seen(card)
+        return card
 
     def __len__(self):
         return len(self.cards)
-    
 
 
+# One shared Card per suit/rank; decks and shoes hand these out instead of allocating.
+CARDS = tuple(Card(s, r) for s in Deck.suits for r in Deck.ranks)
+
+
+class Shoe:
+    """A 1-8 deck shoe stored as one byte per card and dealt by advancing a cursor.
+
+    The shoe is only reshuffled (in place) once the cursor has passed the cut card,
+    which sits at `penetration` of the way through the shoe. Shuffles use `rng`
+    and dealt cards are reported to `tracker` as in Deck.
+    """
+    def __init__(self, decks=6, penetration=0.75, rng=None, tracker=None):
+        if not 1 <= decks <= 8:
+            raise ValueError("A shoe holds between 1 and 8 decks.")
+        if not 0 < penetration <= 1:
+            raise ValueError("Penetration must be in (0, 1].")
+        self.decks = decks
+        if tracker is not None and tracker.decks != decks:
+            raise ValueError(f"The tracker counts {tracker.decks} decks, the shoe holds {decks}.")
+        self.rng = rng if rng is not None else random.Random()
+        self.tracker = tracker
+        self.codes = bytearray(range(len(CARDS))) * decks
+        self.cut = max(1, int(len(self.codes) * penetration))
+        self.cursor = 0
+        self.shuffle()
+
+    def shuffle(self):
+        self.rng.shuffle(self.codes)
+        self.cursor = 0
+        if self.tracker is not None:
+            self.tracker.reset()
+
+    @property
+    def needs_shuffle(self):
+        return self.cursor >= self.cut
+
+    def shuffle_if_needed(self):
+        """Reshuffle if the cut card has come out; call between rounds."""
+        if self.needs_shuffle:
+            self.shuffle()
+            return True
+        return False
+
+    def deal(self):
+        if self.cursor >= len(self.codes):
+            self.shuffle()
+        card = CARDS[self.codes[self.cursor]]
+        self.cursor += 1
+        if self.tracker is not None:
+            self.tracker.seen(card)
+        return card
+
+    def __len__(self):
+        return len(self.codes) - self.cursor
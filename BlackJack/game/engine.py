@@ -0,0 +1,325 @@
+"""The round rules as a state machine with no I/O.
+
+A RoundEngine deals from a deck to a list of seated Players and a Dealer.
+Every call -- start(), act(), insure(), close_insurance(), leave() --
+applies one input and returns the events it caused, in order. It never
+prints, prompts, sleeps or touches a socket. The text UI, the servers and
+history replay all drive the same engine, and a batch job can step it as
+fast as Python will go.
+
+Events are tuples whose first item is the event kind:
+
+    (DEAL,)                         initial two cards each are out
+    (INSURANCE,)                    dealer shows an ace: insure() / close_insurance()
+    (INSURED, player)
+    (TURN, player, hand)            hand index now to act
+    (HIT, player, hand, card, value)  also DOUBLE; (CARD, ...) is a card dealt
+                                    to a split hand without an action
+    (SPLIT, player, hand, card, new)  card moved from hand to the new hand
+    (STAND | TIMEOUT | SURRENDER | BLACKJACK | BUST, player, hand)
+    (DEALER,)                       players are done; dealer's turn
+    (REVEAL, card, value)           the hole card is turned over
+    (DEALER_HIT, card, value)
+    (SETTLE,)                       round over; see `results`
+    (ABORT,)                        everyone left mid-round
+
+In HIT, DOUBLE, CARD, REVEAL and DEALER_HIT, value is the hand's total once
+that card is in it.
+
+Actions use the codes the history log stores (HIT .. INSURE).
+"""
+from game.player import Player, Dealer
+
+# Player actions (their values are the history log's action codes).
+ACTIONS = ("HIT", "STAND", "TIMEOUT", "LEAVE", "DOUBLE", "SPLIT", "SURRENDER", "INSURE")
+HIT, STAND, TIMEOUT, LEAVE, DOUBLE, SPLIT, SURRENDER, INSURE = range(8)
+
+# Events that are not actions.
+DEAL, INSURANCE, INSURED, TURN, CARD, BLACKJACK, BUST, DEALER, REVEAL, DEALER_HIT, SETTLE, ABORT = range(8, 20)
+
+# Phases.
+IDLE, INSURING, PLAYING = range(3)
+
+
+def evaluate_player_outcome(player, dealer):
+    """Outcome of a hand (a Hand, or a Player's active hand) against the dealer."""
+    pv = player.hand_value()
+    dv = dealer.hand_value()
+    if getattr(player, "surrendered", False):
+        return "SURRENDER"
+    if player.is_busted():
+        return "LOSE"
+    if dealer.is_busted():
+        return "WIN"
+    if pv > dv:
+        return "WIN"
+    if pv == dv:
+        return "PUSH"
+    return "LOSE"
+
+def payout(player, dealer, outcome=None):
+    """Chips returned for a hand's bet: the stake back on a push, half of it on a
+    surrender, twice the stake on a win, and 3:2 on top of the stake for a
+    natural blackjack."""
+    outcome = outcome or evaluate_player_outcome(player, dealer)
+    if outcome == "PUSH":
+        return player.bet
+    if outcome == "SURRENDER":
+        return player.bet // 2
+    if outcome != "WIN":
+        return 0
+    if player.is_natural():
+        return player.bet + player.bet * 3 // 2
+    return player.bet * 2
+
+def insurance_payout(player, dealer):
+    """Insurance returns its stake plus 2:1 if the dealer has a natural."""
+    return player.insurance * 3 if player.insurance and dealer.is_natural() else 0
+
+
+class IllegalAction(ValueError):
+    """An action that the rules do not allow at this point in the round."""
+
+
+class RoundEngine:
+    """One table's round in progress.
+
+    `recorder` (a history.RoundRecorder, or anything with its methods) is
+    told about every card and decision. `results`, after SETTLE, lists
+    (player, outcome names, payouts, insurance payout) for each seat.
+    """
+    def __init__(self, deck, dealer: Dealer = None, recorder=None):
+        self.deck = deck
+        self.dealer = dealer if dealer is not None else Dealer()
+        self.recorder = recorder
+        self.players = []
+        self.phase = IDLE
+        self.turn = -1
+        self.pending = set()       # seats yet to answer the insurance offer
+        self.results = []
+        self._events = []
+
+    # --- queries ---
+
+    @property
+    def in_round(self):
+        return self.phase != IDLE
+
+    def current(self):
+        """The player whose turn it is, or None."""
+        if self.phase == PLAYING and 0 <= self.turn < len(self.players):
+            return self.players[self.turn]
+        return None
+
+    def check(self, player, kind):
+        """Why `player` may not take action `kind` now, or None if they may."""
+        if kind == INSURE:
+            if self.phase != INSURING or player not in self.pending:
+                return "Insurance is not on offer."
+            return None
+        if self.current() is not player:
+            return "It is not your turn."
+        if kind == DOUBLE and not player.can_double():
+            return "You can only double on two cards."
+        if kind == SPLIT and not player.can_split():
+            return f"You can only split a pair, into at most {Player.MAX_HANDS} hands."
+        if kind == SURRENDER and not player.can_surrender():
+            return "You can only surrender your first two cards."
+        return None
+
+    # --- inputs ---
+
+    def start(self, players, stakes=None, round_no=0):
+        """Clear the table and deal a round to players (in seat order).
+
+        stakes maps Player -> the bet already taken for them.
+        """
+        events = self._begin()
+        self.players = list(players)
+        self.results = []
+        dealer = self.dealer
+        dealer.clear_hand()
+        for p in self.players:
+            p.clear_hand()
+            if stakes:
+                p.bet = stakes.get(p, 0)
+        if self.recorder is not None:
+            self.recorder.start(round_no, self.players)
+        for _ in range(2):
+            for p in self.players:
+                p.add_card(self._deal())
+            dealer.add_card(self._deal())
+        events.append((DEAL,))
+        if dealer.hand[0].rank == "A":
+            self.phase = INSURING
+            self.pending = set(self.players)
+            events.append((INSURANCE,))
+        else:
+            self._check_naturals()
+        return events
+
+    def insure(self, player, take=True):
+        """Answer the insurance offer for player (insuring half their stake if take)."""
+        events = self._begin()
+        err = self.check(player, INSURE)
+        if err:
+            raise IllegalAction(err)
+        if take:
+            player.insurance = player.bet // 2
+            if self.recorder is not None:
+                self.recorder.act(player, INSURE)
+            events.append((INSURED, player))
+        self.pending.discard(player)
+        if not self.pending:
+            self._close_insurance()
+        return events
+
+    def close_insurance(self):
+        """End the insurance offer (it timed out); anyone who has not answered declined."""
+        events = self._begin()
+        if self.phase == INSURING:
+            self._close_insurance()
+        return events
+
+    def act(self, player, kind):
+        """Apply a turn decision (HIT, STAND, DOUBLE, SPLIT, SURRENDER or TIMEOUT)."""
+        events = self._begin()
+        if kind not in (HIT, STAND, DOUBLE, SPLIT, SURRENDER, TIMEOUT):
+            raise IllegalAction(f"{kind!r} is not a turn action.")
+        err = self.check(player, kind)
+        if err:
+            raise IllegalAction(err)
+        if self.recorder is not None:
+            self.recorder.act(player, kind)
+        i = player.current
+        if kind == HIT:
+            card = self._deal()
+            player.add_card(card)
+            value = player.hand_value()
+            events.append((HIT, player, i, card, value))
+            if value == 21:
+                events.append((BLACKJACK, player, i))
+                self._next_hand()
+            elif value > 21:
+                events.append((BUST, player, i))
+                self._next_hand()
+        elif kind == DOUBLE:
+            card = self._deal()
+            player.double(card)
+            events.append((DOUBLE, player, i, card, player.hand_value()))
+            if player.is_busted():
+                events.append((BUST, player, i))
+            self._next_hand()
+        elif kind == SPLIT:
+            moved = player.hand[-1]
+            player.split(self._deal(), self._deal())
+            new = len(player.hands) - 1
+            events.append((SPLIT, player, i, moved, new))
+            for h in (i, new):
+                hand = player.hands[h]
+                events.append((CARD, player, h, hand.hand[-1], hand.hand_value()))
+            if player.active.done:
+                self._next_hand()
+        else:
+            if kind == SURRENDER:
+                player.surrender()
+            events.append((kind, player, i))
+            self._next_hand()
+        return events
+
+    def leave(self, player):
+        """Unseat player mid-round: their stakes are forfeit and play moves on."""
+        events = self._begin()
+        if self.phase == IDLE or player not in self.players:
+            return events
+        idx = self.players.index(player)
+        self.players.remove(player)
+        self.pending.discard(player)
+        if self.recorder is not None:
+            self.recorder.act(player, LEAVE)
+        if not self.players:
+            self.phase = IDLE
+            self.turn = -1
+            self.pending.clear()
+            self.dealer.clear_hand()
+            if self.recorder is not None:
+                self.recorder.finish()
+            events.append((ABORT,))
+        elif self.phase == INSURING:
+            if not self.pending:
+                self._close_insurance()
+        elif idx < self.turn:
+            self.turn -= 1
+        elif idx == self.turn:
+            if self.turn < len(self.players):
+                events.append((TURN, self.players[self.turn], 0))
+            else:
+                self._dealer_play()
+        return events
+
+    # --- round flow ---
+
+    def _begin(self):
+        self._events = []
+        return self._events
+
+    def _deal(self):
+        card = self.deck.deal()
+        if self.recorder is not None:
+            self.recorder.dealt(card)
+        return card
+
+    def _close_insurance(self):
+        self.pending.clear()
+        self._check_naturals()
+
+    def _check_naturals(self):
+        """Settle at once if anyone was dealt 21, otherwise start the first turn."""
+        if self.dealer.hand_value() == 21 or any(p.hand_value() == 21 for p in self.players):
+            self._events.append((REVEAL, self.dealer.hand[1], self.dealer.hand_value()))
+            self._settle()
+            return
+        self.phase = PLAYING
+        self.turn = 0
+        self._events.append((TURN, self.players[0], 0))
+
+    def _next_hand(self):
+        """The active hand is finished: on to the seat's next hand, the next seat or the dealer."""
+        p = self.players[self.turn]
+        if p.next_hand():
+            self._events.append((TURN, p, p.current))
+            return
+        self.turn += 1
+        if self.turn < len(self.players):
+            self._events.append((TURN, self.players[self.turn], 0))
+        else:
+            self._dealer_play()
+
+    def _dealer_play(self):
+        dealer = self.dealer
+        events = self._events
+        events.append((DEALER,))
+        events.append((REVEAL, dealer.hand[1], dealer.hand_value()))
+        while dealer.should_hit():
+            card = self._deal()
+            dealer.add_card(card)
+            events.append((DEALER_HIT, card, dealer.hand_value()))
+        self._settle()
+
+    def _settle(self):
+        dealer = self.dealer
+        recorded = {}
+        for p in self.players:
+            outcomes, won = [], []
+            for h in p.hands:
+                outcome = evaluate_player_outcome(h, dealer)
+                outcomes.append(outcome)
+                won.append(payout(h, dealer, outcome))
+            insured = insurance_payout(p, dealer)
+            self.results.append((p, outcomes, won, insured))
+            recorded[p] = (outcomes, sum(won) + insured)
+        if self.recorder is not None:
+            self.recorder.finish(recorded)
+        self.phase = IDLE
+        self.turn = -1
+        self._events.append((SETTLE,))
@@ -0,0 +1,360 @@
+"""Round history: a compact append-only log of every round dealt, and an
+I/O-free replay that re-plays logged rounds through Player/Dealer to check
+their results.
+
+A log is a sequence of records, each a 2-byte big-endian length and a body:
+
+    >IIIB   table id, round number, unix time, flags (bit 0: dealer hits soft 17,
+            bit 1: version 2 layout)
+    B       seats, then per seat: name (1-byte length + UTF-8), >I stake,
+            >I payout (every hand plus insurance), B hands, then one outcome
+            byte per hand
+    >H      cards drawn, then one byte per card (its index in CARDS) in deal order
+    >H      actions, then one byte each: seat << 3 | kind
+
+Seats are in deal order. Outcomes index OUTCOMES; a seat that left mid-round
+is LEFT (its stakes forfeited). A three-seat round takes well under 100 bytes.
+Version 1 logs (a single ">IBI" stake/outcome/payout per seat, actions as
+seat << 2 | kind, no split/double/surrender/insurance) still read and replay.
+"""
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from game.deck import CARDS
+from game.player import Player, Dealer
+from game.engine import RoundEngine, IllegalAction, LEAVE, INSURE, INSURING, PLAYING
+
+OUTCOMES = ("WIN", "PUSH", "LOSE", "LEFT", "SURRENDER")
+LEFT = 3
+MAX_SEATS = 31
+H17 = 1
+V2 = 2
+
+CODES = {card: i for i, card in enumerate(CARDS)}
+
+_HEAD = struct.Struct(">IIIBB")
+_SEAT = struct.Struct(">IIB")
+_SEAT_V1 = struct.Struct(">IBI")
+_COUNT = struct.Struct(">H")
+
+CHUNK_ROUNDS = 200_000
+
+
+class ReplayError(ValueError):
+    """A logged round cannot have been played under the rules it is replayed with."""
+
+
+class RoundRecord:
+    """One logged round. outcomes holds a tuple of outcome codes (one per hand)
+    for each seat; shift is how far an action byte's seat is shifted (3, or 2
+    in a version 1 log)."""
+    __slots__ = ("table", "round_no", "time", "h17", "names", "stakes", "outcomes", "payouts",
+                 "cards", "actions", "shift")
+
+    def __init__(self, table, round_no, time, h17, names, stakes, outcomes, payouts, cards, actions, shift=3):
+        self.table = table
+        self.round_no = round_no
+        self.time = time
+        self.h17 = h17
+        self.names = names
+        self.stakes = stakes
+        self.outcomes = outcomes
+        self.payouts = payouts
+        self.cards = cards
+        self.actions = actions
+        self.shift = shift
+
+    def encode(self) -> bytes:
+        body = bytearray(_HEAD.pack(self.table, self.round_no, self.time, V2 | (H17 if self.h17 else 0),
+                                    len(self.names)))
+        for name, stake, outcomes, won in zip(self.names, self.stakes, self.outcomes, self.payouts):
+            raw = name.encode()[:255]
+            body.append(len(raw))
+            body += raw
+            body += _SEAT.pack(stake, won, len(outcomes))
+            body += bytes(outcomes)
+        body += _COUNT.pack(len(self.cards)) + bytes(self.cards)
+        body += _COUNT.pack(len(self.actions)) + bytes(self.actions)
+        return _COUNT.pack(len(body)) + bytes(body)
+
+    @classmethod
+    def decode(cls, body):
+        table, round_no, when, flags, seats = _HEAD.unpack_from(body, 0)
+        pos = _HEAD.size
+        names, stakes, outcomes, payouts = [], [], [], []
+        for _ in range(seats):
+            n = body[pos]
+            names.append(bytes(body[pos + 1:pos + 1 + n]).decode(errors="replace"))
+            pos += 1 + n
+            if flags & V2:
+                stake, won, hands = _SEAT.unpack_from(body, pos)
+                pos += _SEAT.size
+                outcomes.append(tuple(body[pos:pos + hands]))
+                pos += hands
+            else:
+                stake, outcome, won = _SEAT_V1.unpack_from(body, pos)
+                pos += _SEAT_V1.size
+                outcomes.append((outcome,))
+            stakes.append(stake)
+            payouts.append(won)
+        (n,) = _COUNT.unpack_from(body, pos)
+        cards = bytes(body[pos + 2:pos + 2 + n])
+        pos += 2 + n
+        (n,) = _COUNT.unpack_from(body, pos)
+        actions = bytes(body[pos + 2:pos + 2 + n])
+        return cls(table, round_no, when, bool(flags & H17), names, stakes, outcomes, payouts, cards, actions,
+                   3 if flags & V2 else 2)
+
+    def __str__(self):
+        seats = ", ".join(f"{n} {s}->{'/'.join(OUTCOMES[o] for o in hs)} {w}"
+                          for n, s, hs, w in zip(self.names, self.stakes, self.outcomes, self.payouts))
+        return f"table {self.table} round {self.round_no}: {seats}"
+
+
+class RoundRecorder:
+    """Collects one table's round as it is played and appends it to a HistoryWriter.
+
+    The server calls start() once stakes are taken, dealt() for every card it
+    draws, act() for every turn decision or departure, and finish() with the
+    settled results. Without a writer it records nothing.
+    """
+    def __init__(self, writer=None, table_id=0, hit_on_soft_17=True):
+        self.writer = writer
+        self.table_id = table_id
+        self.hit_on_soft_17 = hit_on_soft_17
+        self.round_no = 0
+        self.seats = None
+        self.cards = bytearray()
+        self.actions = bytearray()
+
+    def start(self, round_no, players):
+        if self.writer is None:
+            return
+        self.round_no = round_no
+        self.seats = {p: (i, p.name, p.bet) for i, p in enumerate(players[:MAX_SEATS])}
+        self.cards = bytearray()
+        self.actions = bytearray()
+
+    def dealt(self, card):
+        if self.seats is not None:
+            self.cards.append(CODES[card])
+
+    def act(self, player, kind):
+        if self.seats is not None and player in self.seats:
+            self.actions.append(self.seats[player][0] << 3 | kind)
+
+    def finish(self, results=None):
+        """Write the round. results maps Player -> (outcome name of each hand,
+        total payout); seats missing from it left before the end."""
+        if self.seats is None:
+            return
+        results = results or {}
+        names, stakes, outcomes, payouts = [], [], [], []
+        for p, (_, name, stake) in self.seats.items():
+            hands, won = results.get(p, (("LEFT",), 0))
+            names.append(name)
+            stakes.append(stake)
+            outcomes.append(tuple(OUTCOMES.index(o) for o in hands))
+            payouts.append(won)
+        self.writer.append(RoundRecord(self.table_id, self.round_no, int(time.time()), self.hit_on_soft_17,
+                                       names, stakes, outcomes, payouts, self.cards, self.actions))
+        self.seats = None
+
+
+class HistoryWriter:
+    """Appends encoded rounds to a log file through an ordinary write buffer.
+
+    Records reach the OS when the buffer fills or on flush(); the history is an
+    audit trail, so it is not fsynced per round.
+    """
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.rounds = 0
+        self._file = open(path, "ab")
+
+    def append(self, record: RoundRecord):
+        if not self._file.closed:
+            self._file.write(record.encode())
+            self.rounds += 1
+
+    def flush(self):
+        if not self._file.closed:
+            self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+# --- reading and replay ---
+
+def split_records(data, start=0):
+    """Yield each record body in data (bytes) from offset start; a torn last record is skipped."""
+    view = memoryview(data)
+    pos, end = start, len(data)
+    while pos + 2 <= end:
+        n = (data[pos] << 8) | data[pos + 1]
+        if pos + 2 + n > end:
+            return
+        yield view[pos + 2:pos + 2 + n]
+        pos += 2 + n
+
+def read_records(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    for body in split_records(data):
+        yield RoundRecord.decode(body)
+
+class _LoggedCards:
+    """Deals a logged round's cards back in order."""
+    __slots__ = ("cards", "pos")
+
+    def __init__(self, cards):
+        self.cards = cards
+        self.pos = 0
+
+    def deal(self):
+        if self.pos >= len(self.cards):
+            raise ReplayError("ran out of cards")
+        self.pos += 1
+        return CARDS[self.cards[self.pos - 1]]
+
+def replay(rec: RoundRecord, hit_on_soft_17=None):
+    """Re-play a logged round from its cards and decisions; return (outcomes, payouts).
+
+    The round goes through the same RoundEngine the servers run, so a record
+    that does not fit the rules raises ReplayError. Declined insurance is not
+    logged: the offer is closed by the first turn decision. Pass
+    hit_on_soft_17 to replay under a different dealer rule than the one logged.
+    """
+    h17 = rec.h17 if hit_on_soft_17 is None else hit_on_soft_17
+    n = len(rec.names)
+    if len(rec.cards) < 2 * n + 2:
+        raise ReplayError("too few cards for the deal")
+    shoe = _LoggedCards(rec.cards)
+    players = [Player(name) for name in rec.names]
+    engine = RoundEngine(shoe, Dealer(h17))
+    engine.start(players, dict(zip(players, rec.stakes)))
+    shift, mask = rec.shift, (1 << rec.shift) - 1
+    seat = None
+    try:
+        for a in rec.actions:
+            seat, kind = a >> shift, a & mask
+            if seat >= n:
+                raise ReplayError(f"no seat {seat}")
+            p = players[seat]
+            if kind == LEAVE:
+                if p not in engine.players:
+                    raise ReplayError(f"seat {seat} left twice")
+                engine.leave(p)
+            elif kind == INSURE:
+                engine.insure(p)
+            else:
+                if engine.phase == INSURING:
+                    engine.close_insurance()
+                engine.act(p, kind)
+        if engine.phase == INSURING:
+            engine.close_insurance()
+    except IllegalAction as e:
+        raise ReplayError(f"seat {seat}: {e}") from None
+    if engine.phase == PLAYING:
+        raise ReplayError("round ended before every seat had played")
+    if shoe.pos != len(rec.cards):
+        raise ReplayError(f"{len(rec.cards) - shoe.pos} cards logged but never used")
+    outcomes, payouts = [(LEFT,)] * n, [0] * n
+    seats = {p: i for i, p in enumerate(players)}
+    for p, hands, won, insured in engine.results:
+        outcomes[seats[p]] = tuple(OUTCOMES.index(o) for o in hands)
+        payouts[seats[p]] = sum(won) + insured
+    return outcomes, payouts
+
+
+class VerifyResult:
+    """Rounds checked, and the first few that did not replay to their logged results."""
+    MAX_SHOWN = 20
+
+    def __init__(self, rounds=0, failures=0, examples=None, elapsed=0.0):
+        self.rounds = rounds
+        self.failures = failures
+        self.examples = examples or []
+        self.elapsed = elapsed
+
+    @property
+    def rounds_per_sec(self):
+        return self.rounds / self.elapsed if self.elapsed else 0.0
+
+    def __add__(self, other):
+        return VerifyResult(self.rounds + other.rounds, self.failures + other.failures,
+                            (self.examples + other.examples)[:self.MAX_SHOWN], self.elapsed + other.elapsed)
+
+    def __str__(self):
+        lines = [f"rounds={self.rounds} mismatches={self.failures} ({self.rounds_per_sec:,.0f} rounds/sec)"]
+        lines += [f"  {e}" for e in self.examples]
+        return "\n".join(lines)
+
+
+def verify_records(bodies, hit_on_soft_17=None) -> VerifyResult:
+    start = time.perf_counter()
+    result = VerifyResult()
+    for body in bodies:
+        rec = RoundRecord.decode(body)
+        result.rounds += 1
+        try:
+            outcomes, payouts = replay(rec, hit_on_soft_17)
+            if outcomes == rec.outcomes and payouts == rec.payouts:
+                continue
+            reason = "results differ: " + ", ".join(f"{n} {'/'.join(OUTCOMES[o] for o in hs)} {w}"
+                                                     for n, hs, w in zip(rec.names, outcomes, payouts))
+        except ReplayError as e:
+            reason = str(e)
+        result.failures += 1
+        if len(result.examples) < VerifyResult.MAX_SHOWN:
+            result.examples.append(f"{rec}: {reason}")
+    result.elapsed = time.perf_counter() - start
+    return result
+
+def _verify_chunk(args):
+    data, rules = args
+    return verify_records(split_records(data), **rules)
+
+def _chunks(data, rounds=CHUNK_ROUNDS):
+    """Cut data at record boundaries into pieces of about `rounds` records."""
+    start = pos = count = 0
+    end = len(data)
+    while pos + 2 <= end:
+        pos += 2 + ((data[pos] << 8) | data[pos + 1])
+        count += 1
+        if count == rounds:
+            yield data[start:pos]
+            start, count = pos, 0
+    if start < pos:
+        yield data[start:pos]
+
+def verify(path, workers=None, hit_on_soft_17=None) -> VerifyResult:
+    """Replay every round in a history log and compare it with what was logged.
+
+    Chunks of the log are spread over a process pool; elapsed is wall-clock.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    workers = workers or os.cpu_count() or 1
+    jobs = [(chunk, {"hit_on_soft_17": hit_on_soft_17}) for chunk in _chunks(data)]
+    start = time.perf_counter()
+    result = VerifyResult()
+    if workers == 1 or len(jobs) <= 1:
+        for job in jobs:
+            result += _verify_chunk(job)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for r in pool.map(_verify_chunk, jobs):
+                result += r
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+if __name__ == "__main__":
+    import sys
+    print(verify(sys.argv[1]))
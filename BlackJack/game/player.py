@@ -1,21 +1,110 @@
 # game/player.py
 from game.deck import Card
 
-class Player:
-    def __init__(self, name, chips=1000):
-        self.name = name
-        self.chips = chips
+class Hand:
+    """One hand's cards and stake, with running totals (aces counted as 1) kept in
+    step with the cards so its value is never rescanned."""
+    __slots__ = ("hand", "bet", "_hard", "_aces", "split", "doubled", "surrendered", "done")
+
+    def __init__(self, bet=0):
         self.hand = []
-        self.bet = 0
+        self.bet = bet
+        self._hard = 0
+        self._aces = 0
+        self.split = False          # came from (or was) a split pair: a 21 is not a natural
+        self.doubled = False
+        self.surrendered = False
+        self.done = False           # no more decisions on this hand
 
     def add_card(self, card: Card):
-        """Add a dealt card to the player's hand."""
+        """Add a dealt card to the hand."""
         self.hand.append(card)
+        if card.rank == "A":
+            self._hard += 1
+            self._aces += 1
+        else:
+            self._hard += card.value
+
+    def pop_card(self) -> Card:
+        card = self.hand.pop()
+        if card.rank == "A":
+            self._hard -= 1
+            self._aces -= 1
+        else:
+            self._hard -= card.value
+        return card
 
     def clear_hand(self):
-        """Empty the player's hand and reset bet."""
+        """Empty the hand and reset its stake."""
         self.hand = []
         self.bet = 0
+        self._hard = 0
+        self._aces = 0
+        self.split = self.doubled = self.surrendered = self.done = False
+
+    def hand_value(self):
+        """Return the total blackjack value of the hand."""
+        if self._aces and self._hard + 10 <= 21:
+            return self._hard + 10
+        return self._hard
+
+    def is_soft(self):
+        """Return True if the hand is a soft total (an Ace can count as 11)."""
+        return bool(self._aces) and self._hard + 10 <= 21
+
+    def is_busted(self):
+        return self._hard > 21
+
+    def is_natural(self):
+        """A two-card 21 that did not come from a split."""
+        return len(self.hand) == 2 and not self.split and self.hand_value() == 21
+
+    def is_pair(self):
+        return len(self.hand) == 2 and self.hand[0].value == self.hand[1].value
+
+
+class Player:
+    """A seat at the table. Decisions and hand queries apply to the active hand,
+    which is the only one until a split."""
+    MAX_HANDS = 4
+
+    def __init__(self, name, chips=1000):
+        self.name = name
+        self.chips = chips
+        self.hands = [Hand()]
+        self.current = 0            # index of the active hand
+        self.insurance = 0
+
+    @property
+    def active(self) -> Hand:
+        return self.hands[self.current]
+
+    @property
+    def hand(self):
+        return self.hands[self.current].hand
+
+    @property
+    def surrendered(self):
+        return self.hands[self.current].surrendered
+
+    @property
+    def bet(self):
+        """Total stake across every hand (setting it stakes the active hand)."""
+        return sum(h.bet for h in self.hands)
+
+    @bet.setter
+    def bet(self, amount):
+        self.hands[self.current].bet = amount
+
+    def add_card(self, card: Card):
+        """Add a dealt card to the active hand."""
+        self.hands[self.current].add_card(card)
+
+    def clear_hand(self):
+        """Back to one empty hand; resets the bet and insurance."""
+        self.hands = [Hand()]
+        self.current = 0
+        self.insurance = 0
 
     def place_bet(self, amount):
         """Deduct chips and set current bet."""
@@ -25,39 +114,97 @@ class Player:
         self.bet = amount
 
     def hand_value(self):
-        """Return the total blackjack value of the hand."""
-        value = sum(card.value for card in self.hand)
-        aces = sum(1 for card in self.hand if card.rank == "A")
+        """Return the total blackjack value of the active hand."""
+        return self.hands[self.current].hand_value()
 
-        while value > 21 and aces:
-            value -= 10
-            aces -= 1
-
-        return value
+    def is_soft(self):
+        return self.hands[self.current].is_soft()
 
     def is_busted(self):
-        return self.hand_value() > 21
+        return self.hands[self.current].is_busted()
+
+    def is_natural(self):
+        return self.hands[self.current].is_natural()
+
+    # --- decisions beyond hit and stand ---
+
+    def can_double(self):
+        h = self.active
+        return len(h.hand) == 2 and not h.done
+
+    def double(self, card: Card):
+        """Double the active hand's stake and take exactly one more card."""
+        h = self.active
+        h.bet *= 2
+        h.doubled = True
+        h.add_card(card)
+
+    def can_split(self):
+        h = self.active
+        return h.is_pair() and not h.done and len(self.hands) < self.MAX_HANDS
+
+    def split(self, first: Card, second: Card) -> Hand:
+        """Split the active pair into two hands at the same stake, dealing `first`
+        to the active hand and `second` to the new one, which is played last.
+
+        Split aces take one card each and are done; so is any hand dealt to 21.
+        """
+        h = self.active
+        new = Hand(h.bet)
+        new.add_card(h.pop_card())
+        h.split = new.split = True
+        h.add_card(first)
+        new.add_card(second)
+        aces = h.hand[0].rank == "A"
+        for x in (h, new):
+            x.done = aces or x.hand_value() == 21
+        self.hands.append(new)
+        return new
+
+    def can_surrender(self):
+        """Late surrender: only as the first decision on the original two cards."""
+        h = self.active
+        return len(self.hands) == 1 and len(h.hand) == 2 and not h.done
+
+    def surrender(self):
+        self.active.surrendered = True
+
+    def next_hand(self):
+        """Finish the active hand and move to the next unfinished one.
+
+        Returns False once every hand has been played.
+        """
+        self.hands[self.current].done = True
+        for i in range(self.current + 1, len(self.hands)):
+            if not self.hands[i].done:
+                self.current = i
+                return True
+        return False
 
     def __str__(self):
-        cards = ", ".join(str(card) for card in self.hand)
-        return f"{self.name}: {cards} (Value: {self.hand_value()})"
+        if len(self.hands) == 1:
+            cards = ", ".join(str(card) for card in self.hand)
+            return f"{self.name}: {cards} (Value: {self.hand_value()})"
+        return "\n".join(f"{self.name} hand {i + 1}: {', '.join(str(c) for c in h.hand)} (Value: {h.hand_value()})"
+                         for i, h in enumerate(self.hands))
+
 
+class Dealer(Hand):
+    name = "Dealer"
+    current = 0
+
+    @property
+    def hands(self):
+        """The dealer plays a single hand; this lets it stand in for a Player."""
+        return (self,)
 
-class Dealer(Player):
     def __init__(self, hit_on_soft_17=True):
-        super().__init__("Dealer")
+        super().__init__()
 
         self.hit_on_soft_17 = hit_on_soft_17
 
     def _is_soft(self):
-        """Return True if the hand is a soft total (an Ace can count as 11)."""
-        aces = sum(1 for c in self.hand if c.rank == "A")
-        if not aces:
-            return False
-
-        min_value = sum((1 if c.rank == "A" else c.value) for c in self.hand)
-
-        return min_value + 10 <= 21
+        return self.is_soft()
 
     def should_hit(self):
         """Dealer hits until reaching a hand value of 17 or more.
@@ -72,10 +219,13 @@ class Dealer(Player):
 
     def play_out(self, deck):
         """Draw from deck until dealer should stand."""
-       
+
         while len(self.hand) < 2:
             self.add_card(deck.deal())
 
         while self.should_hit():
             self.add_card(deck.deal())
-    
\ No newline at end of file
+
+    def __str__(self):
+        cards = ", ".join(str(card) for card in self.hand)
+        return f"{self.name}: {cards} (Value: {self.hand_value()})"
@@ -0,0 +1,68 @@
+"""Random sources for decks and shoes.
+
+A Deck or Shoe shuffles with whatever object it is given that has a
+``shuffle(seq)`` method, so each table can own its stream:
+
+* seeded -- random.Random(seed): reproducible; the default, with a fresh
+            OS-seeded stream per deck when no seed is given
+* secure -- secrets.SystemRandom: the OS CSPRNG, for production tables
+* bulk   -- BulkShuffler: NumPy permutations generated a batch at a time, for
+            simulations that reshuffle constantly (needs NumPy)
+"""
+import random
+import secrets
+
+MODES = ("seeded", "secure", "bulk")
+
+
+def make_rng(seed=None, mode="seeded", **options):
+    """An RNG for one deck or table in the given mode."""
+    if mode == "secure":
+        if seed is not None:
+            raise ValueError("A secure RNG cannot be seeded.")
+        return secrets.SystemRandom()
+    if mode == "bulk":
+        return BulkShuffler(seed, **options)
+    if mode == "seeded":
+        return random.Random(seed)
+    raise ValueError(f"Unknown RNG mode {mode!r}; expected one of {', '.join(MODES)}.")
+
+
+def shuffled_rows(generator, row, count):
+    """count independent shuffles of the 1-D array row, as a (count, len(row)) array.
+
+    One Generator.permuted call over the stacked copies shuffles every row at once.
+    """
+    import numpy as np
+    return generator.permuted(np.tile(row, (count, 1)), axis=1)
+
+
+class BulkShuffler:
+    """Shuffles by applying the next of a pre-generated batch of permutations.
+
+    Each refill draws `batch` permutations in one NumPy call, so a shoe
+    reshuffle costs a row lookup and a gather instead of hundreds of Python
+    random calls. The same seed gives the same sequence of shuffles.
+    """
+    def __init__(self, seed=None, batch=256):
+        import numpy as np
+        self._np = np
+        self.generator = np.random.default_rng(seed)
+        self.batch = batch
+        self._rows = None
+        self._next = 0
+
+    def _permutation(self, n):
+        rows = self._rows
+        if rows is None or self._next >= len(rows) or rows.shape[1] != n:
+            rows = self._rows = shuffled_rows(self.generator, self._np.arange(n, dtype=self._np.intp), self.batch)
+            self._next = 0
+        self._next += 1
+        return rows[self._next - 1]
+
+    def shuffle(self, seq):
+        perm = self._permutation(len(seq))
+        if isinstance(seq, bytearray):
+            seq[:] = self._np.frombuffer(bytes(seq), dtype=self._np.uint8)[perm].tobytes()
+        else:
+            seq[:] = [seq[i] for i in perm.tolist()]
@@ -0,0 +1,158 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from game.deck import Card, Deck
+from game.rng import shuffled_rows
+
+# Rank codes are indexes into Deck.ranks: 0 = "2" ... 8 = "10", 9-11 = J/Q/K, 12 = "A".
+ACE = Deck.ranks.index("A")
+HARD_VALUES = np.array([1 if r == "A" else Card("", r).value for r in Deck.ranks], dtype=np.int8)
+DECK_CODES = np.repeat(np.arange(len(Deck.ranks), dtype=np.int8), len(Deck.suits))
+
+BATCH_SIZE = 100_000
+SHARD_SIZE = 1_000_000
+
+
+class SimResult:
+    """Aggregated outcome counts for a batch of simulated rounds."""
+    def __init__(self, wins=0, pushes=0, losses=0, elapsed=0.0):
+        self.wins = wins
+        self.pushes = pushes
+        self.losses = losses
+        self.elapsed = elapsed
+
+    @property
+    def hands(self):
+        return self.wins + self.pushes + self.losses
+
+    def rate(self, count):
+        return count / self.hands if self.hands else 0.0
+
+    @property
+    def house_edge(self):
+        """Dealer's expected gain per unit bet at even-money payouts."""
+        return self.rate(self.losses - self.wins)
+
+    @property
+    def hands_per_sec(self):
+        return self.hands / self.elapsed if self.elapsed else 0.0
+
+    def __add__(self, other):
+        return SimResult(self.wins + other.wins, self.pushes + other.pushes,
+                         self.losses + other.losses, self.elapsed + other.elapsed)
+
+    def __str__(self):
+        return (f"hands={self.hands} win={self.rate(self.wins):.4%} push={self.rate(self.pushes):.4%} "
+                f"loss={self.rate(self.losses):.4%} edge={self.house_edge:.4%} "
+                f"({self.hands_per_sec:,.0f} hands/sec)")
+
+
+def _totals(hard, aces):
+    """Vectorized Player.hand_value: count one ace as 11 when it does not bust."""
+    soft = (aces > 0) & (hard + 10 <= 21)
+    return np.where(soft, hard + 10, hard), soft
+
+
+def _draw(cards, pos, hard, aces, mask):
+    """Give the next shoe card to every row selected by mask."""
+    rows = np.nonzero(mask)[0]
+    code = cards[rows, pos[rows]]
+    pos[rows] += 1
+    hard[rows] += HARD_VALUES[code]
+    aces[rows] += code == ACE
+
+
+def simulate_batch(n, rng=None, decks=1, hit_on_soft_17=True, stand_on=17):
+    """Play n single-player rounds, each from a freshly shuffled shoe of `decks` decks.
+
+    Follows the server's round flow: cards are dealt player, dealer, player, dealer;
+    a two-card 21 on either side ends the round at once; otherwise the player hits
+    below `stand_on`, the dealer plays out per Dealer.should_hit and the result is
+    decided as in evaluate_player_outcome.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    start = time.perf_counter()
+    cards = shuffled_rows(rng, np.tile(DECK_CODES, decks), n)
+
+    p_hard = (HARD_VALUES[cards[:, 0]] + HARD_VALUES[cards[:, 2]]).astype(np.int16)
+    p_aces = ((cards[:, 0] == ACE).astype(np.int16) + (cards[:, 2] == ACE))
+    d_hard = (HARD_VALUES[cards[:, 1]] + HARD_VALUES[cards[:, 3]]).astype(np.int16)
+    d_aces = ((cards[:, 1] == ACE).astype(np.int16) + (cards[:, 3] == ACE))
+    pos = np.full(n, 4, dtype=np.int16)
+
+    pv, _ = _totals(p_hard, p_aces)
+    dv, _ = _totals(d_hard, d_aces)
+    live = (pv != 21) & (dv != 21)
+
+    while True:
+        pv, _ = _totals(p_hard, p_aces)
+        hit = live & (pv < stand_on)
+        if not hit.any():
+            break
+        _draw(cards, pos, p_hard, p_aces, hit)
+    # A busted player has already lost, so the dealer's draws cannot change the result.
+    live &= pv <= 21
+
+    while True:
+        dv, soft = _totals(d_hard, d_aces)
+        hit = live & ((dv < 17) | ((dv == 17) & soft & hit_on_soft_17))
+        if not hit.any():
+            break
+        _draw(cards, pos, d_hard, d_aces, hit)
+
+    pv, _ = _totals(p_hard, p_aces)
+    dv, _ = _totals(d_hard, d_aces)
+    p_bust = pv > 21
+    win = ~p_bust & ((dv > 21) | (pv > dv))
+    push = ~p_bust & (dv <= 21) & (pv == dv)
+    wins = int(win.sum())
+    pushes = int(push.sum())
+    return SimResult(wins, pushes, n - wins - pushes, time.perf_counter() - start)
+
+
+def simulate(rounds, rng=None, batch_size=BATCH_SIZE, **rules):
+    """Play `rounds` rounds in batches and return the combined SimResult."""
+    rng = rng if rng is not None else np.random.default_rng()
+    result = SimResult()
+    while rounds > 0:
+        n = min(rounds, batch_size)
+        result += simulate_batch(n, rng, **rules)
+        rounds -= n
+    return result
+
+
+def _run_shard(args):
+    rounds, seed_seq, rules = args
+    return simulate(rounds, np.random.default_rng(seed_seq), **rules)
+
+
+def simulate_parallel(rounds, workers=None, seed=0, shard_size=SHARD_SIZE, **rules):
+    """Split `rounds` into fixed-size shards and play them across a process pool.
+
+    Every shard gets its own generator spawned from `seed`, and shard boundaries
+    do not depend on `workers`, so the same seed always gives the same counts.
+    The returned elapsed time is wall-clock, so hands_per_sec is the pool's rate.
+    """
+    workers = workers or os.cpu_count() or 1
+    sizes = [shard_size] * (rounds // shard_size)
+    if rounds % shard_size:
+        sizes.append(rounds % shard_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(n, s, rules) for n, s in zip(sizes, seeds)]
+
+    start = time.perf_counter()
+    result = SimResult()
+    if workers == 1:
+        for job in jobs:
+            result += _run_shard(job)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for r in pool.map(_run_shard, jobs):
+                result += r
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+if __name__ == "__main__":
+    print(simulate_parallel(1_000_000))
@@ -0,0 +1,119 @@
+from functools import lru_cache
+from game.dealer_odds import OUTCOMES, dealer_outcomes, full_shoe, rank_class
+
+_STAND_TOTALS = [int(o) for o in OUTCOMES[:5]]
+_BLACKJACK = OUTCOMES.index("blackjack")
+_BUST = OUTCOMES.index("bust")
+
+MAX_ENTRIES = 200_000
+
+
+def _total(hard, soft):
+    return hard + 10 if soft and hard + 10 <= 21 else hard
+
+
+class StrategyEngine:
+    """Expected value of HIT vs STAND for a player hand against a dealer upcard.
+
+    Uses the server's rules: even-money payouts, pushes on equal totals, a dealer
+    natural ends the round before anyone acts (so decisions are made knowing the
+    dealer does not have one) and a player reaching 21 stops drawing.
+
+    States are memoized on (hard total, ace held, upcard, remaining composition);
+    every cache is LRU-bounded by `max_entries`.
+    """
+    def __init__(self, composition=None, hit_on_soft_17=True, max_entries=MAX_ENTRIES):
+        self.composition = tuple(composition or full_shoe(6))
+        self.hit_on_soft_17 = hit_on_soft_17
+        self._dealer = lru_cache(maxsize=max_entries)(self._dealer_uncached)
+        self._best = lru_cache(maxsize=max_entries)(self._best_uncached)
+        self._evaluate = lru_cache(maxsize=max_entries)(self._evaluate_uncached)
+
+    def remaining(self, hand, upcard):
+        """Starting composition less the player's cards and the dealer upcard."""
+        comp = list(self.composition)
+        for c in list(hand) + [upcard]:
+            comp[rank_class(c)] -= 1
+        return tuple(comp)
+
+    def evaluate(self, hand, upcard, composition=None):
+        """Return (ev_stand, ev_hit) for a list of Cards against an upcard Card.
+
+        `composition` is what is left to draw from (including the dealer's hole
+        card); by default it is the engine's shoe minus the visible cards.
+        """
+        comp = tuple(composition) if composition is not None else self.remaining(hand, upcard)
+        hard = sum(rank_class(c) + 1 for c in hand)
+        soft = any(c.rank == "A" for c in hand)
+        return self._evaluate(hard, soft, rank_class(upcard), comp)
+
+    def best_action(self, hand, upcard, composition=None):
+        ev_stand, ev_hit = self.evaluate(hand, upcard, composition)
+        return "HIT" if ev_hit > ev_stand else "STAND"
+
+    def hint(self, player, dealer, tracker=None):
+        """Return (action, ev_stand, ev_hit) for a seated player, or None if there is
+        no decision to make (no upcard yet, or the hand is already 21 or more).
+
+        With a CompositionTracker on the shoe being dealt from, the EVs are for
+        the cards actually left (the dealer's hole card counted as unseen)
+        rather than for a full shoe.
+        """
+        if not dealer.hand or not player.hand or player.hand_value() >= 21:
+            return None
+        comp = None
+        if tracker is not None:
+            comp = list(tracker.composition())
+            for c in dealer.hand[1:2]:
+                comp[rank_class(c)] += 1
+        ev_stand, ev_hit = self.evaluate(player.hand, dealer.hand[0], comp)
+        return ("HIT" if ev_hit > ev_stand else "STAND"), ev_stand, ev_hit
+
+    def cache_info(self):
+        return {"decision": self._evaluate.cache_info(), "player": self._best.cache_info(),
+                "dealer": self._dealer.cache_info()}
+
+    def _evaluate_uncached(self, hard, soft, up, comp):
+        return self._stand(hard, soft, up, comp), self._hit(hard, soft, up, comp)
+
+    def _dealer_uncached(self, up, comp):
+        probs = dealer_outcomes(up, comp, self.hit_on_soft_17)
+        live = 1.0 - probs[_BLACKJACK]
+        if live <= 0:
+            return probs
+        return tuple(0.0 if i == _BLACKJACK else p / live for i, p in enumerate(probs))
+
+    def _stand(self, hard, soft, up, comp):
+        total = _total(hard, soft)
+        if total > 21:
+            return -1.0
+        probs = self._dealer(up, comp)
+        ev = probs[_BUST]
+        for t, p in zip(_STAND_TOTALS, probs):
+            if t < total:
+                ev += p
+            elif t > total:
+                ev -= p
+        return ev
+
+    def _hit(self, hard, soft, up, comp):
+        remaining = sum(comp)
+        if not remaining:
+            return self._stand(hard, soft, up, comp)
+        ev = 0.0
+        for c, count in enumerate(comp):
+            if not count:
+                continue
+            nxt = list(comp)
+            nxt[c] -= 1
+            ev += count / remaining * self._best(hard + c + 1, soft or c == 0, up, tuple(nxt))
+        return ev
+
+    def _best_uncached(self, hard, soft, up, comp):
+        total = _total(hard, soft)
+        if total > 21:
+            return -1.0
+        stand = self._stand(hard, soft, up, comp)
+        if total == 21:
+            return stand
+        return max(stand, self._hit(hard, soft, up, comp))
@@ -1,5 +1,6 @@
 import argparse
 import os
+import signal
 import sys
 import subprocess
 
@@ -14,9 +15,34 @@ def run_text():
     from ui.text_ui import run_text_ui as _run
     _run()
 
-def run_server(host: str = "0.0.0.0", port: int = 5555):
-    from network.server import run_server as _run
-    _run(host=host, port=port)
+def run_server(host: str = "0.0.0.0", port: int = 5555, engine: str = "thread", high_water: int = None,
+               turn_timeout: float = None, countdown: int = None, metrics_port: int = None,
+               metrics_log: float = None, ledger: str = None, history: str = None, seed: int = None,
+               workers: int = None, control: str = None, resume_grace: float = None):
+    # Exit through the servers' cleanup on SIGTERM too, so the ledger's last batch is committed.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    if engine == "cluster":
+        from network.cluster import run_cluster, CONTROL_PATH
+        run_cluster(host=host, port=port, workers=workers, control_path=control or CONTROL_PATH,
+                    high_water=high_water, turn_timeout=turn_timeout, countdown=countdown,
+                    metrics_port=metrics_port, metrics_log=metrics_log, ledger_path=ledger, history_path=history,
+                    seed=seed, resume_grace=resume_grace)
+        return
+    if engine == "asyncio":
+        from network.async_server import run_server as _run
+    else:
+        from network.server import run_server as _run
+    _run(host=host, port=port, high_water=high_water, turn_timeout=turn_timeout, countdown=countdown,
+         metrics_port=metrics_port, metrics_log=metrics_log, ledger_path=ledger, history_path=history,
+         seed=seed, resume_grace_seconds=resume_grace)
+
+def run_simulate(rounds: int = 1_000_000, workers: int = None, seed: int = 0):
+    from game.simulate import simulate_parallel
+    print(simulate_parallel(rounds, workers=workers, seed=seed))
+
+def run_replay(path: str, workers: int = None, stand_soft_17: bool = False):
+    from game.history import verify
+    print(verify(path, workers=workers, hit_on_soft_17=False if stand_soft_17 else None))
 
 def run_client(host: str = None):
     try:
@@ -33,10 +59,38 @@ def run_client(host: str = None):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="BlackJack entrypoint.")
-    parser.add_argument("--mode", choices=["gui", "text", "server", "client"], default="gui",
+    parser.add_argument("--mode", choices=["gui", "text", "server", "client", "simulate", "replay"], default="gui",
                         help="Which mode to run (default: gui).")
     parser.add_argument("--host", help="Host to bind (server) or connect to (client).")
     parser.add_argument("--port", type=int, default=5555, help="Port for server (default 5555).")
+    parser.add_argument("--engine", choices=["thread", "asyncio", "cluster"], default="thread",
+                        help="Server engine: one global table (thread), many tables (asyncio), or asyncio "
+                             "tables spread over --workers processes behind a router (cluster).")
+    parser.add_argument("--control",
+                        help="Cluster: Unix socket for STATUS/STOP commands (default ./blackjack.sock).")
+    parser.add_argument("--high-water", type=int,
+                        help="Server: outbound bytes queued per client before it is dropped as too slow.")
+    parser.add_argument("--turn-timeout", type=float,
+                        help="Server: seconds a player has to act before being auto-stood (0 disables, default 30).")
+    parser.add_argument("--resume-grace", type=float,
+                        help="Server: seconds a dropped player's seat is held for RESUME (0 disables, default 30).")
+    parser.add_argument("--countdown", type=int,
+                        help="Server: seconds of countdown before each round (default 10 first, then 8).")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Server: serve Prometheus-style metrics on 127.0.0.1:PORT/metrics.")
+    parser.add_argument("--metrics-log", type=float, help="Server: log a metrics summary every N seconds.")
+    parser.add_argument("--ledger", default="ledger",
+                        help="Server: directory holding chip balances (default ./ledger; '' keeps them in memory).")
+    parser.add_argument("--history", default=os.path.join("history", "rounds.bjh"),
+                        help="Server: round history log to append to ('' disables); replay: log to verify.")
+    parser.add_argument("--stand-soft-17", action="store_true",
+                        help="Replay: re-check rounds as if the dealer stood on soft 17.")
+    parser.add_argument("--rounds", type=int, default=1_000_000, help="Rounds to play (simulate).")
+    parser.add_argument("--workers", type=int,
+                        help="Worker processes (simulate, replay, cluster server; default: all cores).")
+    parser.add_argument("--seed", type=int,
+                        help="Base RNG seed: simulate (default 0), or a server's shoes "
+                             "(default: unseeded, from the OS CSPRNG).")
     args = parser.parse_args()
 
     if args.mode == "gui":
@@ -44,6 +98,14 @@ if __name__ == "__main__":
     elif args.mode == "text":
         run_text()
     elif args.mode == "server":
-        run_server(host=(args.host or "0.0.0.0"), port=args.port)
+        run_server(host=(args.host or "0.0.0.0"), port=args.port, engine=args.engine, high_water=args.high_water,
+                   turn_timeout=args.turn_timeout, countdown=args.countdown,
+                   metrics_port=args.metrics_port, metrics_log=args.metrics_log, ledger=args.ledger,
+                   history=args.history, seed=args.seed, workers=args.workers, control=args.control,
+                   resume_grace=args.resume_grace)
     elif args.mode == "client":
-        run_client(host=args.host)
\ No newline at end of file
+        run_client(host=args.host)
+    elif args.mode == "simulate":
+        run_simulate(rounds=args.rounds, workers=args.workers, seed=args.seed or 0)
+    elif args.mode == "replay":
+        run_replay(args.history, workers=args.workers, stand_soft_17=args.stand_soft_17)
\ No newline at end of file
@@ -0,0 +1,749 @@
+import asyncio
+import random
+import secrets
+import struct
+import time
+from game.deck import Shoe
+from game.player import Player, Dealer
+from game.strategy import StrategyEngine
+from game.rng import make_rng
+from game.history import RoundRecorder, HistoryWriter
+from game import engine as E
+from network import protocol as P
+from network.outbound import AsyncOutbound, OutboundPolicy, STATS
+from network.scheduler import TimerWheel, Countdown
+from network.ledger import Ledger
+from network.metrics import TableTimings, MetricsListener, METRICS, REGISTRY
+
+HOST = "0.0.0.0"
+PORT = 5555
+
+MAX_PLAYERS = 5
+JOIN_COUNTDOWN = 10
+BETWEEN_COUNTDOWN = 8
+TURN_TIMEOUT = 30.0
+INSURANCE_SECONDS = 5.0
+RESUME_GRACE = 30.0
+SPECTATOR_HIGH_WATER = 64 * 1024
+REPORT_INTERVAL = 60
+HISTORY_FLUSH = 1.0
+MIN_BET = 10
+MAX_BET = 500
+
+strategy = StrategyEngine()
+
+# Engine events broadcast as a bare ACTION line.
+_ACTS = {E.HIT: P.ACT_HIT, E.DOUBLE: P.ACT_DOUBLE, E.STAND: P.ACT_STAND, E.TIMEOUT: P.ACT_TIMEOUT,
+         E.SURRENDER: P.ACT_SURRENDER, E.BLACKJACK: P.ACT_BLACKJACK, E.BUST: P.ACT_BUST}
+# Turn commands and the engine action each one takes.
+TURN_COMMANDS = {"HIT": E.HIT, "STAND": E.STAND, "DOUBLE": E.DOUBLE, "SPLIT": E.SPLIT, "SURRENDER": E.SURRENDER}
+
+
+class Connection:
+    """A client stream, the wire codec it negotiated and the player it is seated as
+    (None for a spectator)."""
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, player: Player,
+                 codec=P.TEXT, policy: OutboundPolicy = None):
+        self.reader = reader
+        self.writer = writer
+        self.player = player
+        self.codec = codec
+        self.out = AsyncOutbound(writer, policy)
+        self.table = None
+        self.hint_task = None       # at most one strategy lookup in flight per client
+
+    def send(self, *msgs):
+        sizes = {}
+        data = self.codec.encode(msgs, sizes)
+        METRICS.count_sent(sizes)
+        return self.send_bytes(data)
+
+    def send_bytes(self, data: bytes):
+        return self.out.send(data)
+
+    async def read_command(self):
+        """Return the next command word from the client, or None at EOF."""
+        if self.codec.binary:
+            try:
+                (n,) = struct.unpack(">H", await self.reader.readexactly(2))
+                if n == 0 or n > P.MAX_FRAME:
+                    raise P.FrameError(f"bad frame length {n}")
+                msg = P.from_frame(await self.reader.readexactly(n))
+            except asyncio.IncompleteReadError:
+                return None
+            return P.to_text(msg) if msg[0] in P.CLIENT_TYPES else ""
+        data = await self.reader.readline()
+        if not data:
+            return None
+        return data.decode(errors="ignore").strip()
+
+    def close(self):
+        try:
+            self.out.flush()
+            self.writer.close()
+        except Exception: pass
+
+
+class Table:
+    """One blackjack table: its own shoe and RNG, dealer, seats, turn order, countdown and turn deadline.
+
+    All methods run on the event loop thread, so a table never needs a lock and
+    tables never wait on each other. Hand and turn changes are broadcast as
+    sequenced deltas; full snapshots go only to joiners, at round start and on
+    RESYNC.
+    """
+    def __init__(self, table_id: int, max_players: int = MAX_PLAYERS, wheel: TimerWheel = None,
+                 turn_timeout: float = TURN_TIMEOUT, timings: TableTimings = None, ledger: Ledger = None,
+                 history: HistoryWriter = None, rng=None, sessions: dict = None, token_prefix: str = "",
+                 names: set = None):
+        self.table_id = table_id
+        self.max_players = max_players
+        self.wheel = wheel if wheel is not None else TimerWheel()
+        self.ledger = ledger if ledger is not None else Ledger()
+        self.stakes = {}
+        self.sessions = sessions if sessions is not None else {}    # resume token -> Table, shared by a lobby
+        self.token_prefix = token_prefix    # on resume tokens and automatic names; a cluster worker's "wK-"
+        self.names = names if names is not None else set()     # names in use, shared by a lobby (the ledger's key)
+        self.tokens = {}        # Player -> resume token
+        self.resumable = False  # hand out resume tokens; a lobby holding dropped seats sets this
+        self.away = {}          # Player -> grace timer, while their connection is down
+        self.turn_timeout = turn_timeout
+        self.timings = timings if timings is not None else TableTimings()
+        self.turn_timer = None
+        self.turn_no = 0
+        self.insurance_timer = None
+        self.turn_started = 0.0
+        self.round_started = 0.0
+        self.conns = {}
+        self.spectators = set()
+        self.players = []
+        self.waiting_players = []
+        self.deck = Shoe(rng=rng)
+        self.dealer = Dealer()
+        self.recorder = RoundRecorder(history, table_id, self.dealer.hit_on_soft_17)
+        self.game_started = False
+        self.engine = E.RoundEngine(self.deck, self.dealer, self.recorder)
+        self.rounds_played = 0
+        self.countdown = None
+        self.join_seconds = JOIN_COUNTDOWN
+        self.between_seconds = BETWEEN_COUNTDOWN
+        self.state_seq = 0
+        self.dealer_hidden = True
+
+    def __len__(self):
+        return len(self.conns)
+
+    def has_seat(self):
+        return len(self.players) + len(self.waiting_players) < self.max_players
+
+    def next_available_player_name(self):
+        i = 1
+        while f"{self.token_prefix}Player{i}" in self.names:
+            i += 1
+        return f"{self.token_prefix}Player{i}"
+
+    def broadcast(self, *msgs):
+        # Encode once per codec in use, not once per connection: seated players
+        # are queued first, then every spectator gets the same bytes. A slow
+        # spectator only ever fills its own (smaller) queue and is dropped.
+        started = time.perf_counter()
+        encoded = {}
+        sizes = {}
+        recipients = {}
+        dead = []
+        for c in list(self.conns.values()) + list(self.spectators):
+            data = encoded.get(c.codec)
+            if data is None:
+                sizes[c.codec] = {}
+                data = encoded[c.codec] = c.codec.encode(msgs, sizes[c.codec])
+            if c.send_bytes(data):
+                recipients[c.codec] = recipients.get(c.codec, 0) + 1
+            else:
+                dead.append(c)
+        for codec, n in recipients.items():
+            METRICS.count_sent(sizes[codec], n)
+        METRICS.fanout.observe(sum(recipients.values()))
+        METRICS.broadcast.observe(time.perf_counter() - started)
+        for c in dead:
+            if c.player is None:
+                self.unwatch(c)
+            else:
+                self.remove(c)
+
+    def snapshot(self, turn=True):
+        """The full table state; turn=False leaves out TURN (at the deal, whose D_TURN delta follows)."""
+        msgs = [(P.SNAPSHOT, self.state_seq)]
+        msgs += [(P.STATE_PLAYER, P.hand_label(p.name, i), P.card_codes(h.hand), h.hand_value())
+                 for p in self.players for i, h in enumerate(p.hands)]
+        msgs += [self.chips(p) for p in self.players]
+        if self.dealer_hidden:
+            msgs.append((P.STATE_DEALER, True, P.card_codes(self.dealer.hand[:1]), 0))
+        else:
+            msgs.append((P.STATE_DEALER, False, P.card_codes(self.dealer.hand), self.dealer.hand_value()))
+        current = self.engine.current() if turn else None
+        if current is not None:
+            msgs.append((P.TURN, self.label(current)))
+        return msgs
+
+    @staticmethod
+    def label(p: Player):
+        """Wire label of p's active hand."""
+        return P.hand_label(p.name, p.current)
+
+    def chips(self, p: Player):
+        """p's balance and the stake riding on this round (or queued for the next)."""
+        return (P.CHIPS, p.name, p.chips, p.bet if p.hand else self.stakes.get(p, MIN_BET))
+
+    def delta(self, kind, name, card=P.NO_CARD, value=0):
+        """Build the next sequenced state delta."""
+        self.state_seq += 1
+        return (P.DELTA, self.state_seq, kind, name, card, value)
+
+    def card_delta(self, p, i, card, value):
+        return self.delta(P.D_CARD, P.hand_label(p.name, i), P.card_code(card), value)
+
+    def publish(self, events):
+        """Broadcast what the engine did; settle the round when it says so."""
+        msgs = []
+        for ev in events:
+            kind = ev[0]
+            if kind == E.DEAL:
+                msgs += [(P.ROUND_START,)] + self.snapshot(turn=False)
+            elif kind == E.INSURANCE:
+                seconds = min(INSURANCE_SECONDS, self.turn_timeout) if self.turn_timeout else INSURANCE_SECONDS
+                self.insurance_timer = self.wheel.schedule(seconds, self.insurance_timed_out, self.rounds_played)
+                msgs.append((P.ACTION, P.ACT_INSURANCE, "Dealer", P.NO_CARD))
+            elif kind == E.INSURED:
+                msgs += [(P.ACTION, P.ACT_INSURE, ev[1].name, P.NO_CARD), self.chips(ev[1])]
+            elif kind == E.TURN:
+                self.end_turn()
+                msgs.append(self.begin_turn(ev[1], ev[2]))
+            elif kind in (E.HIT, E.DOUBLE):
+                p, i, card, value = ev[1:]
+                msgs += [(P.ACTION, _ACTS[kind], P.hand_label(p.name, i), P.card_code(card)),
+                         self.card_delta(p, i, card, value)]
+                if kind == E.DOUBLE:
+                    msgs.append(self.chips(p))
+            elif kind == E.SPLIT:
+                p, i, moved, new = ev[1:]
+                msgs += [(P.ACTION, P.ACT_SPLIT, P.hand_label(p.name, i), P.NO_CARD),
+                         self.delta(P.D_SPLIT, P.hand_label(p.name, new), P.card_code(moved), moved.value),
+                         self.chips(p)]
+            elif kind == E.CARD:
+                msgs.append(self.card_delta(*ev[1:]))
+            elif kind in _ACTS:
+                msgs.append((P.ACTION, _ACTS[kind], P.hand_label(ev[1].name, ev[2]), P.NO_CARD))
+            elif kind == E.DEALER:
+                self.end_turn()
+                msgs.append(self.delta(P.D_TURN, "Dealer"))
+            elif kind == E.REVEAL:
+                self.dealer_hidden = False
+                msgs.append(self.delta(P.D_REVEAL, "Dealer", P.card_code(ev[1]), ev[2]))
+            elif kind == E.DEALER_HIT:
+                msgs += [(P.ACTION, P.ACT_DEALER_HIT, "", P.card_code(ev[1])),
+                         self.card_delta(self.dealer, 0, ev[1], ev[2])]
+            elif kind == E.SETTLE:
+                self.broadcast(*msgs)
+                msgs = []
+                self.resolve_round()
+            elif kind == E.ABORT:
+                self.end_turn()
+                self.game_started = False
+        if self.insurance_timer and self.engine.phase != E.INSURING:
+            self.insurance_timer.cancel()
+            self.insurance_timer = None
+        if msgs:
+            self.broadcast(*msgs)
+
+    # --- seating ---
+
+    def join(self, conn: Connection):
+        conn.table = self
+        name = conn.player.name
+        if (not name) or (name in self.names):
+            name = conn.player.name = self.next_available_player_name()
+        self.names.add(name)
+        conn.player.chips = self.ledger.balance(name)
+        self.conns[conn.player] = conn
+        if self.game_started:
+            self.waiting_players.append(conn.player)
+            conn.send((P.INFO, "Round in progress. You will join next round."))
+            self.broadcast((P.EVENT, P.JOIN_WAIT, name))
+            self.greet(conn)
+        else:
+            self.players.append(conn.player)
+            self.broadcast((P.EVENT, P.JOIN, name))
+            self.greet(conn)
+            # Between rounds too: the table may be idle because nobody could cover a bet.
+            self.start_countdown(self.join_seconds if self.rounds_played == 0 else self.between_seconds)
+
+    def greet(self, conn: Connection):
+        """Send the player their name (and resume token, if dropped seats are held), then the table state."""
+        p = conn.player
+        msgs = [(P.NAME, p.name)]
+        if self.resumable:
+            token = self.tokens.get(p)
+            if token is None:
+                token = self.tokens[p] = self.token_prefix + secrets.token_hex(8)
+                self.sessions[token] = self
+            msgs.append((P.RESUME_TOKEN, token))
+        conn.send(*msgs, *self.snapshot())
+
+    def resume(self, conn: Connection, token) -> bool:
+        """Hand the seat holding token to conn; False if no seat here holds it."""
+        p = next((q for q, t in self.tokens.items() if t == token), None)
+        if p is None:
+            return False
+        conn.player = p
+        conn.table = self
+        old = self.conns.get(p)        # still set if the old connection has not noticed it is dead
+        timer = self.away.pop(p, None)
+        if timer:
+            timer.cancel()
+        self.conns[p] = conn
+        if old is not None:
+            old.close()
+        self.greet(conn)
+        self.broadcast((P.EVENT, P.BACK, p.name))
+        if not self.game_started:
+            self.start_countdown(self.join_seconds if self.rounds_played == 0 else self.between_seconds)
+        return True
+
+    def hold(self, conn: Connection, seconds, expired=None):
+        """conn dropped: keep its player's seat for `seconds`, then give it up and
+        call expired()."""
+        p = conn.player
+        conn.close()
+        if self.conns.get(p) is not conn:
+            return
+        del self.conns[p]
+        self.away[p] = self.wheel.schedule(seconds, self._grace_expired, p, expired)
+        self.broadcast((P.EVENT, P.AWAY, p.name))
+
+    def _grace_expired(self, p: Player, expired):
+        if self.away.pop(p, None) is not None:
+            self.depart(p)
+            if expired is not None:
+                expired()
+
+    def watch(self, conn: Connection):
+        """Add a read-only spectator and send it the current state."""
+        conn.table = self
+        self.spectators.add(conn)
+        conn.send((P.INFO, f"Spectating table {self.table_id}. You will not be dealt in."), *self.snapshot())
+
+    def unwatch(self, conn: Connection):
+        if conn in self.spectators:
+            self.spectators.discard(conn)
+            conn.close()
+
+    def remove(self, conn: Connection):
+        p = conn.player
+        conn.close()
+        if self.conns.get(p) is not conn:
+            return
+        del self.conns[p]
+        self.depart(p)
+
+    def depart(self, p: Player):
+        """p is gone for good: give up the seat and forget the resume token."""
+        self.sessions.pop(self.tokens.pop(p, None), None)
+        self.names.discard(p.name)
+        self.stakes.pop(p, None)
+        if p in self.waiting_players:
+            self.waiting_players.remove(p)
+        seated = p in self.players
+        if seated:
+            self.players.remove(p)
+        self.broadcast((P.EVENT, P.LEAVE, p.name))
+        if seated and self.game_started:
+            self.publish(self.engine.leave(p))
+        if not self.players:
+            self.cancel_countdown()
+        elif not self.game_started and self.rounds_played == 0:
+            self.start_countdown(self.join_seconds)
+
+    # --- countdowns ---
+
+    def start_countdown(self, seconds):
+        if self.game_started or not self.players or self.countdown:
+            return
+        self.countdown = Countdown(self.wheel, seconds, lambda s: self.broadcast((P.COUNTDOWN, s)),
+                                   self._countdown_done)
+
+    def _countdown_done(self):
+        self.countdown = None
+        self.broadcast((P.GAME_START,))
+        self.start_round()
+
+    def cancel_countdown(self):
+        if self.countdown:
+            self.countdown.cancel()
+            self.countdown = None
+
+    # --- round flow ---
+
+    def start_round(self):
+        self.cancel_countdown()
+        seated = [p for p in self.players if p not in self.away]    # a dropped seat sits the round out
+        taken = self.take_bets(seated)
+        if not taken:
+            return
+        self.game_started = True
+        self.dealer_hidden = True
+        self.rounds_played += 1
+        METRICS.rounds.inc()
+        self.round_started = time.monotonic()
+        self.deck.shuffle_if_needed()
+        for p in self.players: p.clear_hand()
+        self.publish(self.engine.start([p for p in seated if p in taken], taken, self.rounds_played))
+
+    def insurance_timed_out(self, round_no):
+        if self.game_started and self.rounds_played == round_no:
+            self.publish(self.engine.close_insurance())
+
+    def answer_insurance(self, conn: Connection, insure):
+        p = conn.player
+        if self.engine.check(p, E.INSURE):
+            return
+        if insure and not self.stake_more(conn, p.bet // 2, "insure"):
+            insure = False
+        self.publish(self.engine.insure(p, insure))
+
+    def take_bets(self, seated):
+        """Debit each seated player's stake (all they have, if less) for the round and
+        return {player: stake} for those dealt in; a player with no chips sits out.
+
+        The ledger logs the debit in the background; the deal never waits on disk.
+        """
+        taken = {}
+        for p in seated:
+            stake = min(self.stakes.get(p, MIN_BET), self.ledger.balance(p.name))
+            if stake:
+                p.chips = self.ledger.apply(p.name, -stake, "bet")
+                taken[p] = stake
+            elif p in self.conns:
+                self.conns[p].send((P.ERROR, "Not enough chips to bet."))
+        return taken
+
+    def stake_more(self, conn: Connection, amount, why):
+        """Debit an extra stake (a double, split or insurance) in full, or refuse it."""
+        p = conn.player
+        if self.ledger.balance(p.name) < amount:
+            conn.send((P.ERROR, f"Not enough chips to {why}."))
+            return False
+        p.chips = self.ledger.apply(p.name, -amount, why)
+        return True
+
+    def set_stake(self, conn: Connection, amount):
+        if not MIN_BET <= amount <= MAX_BET:
+            conn.send((P.ERROR, f"Bets are {MIN_BET} to {MAX_BET} chips."))
+            return
+        self.stakes[conn.player] = amount
+        conn.send(self.chips(conn.player))
+
+    def begin_turn(self, p: Player, i):
+        """Arm the deadline for p's hand i; returns the delta announcing the turn."""
+        self.turn_no += 1
+        self.turn_started = time.monotonic()
+        if self.turn_timeout:
+            self.turn_timer = self.wheel.schedule(self.turn_timeout, self.turn_timed_out, p, self.turn_no)
+        return self.delta(P.D_TURN, P.hand_label(p.name, i))
+
+    def end_turn(self):
+        if self.turn_timer:
+            self.turn_timer.cancel()
+            self.turn_timer = None
+        if self.turn_started:
+            self.timings.turn.observe(time.monotonic() - self.turn_started)
+            self.turn_started = 0.0
+
+    def turn_timed_out(self, p: Player, turn_no):
+        """Auto-stand a player who let their turn deadline pass."""
+        if not self.game_started or turn_no != self.turn_no or self.engine.current() is not p:
+            return
+        self.timings.timeouts += 1
+        self.publish(self.engine.act(p, E.TIMEOUT))
+
+    def resolve_round(self):
+        """Pay out the engine's results and close the round."""
+        by_outcome = ([], [], [])
+        msgs = []
+        for p, outcomes, won, insured in self.engine.results:
+            if insured:
+                p.chips = self.ledger.apply(p.name, insured, "insurance")
+            for i, outcome in enumerate(outcomes):
+                if won[i]:
+                    p.chips = self.ledger.apply(p.name, won[i], outcome.lower())
+                code = P.OUTCOMES.index(outcome)
+                by_outcome[min(code, 2)].append(P.hand_label(p.name, i))     # a surrender counts as a loss
+                msgs.append((P.RESULT, P.hand_label(p.name, i), code))
+        msgs.append((P.RESULT_SUMMARY,) + tuple(tuple(names) for names in by_outcome))
+        msgs += [self.chips(p) for p in self.players]
+        msgs.append((P.ROUND_END,))
+        self.broadcast(*msgs)
+        self.end_turn()
+        self.timings.round.observe(time.monotonic() - self.round_started)
+        self.game_started = False
+        for p in self.players: p.clear_hand()
+        self.dealer.clear_hand()
+        self.dealer_hidden = True
+
+        while self.waiting_players and len(self.players) < self.max_players:
+            np = self.waiting_players.pop(0)
+            self.players.append(np)
+            self.broadcast((P.EVENT, P.JOIN, np.name))
+        if self.players:
+            self.start_countdown(self.between_seconds)
+
+    def handle_action(self, conn: Connection, line: str):
+        player = conn.player
+        amount = P.parse_bet(line)
+        if amount is not None:
+            if player is not None:
+                self.set_stake(conn, amount)
+            return
+        cmd = line.strip().upper()
+        if cmd == "PING":
+            conn.send((P.PING,))
+            return
+        if cmd == "HINT":
+            if self.game_started and player is not None and conn.hint_task is None:
+                conn.hint_task = asyncio.get_running_loop().create_task(self.send_hint(conn))
+            return
+        if cmd == "RESYNC":
+            conn.send(*self.snapshot())
+            return
+        if not self.game_started or player is None: return
+        if cmd in ("INSURE", "DECLINE"):
+            self.answer_insurance(conn, cmd == "INSURE")
+            return
+        kind = TURN_COMMANDS.get(cmd)
+        if kind is None or self.engine.current() is not player:
+            return
+        err = self.engine.check(player, kind)
+        if err:
+            conn.send((P.ERROR, err))
+            return
+        if kind in (E.DOUBLE, E.SPLIT) and not self.stake_more(conn, player.active.bet, cmd.lower()):
+            return
+        self.publish(self.engine.act(player, kind))
+
+    async def send_hint(self, conn: Connection):
+        # A cold strategy lookup can take a while, so keep it off the event loop. The
+        # worker only sees a snapshot of the cards; the live hands keep changing here.
+        player, turn_no = conn.player, self.turn_no
+        try:
+            if not self.dealer.hand or not player.hand or player.hand_value() >= 21:
+                return
+            hand, upcard = tuple(player.hand), self.dealer.hand[0]
+            loop = asyncio.get_running_loop()
+            ev_stand, ev_hit = await loop.run_in_executor(None, strategy.evaluate, hand, upcard)
+            if turn_no != self.turn_no or conn.player is not player or tuple(player.hand) != hand:
+                return      # the hand moved on while we were computing
+            action = "HIT" if ev_hit > ev_stand else "STAND"
+            conn.send((P.HINT, P.COMMANDS.index(action), ev_stand, ev_hit))
+        except Exception as e:
+            METRICS.error("hint", e)
+        finally:
+            conn.hint_task = None
+
+
+class Lobby:
+    """Assigns incoming connections to tables, opening new tables as others fill.
+
+    Table ids count up from first_table_id in steps of table_stride, so the
+    lobbies of a cluster's workers never hand out the same id.
+    """
+    def __init__(self, max_players: int = MAX_PLAYERS, policy: OutboundPolicy = None,
+                 turn_timeout: float = TURN_TIMEOUT, countdown: int = None, ledger: Ledger = None,
+                 history: HistoryWriter = None, seed=None, first_table_id: int = 1, table_stride: int = 1,
+                 resume_grace: float = RESUME_GRACE, token_prefix: str = ""):
+        self.max_players = max_players
+        # Seeded, each table gets its own reproducible stream; otherwise the OS CSPRNG.
+        self._seeds = random.Random(seed) if seed is not None else None
+        self.history = history
+        self.ledger = ledger if ledger is not None else Ledger()
+        self.policy = policy or OutboundPolicy()
+        self.spectator_policy = OutboundPolicy(min(self.policy.high_water, SPECTATOR_HIGH_WATER))
+        self.turn_timeout = turn_timeout
+        self.countdown = countdown
+        self.resume_grace = resume_grace
+        self.token_prefix = token_prefix
+        self.sessions = {}      # resume token -> Table
+        self.names = set()      # player names in use at any table
+        self.wheel = TimerWheel()
+        self.timings = TableTimings()
+        self._reported_rounds = 0
+        self.wheel.every(REPORT_INTERVAL, self.report_timings)
+        if history is not None:
+            self.wheel.every(HISTORY_FLUSH, history.flush)
+        self.tables = {}
+        self.active = 0
+        self._next_table_id = first_table_id
+        self.table_stride = table_stride
+
+    def report_timings(self):
+        """Log turn latency and throughput, aggregated over every table."""
+        if self.timings.round.count != self._reported_rounds:
+            self._reported_rounds = self.timings.round.count
+            pause = BETWEEN_COUNTDOWN if self.countdown is None else self.countdown
+            print(f"Tables: {len(self.tables)} {self.timings.summary(pause)}")
+
+    def open_table(self) -> Table:
+        rng = make_rng(self._seeds.getrandbits(64)) if self._seeds else make_rng(mode="secure")
+        t = Table(self._next_table_id, self.max_players, self.wheel, self.turn_timeout, self.timings,
+                  self.ledger, self.history, rng, self.sessions, self.token_prefix, self.names)
+        if self.countdown is not None:
+            t.join_seconds = t.between_seconds = self.countdown
+        t.resumable = bool(self.resume_grace)
+        self.tables[t.table_id] = t
+        self._next_table_id += self.table_stride
+        return t
+
+    def load(self):
+        """Connections, tables and the free seats at tables already in play."""
+        open_seats = sum(t.max_players - len(t.players) - len(t.waiting_players)
+                         for t in self.tables.values() if t.players)
+        return {"conns": self.active, "tables": len(self.tables), "open_seats": open_seats,
+                "rounds": self.timings.round.count}
+
+    def assign(self, conn: Connection) -> Table:
+        for t in self.tables.values():
+            if t.has_seat():
+                break
+        else:
+            t = self.open_table()
+        t.join(conn)
+        return t
+
+    def spectate(self, conn: Connection, table_id: str) -> Table:
+        """Attach a spectator to the requested table, else the fullest one."""
+        t = self.tables.get(int(table_id)) if table_id.isdigit() else None
+        if t is None:
+            t = max(self.tables.values(), key=len, default=None)
+        if t is None:
+            t = self.open_table()
+        t.watch(conn)
+        return t
+
+    def resume(self, conn: Connection, token) -> bool:
+        t = self.sessions.get(token)
+        return t is not None and t.resume(conn, token)
+
+    def release(self, conn: Connection, dropped=False):
+        """conn has gone. A player who dropped (rather than quit) keeps their seat
+        for resume_grace seconds."""
+        t = conn.table
+        if t is None:
+            return
+        if conn.player is None:
+            t.unwatch(conn)
+        elif dropped and self.resume_grace:
+            t.hold(conn, self.resume_grace, lambda: self.vacate(t))
+        else:
+            t.remove(conn)
+        self.vacate(t)
+
+    def vacate(self, t: Table):
+        """Stop a table nobody is connected to or holding a seat at."""
+        if not t.conns and not t.away:
+            t.cancel_countdown()
+            t.end_turn()
+            if not t.spectators:
+                self.tables.pop(t.table_id, None)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, hello=None):
+        """Serve one client. hello is its first line if something else (a cluster
+        router) has already read it off the socket."""
+        conn = None
+        dropped = True
+        self.wheel.start_async()
+        self.active += 1
+        METRICS.connections.inc()
+        try:
+            if hello is None:
+                hello = (await reader.readline()).decode(errors="ignore")
+            if not hello:
+                return      # closed before saying hello (e.g. a readiness probe): seat nobody
+            codec, name = P.negotiate(hello)
+            watch = P.watch_request(name)
+            token = P.resume_request(name)
+            if token is not None:
+                conn = Connection(reader, writer, None, codec, self.policy)
+                if not self.resume(conn, token):
+                    conn.send((P.ERROR, "Unknown or expired resume token."))
+                    conn.close()
+                    conn = None
+                    return
+            elif watch is None:
+                conn = Connection(reader, writer, Player(P.player_name(name)), codec, self.policy)
+                self.assign(conn)
+            else:
+                conn = Connection(reader, writer, None, codec, self.spectator_policy)
+                self.spectate(conn, watch)
+            while True:
+                line = await conn.read_command()
+                if line is None:
+                    break
+                if line.lower() == "quit":
+                    dropped = False
+                    break
+                started = time.perf_counter()
+                conn.table.handle_action(conn, line)
+                METRICS.lock_hold.observe(time.perf_counter() - started)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            # Includes oversized lines (StreamReader limit) and frames: the client is dropped.
+            dropped = False
+            METRICS.error("handle_client", e)
+        finally:
+            self.active -= 1
+            if conn:
+                self.release(conn, dropped)
+            else:
+                try: writer.close()
+                except Exception: pass
+
+
+async def serve(host=HOST, port=PORT, max_players=MAX_PLAYERS, policy: OutboundPolicy = None,
+                turn_timeout=TURN_TIMEOUT, countdown=None, metrics_port=None, metrics_log=None,
+                ledger: Ledger = None, history: HistoryWriter = None, seed=None, resume_grace=RESUME_GRACE):
+    lobby = Lobby(max_players, policy, turn_timeout, countdown, ledger, history, seed, resume_grace=resume_grace)
+    server = await asyncio.start_server(lobby.handle_client, host, port, limit=P.MAX_LINE)
+    print(f"Server on {host}:{port} (asyncio)")
+    METRICS.watch(lambda: lobby.active, lambda: len(lobby.tables), lobby.timings, STATS,
+                  lambda: sum(len(t.spectators) for t in list(lobby.tables.values())), lobby.ledger)
+    if metrics_port:
+        print(f"Metrics on http://127.0.0.1:{MetricsListener(REGISTRY, port=metrics_port).port}/metrics")
+    if metrics_log:
+        lobby.wheel.every(metrics_log, lambda: print(REGISTRY.summary()))
+        lobby.wheel.start_async()
+    async with server:
+        await server.serve_forever()
+
+def run_server(host=HOST, port=PORT, max_players=MAX_PLAYERS, high_water=None, turn_timeout=None,
+               countdown=None, metrics_port=None, metrics_log=None, ledger_path=None, history_path=None,
+               seed=None, resume_grace_seconds=None):
+    policy = OutboundPolicy(high_water) if high_water else None
+    if turn_timeout is None:
+        turn_timeout = TURN_TIMEOUT
+    if resume_grace_seconds is None:
+        resume_grace_seconds = RESUME_GRACE
+    ledger = Ledger(ledger_path) if ledger_path else Ledger()
+    if ledger_path:
+        print(f"Ledger in {ledger_path}: {len(ledger.balances)} accounts")
+    history = HistoryWriter(history_path) if history_path else None
+    try:
+        asyncio.run(serve(host, port, max_players, policy, turn_timeout, countdown, metrics_port, metrics_log,
+                          ledger, history, seed, resume_grace_seconds))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ledger.close()
+        if history is not None:
+            history.close()
+
+if __name__ == "__main__":
+    run_server()
@@ -1,7 +1,10 @@
-import socket, threading, sys
+import socket, threading, sys, time
+from network import protocol as P
 
 DEFAULT_HOST = "localhost"
 DEFAULT_PORT = 5555
+RESUME_ATTEMPTS = 5
+RESUME_BACKOFF = 0.5        # seconds before the first retry, doubling each time
 
 class BlackjackClient:
     def __init__(self):
@@ -10,35 +13,92 @@ class BlackjackClient:
         self._on_message = None
         self._lock = threading.Lock()
         self.running = False
+        self.binary = False
+        self.address = None
+        self.token = None           # resume token from the server's RESUME_TOKEN message
 
-    def connect(self, host, port, name, on_message):
+    def connect(self, host, port, name, on_message, binary=False):
+        """Connect and start delivering parsed protocol messages to on_message.
+
+        With binary=True the binary frame protocol is requested instead of text.
+        If the connection drops, the client reconnects and resumes its seat.
+        """
         self._on_message = on_message
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.sock.connect((host, port))
+        self.binary = binary
+        self.address = (host, port)
+        self.token = None
         self.running = True
+        self._open(name.strip())
         self._recv_thread = threading.Thread(target=self._loop, daemon=True)
         self._recv_thread.start()
-        self.send(name)
+
+    def _open(self, name):
+        sock = socket.create_connection(self.address)
+        hello = f"{P.BINARY_HELLO} {name}" if self.binary else name
+        with self._lock:
+            self.sock = sock
+            sock.sendall((hello + "\n").encode())
 
     def _loop(self):
         try:
             while self.running:
-                data = self.sock.recv(4096)
-                if not data:
+                self._receive()
+                if not (self.running and self._resume()):
                     break
-                self._on_message(data.decode(errors="ignore"))
         finally:
             self.running = False
 
+    def _receive(self):
+        decoder = P.StreamDecoder(self.binary)
+        try:
+            while self.running:
+                data = self.sock.recv(4096)
+                if not data:
+                    break
+                decoder.feed(data)
+                for item in decoder:
+                    msg = item if self.binary else P.parse_text(item)
+                    if msg[0] == P.RESUME_TOKEN:
+                        self.token = msg[1]
+                    self._on_message(msg)
+        except (OSError, P.FrameError):
+            pass
+
+    def _resume(self):
+        """Reconnect after a drop and ask for the held seat back."""
+        token, self.token = self.token, None     # a successful resume sends it again
+        if not token:
+            return False
+        for attempt in range(RESUME_ATTEMPTS):
+            time.sleep(RESUME_BACKOFF * 2 ** attempt)
+            if not self.running:
+                return False
+            try:
+                self._open(f"{P.RESUME} {token}")
+                return True
+            except OSError:
+                pass
+        return False
+
     def send(self, line):
         if not self.running: return
+        word = line.strip()
+        if self.binary:
+            msg = P.client_message(word)
+            if msg is None: return
+            data = P.to_frame(msg)
+        else:
+            data = (word + "\n").encode()
         with self._lock:
-            self.sock.sendall((line.strip() + "\n").encode())
+            try: self.sock.sendall(data)
+            except OSError: pass    # dropped; the command is lost if the seat is resumed
 
     def close(self):
+        """Leave the table: QUIT gives the seat up now rather than after the resume grace."""
+        self.send("QUIT")
         self.running = False
         try: self.sock.close()
-        except: pass
+        except OSError: pass
 
 def start_client(host=DEFAULT_HOST, port=DEFAULT_PORT):
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -56,14 +116,17 @@ def start_client(host=DEFAULT_HOST, port=DEFAULT_PORT):
                 break
 
 def receive_messages(sock):
+    decoder = P.StreamDecoder()
     while True:
         try:
             data = sock.recv(4096)
-            if not data:
-                break
-            print(data.decode(errors="ignore"), end="")
-        except:
+        except OSError:
+            break
+        if not data:
             break
+        decoder.feed(data)
+        for line in decoder:
+            print(line)
 
 if __name__ == "__main__":
     host = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_HOST
@@ -0,0 +1,446 @@
+"""Cluster mode: asyncio lobbies in several worker processes behind one port.
+
+One server process is GIL-bound however its tables are arranged, so the
+cluster forks `workers` processes, each running its own Lobby (tables,
+timer wheel, ledger shard, history file), and puts a small router in front:
+
+* The router owns the listening socket. It reads each client's hello line
+  itself, asks the Placement policy which worker should have the client,
+  and passes the socket (with the hello it consumed) to that worker over
+  a Unix SOCK_SEQPACKET pair with SCM_RIGHTS. After that the router is out
+  of the path; the worker talks to the client directly.
+* Workers report their load to the router every STATUS_INTERVAL seconds
+  on the same pair, and the router restarts a worker that dies.
+* The router also listens on a local Unix socket (the control channel) for
+  one-line commands: STATUS answers with a JSON line describing every
+  worker, STOP shuts the cluster down. `python -m network.cluster STATUS`
+  sends one.
+
+SO_REUSEPORT would spread connections across workers with no router, but
+the kernel picks by address hash before anyone has seen the player's name,
+so a returning player could land on a worker that does not hold their
+balance. Placement needs the hello, hence the router.
+
+Each worker keeps its own ledger (LEDGER/worker-K) and history log
+(rounds.wK.bjh); table ids are interleaved across workers so every id in
+the logs is unique to the cluster.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import selectors
+import signal
+import socket
+import sys
+import time
+import zlib
+from network import protocol as P
+from network.async_server import Lobby, HOST, PORT, MAX_PLAYERS, TURN_TIMEOUT, RESUME_GRACE
+from network.outbound import OutboundPolicy, STATS
+from network.ledger import Ledger
+from game.history import HistoryWriter
+from network.metrics import MetricsListener, METRICS, REGISTRY
+
+CONTROL_PATH = "blackjack.sock"
+STATUS_INTERVAL = 1.0
+HELLO_TIMEOUT = 10.0
+
+
+class Placement:
+    """Chooses the worker for a new connection from the workers' last reported loads.
+
+    A named player always goes to the same worker (crc32 of the name), so an
+    account's balance lives in exactly one ledger shard; a RESUME goes to the
+    worker that issued the token, and a name a worker made up goes back to
+    that worker (both carry its "wK-" prefix). A player with no name goes
+    where a table in play has a free seat, else to the quietest worker. A
+    spectator goes to the worker that owns the table it asked for, or to the
+    busiest one.
+
+    Only workers in `available` are chosen. A spectator whose table's worker
+    is down watches elsewhere; a player whose account's worker is down (or
+    whose channel is full) is not placed at all, since another worker would
+    open the account in the wrong ledger shard.
+    """
+    def __init__(self, workers):
+        self.workers = workers
+
+    def choose(self, name, watch, loads, available=None):
+        """The worker for a connection, or None if it cannot be placed now."""
+        up = range(self.workers) if available is None else sorted(available)
+        if watch is not None:
+            if watch.isdigit() and int(watch) > 0 and (int(watch) - 1) % self.workers in up:
+                return (int(watch) - 1) % self.workers
+            return max(up, key=lambda k: loads[k]["conns"], default=None)
+        home = self._home(name)
+        if home is not None:
+            return home if home in up else None
+        return max(up, key=lambda k: (loads[k]["open_seats"], -loads[k]["conns"]), default=None)
+
+    def _home(self, name):
+        """The worker holding the account behind a seat request; None for a nameless player."""
+        token = P.resume_request(name)
+        key = P.player_name(name) if token is None else token     # what the worker will look up
+        worker, sep, _ = key.partition("-")
+        if sep and worker[:1] == "w" and worker[1:].isdigit():
+            return int(worker[1:]) % self.workers
+        if key:
+            return zlib.crc32(key.encode()) % self.workers
+        return None
+
+
+def shard_paths(k, ledger_path, history_path):
+    """Worker k's ledger directory and history log."""
+    ledger = os.path.join(ledger_path, f"worker-{k}") if ledger_path else None
+    if not history_path:
+        return ledger, None
+    root, ext = os.path.splitext(history_path)
+    return ledger, f"{root}.w{k}{ext}"
+
+
+# --- worker ---
+
+def run_worker(k, workers, chan, max_players=MAX_PLAYERS, high_water=None, turn_timeout=TURN_TIMEOUT,
+               countdown=None, metrics_port=None, metrics_log=None, ledger_path=None, history_path=None,
+               seed=None, resume_grace=RESUME_GRACE):
+    """Body of worker process k: serve whatever clients the router passes down chan."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)     # Ctrl-C is the router's to handle
+    ledger_dir, history_file = shard_paths(k, ledger_path, history_path)
+    ledger = Ledger(ledger_dir) if ledger_dir else Ledger()
+    history = HistoryWriter(history_file) if history_file else None
+    lobby = Lobby(max_players, OutboundPolicy(high_water) if high_water else None, turn_timeout, countdown,
+                  ledger, history, None if seed is None else seed + k, first_table_id=k + 1,
+                  table_stride=workers, resume_grace=resume_grace, token_prefix=f"w{k}-")
+    try:
+        asyncio.run(_serve_worker(k, lobby, chan, metrics_port, metrics_log))
+    finally:
+        ledger.close()
+        if history is not None:
+            history.close()
+
+async def _serve_worker(k, lobby, chan, metrics_port, metrics_log):
+    loop = asyncio.get_running_loop()
+    stop = loop.create_future()
+    def done():
+        if not stop.done():
+            stop.set_result(None)
+    loop.add_signal_handler(signal.SIGTERM, done)
+
+    async def adopt(sock, hello):
+        reader, writer = await asyncio.open_connection(sock=sock, limit=P.MAX_LINE)
+        await lobby.handle_client(reader, writer, hello)
+
+    def receive():
+        try:
+            hello, fds, _, _ = socket.recv_fds(chan, P.MAX_LINE + 1, 1)
+        except BlockingIOError:
+            return
+        if not hello and not fds:
+            done()          # the router has gone
+            return
+        for fd in fds:
+            loop.create_task(adopt(socket.socket(fileno=fd), hello.decode(errors="ignore")))
+
+    def report():
+        status = dict(lobby.load(), worker=k, pid=os.getpid())
+        try:
+            chan.send(json.dumps(status).encode())
+        except OSError:
+            pass
+
+    chan.setblocking(False)
+    loop.add_reader(chan.fileno(), receive)
+    METRICS.watch(lambda: lobby.active, lambda: len(lobby.tables), lobby.timings, STATS,
+                  lambda: sum(len(t.spectators) for t in list(lobby.tables.values())), lobby.ledger)
+    if metrics_port:
+        print(f"Worker {k} metrics on http://127.0.0.1:{MetricsListener(REGISTRY, port=metrics_port + k).port}/metrics")
+    if metrics_log:
+        lobby.wheel.every(metrics_log, lambda: print(f"Worker {k}: {REGISTRY.summary()}"))
+    lobby.wheel.every(STATUS_INTERVAL, report)
+    lobby.wheel.start_async()
+    report()
+    await stop
+
+
+# --- router ---
+
+class Router:
+    """Accepts clients, places them on workers, supervises the workers and
+    answers the control channel. Single-threaded, on a selector."""
+    def __init__(self, host=HOST, port=PORT, workers=None, control_path=CONTROL_PATH, placement=None,
+                 **worker_options):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.control_path = control_path
+        self.placement = placement or Placement(self.workers)
+        self.worker_options = worker_options
+        self.procs = [None] * self.workers
+        self.chans = [None] * self.workers
+        self.loads = [self._idle_load(k) for k in range(self.workers)]
+        self.routed = 0
+        self.restarts = 0
+        self.started = time.time()
+        self.selector = selectors.DefaultSelector()
+        self.pending = {}           # client socket -> (hello bytes so far, deadline)
+        self.running = False
+        self.listener = None
+        self.control = None
+
+    @staticmethod
+    def _idle_load(k):
+        return {"worker": k, "pid": None, "conns": 0, "tables": 0, "open_seats": 0, "rounds": 0}
+
+    def spawn(self, k):
+        """Fork worker k with a fresh channel. Everything else the router holds is closed in the child."""
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        inherited = [s for s in (self.listener, self.control, ours, *self.chans) if s is not None]
+        inherited += list(self.pending)
+        proc = multiprocessing.get_context("fork").Process(
+            target=_worker_main, args=(k, self.workers, theirs, inherited, self.worker_options),
+            name=f"blackjack-worker-{k}", daemon=True)
+        proc.start()
+        theirs.close()
+        ours.setblocking(False)     # a worker that stops reading must not stall the router
+        self.procs[k] = proc
+        self.chans[k] = ours
+        self.loads[k] = self._idle_load(k)
+        self.selector.register(ours, selectors.EVENT_READ, ("worker", k))
+
+    def serve(self):
+        for k in range(self.workers):
+            self.spawn(k)
+        self.listener = socket.create_server((self.host, self.port))
+        self.listener.setblocking(False)
+        self.selector.register(self.listener, selectors.EVENT_READ, ("accept",))
+        if self.control_path:
+            if os.path.exists(self.control_path):
+                os.unlink(self.control_path)
+            self.control = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.control.bind(self.control_path)
+            self.control.listen()
+            self.control.setblocking(False)
+            self.selector.register(self.control, selectors.EVENT_READ, ("control",))
+        print(f"Server on {self.host}:{self.port} (cluster of {self.workers} workers, "
+              f"control on {self.control_path or 'none'})")
+        self.running = True
+        try:
+            while self.running:
+                for key, _ in self.selector.select(timeout=1.0):
+                    kind = key.data[0]
+                    if kind == "accept":
+                        self._accept()
+                    elif kind == "hello":
+                        self._read_hello(key.fileobj)
+                    elif kind == "worker":
+                        self._read_worker(key.data[1])
+                    elif kind == "control":
+                        self._accept_control()
+                    else:
+                        self._read_control(key.fileobj, key.data[1])
+                self._expire_hellos()
+        finally:
+            self.shutdown()
+
+    def stop(self):
+        self.running = False
+
+    def shutdown(self):
+        """Stop every worker (they commit their ledgers on SIGTERM) and close up."""
+        for proc in self.procs:
+            if proc is not None and proc.is_alive():
+                proc.terminate()
+        for proc in self.procs:
+            if proc is not None:
+                proc.join(5)
+        for sock in list(self.pending) + [s for s in (self.listener, self.control, *self.chans) if s]:
+            sock.close()
+        self.pending.clear()
+        if self.control is not None and os.path.exists(self.control_path):
+            os.unlink(self.control_path)
+        self.selector.close()
+
+    # --- clients ---
+
+    def _accept(self):
+        try:
+            sock, _ = self.listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        self.pending[sock] = (b"", time.monotonic() + HELLO_TIMEOUT)
+        self.selector.register(sock, selectors.EVENT_READ, ("hello",))
+
+    def _read_hello(self, sock):
+        """Take the hello line off the socket (and nothing after it), then place the client."""
+        hello, deadline = self.pending[sock]
+        try:
+            peeked = sock.recv(P.MAX_LINE, socket.MSG_PEEK)
+            end = peeked.find(b"\n")
+            if peeked:
+                hello += sock.recv(end + 1 if end >= 0 else len(peeked))
+        except BlockingIOError:
+            return
+        except OSError:
+            peeked = b""
+        if not peeked or len(hello) > P.MAX_LINE:
+            self._drop(sock)
+        elif end >= 0:
+            self.selector.unregister(sock)
+            del self.pending[sock]
+            self._place(sock, hello)
+        else:
+            self.pending[sock] = (hello, deadline)
+
+    def _place(self, sock, hello):
+        codec, name = P.negotiate(hello.decode(errors="ignore"))
+        watch = P.watch_request(name)
+        up = {k for k, chan in enumerate(self.chans) if chan is not None}
+        while True:
+            k = self.placement.choose(name, watch, self.loads, up)
+            if k is None:
+                self._refuse(sock, codec)
+                break
+            try:
+                socket.send_fds(self.chans[k], [hello], [sock.fileno()])
+            except OSError:
+                up.discard(k)         # channel full (EAGAIN) or the worker is gone: try another
+                continue
+            self.routed += 1
+            load = self.loads[k]
+            load["conns"] += 1        # until the worker's next report
+            if not name and load["open_seats"]:
+                load["open_seats"] -= 1
+            break
+        sock.close()
+
+    def _refuse(self, sock, codec):
+        """Turn a client away while the worker it belongs to is down."""
+        METRICS.error("cluster_place", ConnectionError("no worker can take the connection"))
+        try:
+            sock.send(codec.encode([(P.ERROR, "Server busy or restarting. Try again shortly.")]))
+        except OSError:
+            pass
+
+    def _drop(self, sock):
+        self.selector.unregister(sock)
+        del self.pending[sock]
+        sock.close()
+
+    def _expire_hellos(self):
+        now = time.monotonic()
+        for sock, (_, deadline) in list(self.pending.items()):
+            if now > deadline:
+                self._drop(sock)
+
+    # --- workers ---
+
+    def _read_worker(self, k):
+        chan = self.chans[k]
+        try:
+            data = chan.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if data:
+            self.loads[k] = json.loads(data)
+            return
+        # The worker exited: its ledger recovers from its log when it starts again.
+        self.selector.unregister(chan)
+        chan.close()
+        self.chans[k] = None
+        self.procs[k].join(1)
+        if self.running:
+            print(f"Worker {k} exited ({self.procs[k].exitcode}); restarting")
+            self.restarts += 1
+            self.spawn(k)
+
+    # --- control channel ---
+
+    def _accept_control(self):
+        try:
+            sock, _ = self.control.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        self.selector.register(sock, selectors.EVENT_READ, ("command", bytearray()))
+
+    def _read_control(self, sock, buf):
+        try:
+            data = sock.recv(P.MAX_LINE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data or len(buf) > P.MAX_LINE:
+            self.selector.unregister(sock)
+            sock.close()
+            return
+        buf += data
+        while b"\n" in buf:
+            line, _, rest = bytes(buf).partition(b"\n")
+            buf[:] = rest
+            reply = self.command(line.decode(errors="ignore").strip())
+            try:
+                sock.sendall(reply.encode() + b"\n")
+            except OSError:
+                pass
+
+    def command(self, line):
+        """Answer one control command."""
+        word = line.upper()
+        if word == "STATUS":
+            return json.dumps(self.status())
+        if word == "STOP":
+            self.stop()
+            return "OK"
+        return f"ERROR unknown command {line!r} (STATUS, STOP)"
+
+    def status(self):
+        return {"listen": f"{self.host}:{self.port}", "uptime": round(time.time() - self.started, 1),
+                "routed": self.routed, "restarts": self.restarts, "pending": len(self.pending),
+                "workers": [dict(load, alive=bool(proc and proc.is_alive()))
+                            for load, proc in zip(self.loads, self.procs)]}
+
+
+def _worker_main(k, workers, chan, inherited, options):
+    for sock in inherited:
+        sock.close()
+    run_worker(k, workers, chan, **options)
+
+
+def control(command, path=CONTROL_PATH, timeout=5.0):
+    """Send one command to a running cluster's control channel and return its reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(path)
+        s.sendall(command.encode() + b"\n")
+        reply = b""
+        while not reply.endswith(b"\n"):
+            data = s.recv(65536)
+            if not data:
+                break
+            reply += data
+    return reply.decode().strip()
+
+
+def run_cluster(host=HOST, port=PORT, workers=None, control_path=CONTROL_PATH, max_players=MAX_PLAYERS,
+                high_water=None, turn_timeout=None, countdown=None, metrics_port=None, metrics_log=None,
+                ledger_path=None, history_path=None, seed=None, resume_grace=None):
+    router = Router(host, port, workers, control_path, max_players=max_players, high_water=high_water,
+                    turn_timeout=TURN_TIMEOUT if turn_timeout is None else turn_timeout, countdown=countdown,
+                    metrics_port=metrics_port, metrics_log=metrics_log, ledger_path=ledger_path,
+                    history_path=history_path, seed=seed,
+                    resume_grace=RESUME_GRACE if resume_grace is None else resume_grace)
+    if ledger_path:
+        print(f"Ledger shards in {ledger_path}/worker-*")
+    try:
+        router.serve()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    print(control(args[0] if args else "STATUS", *args[1:2]))
@@ -0,0 +1,208 @@
+"""Persistent chip balances: an in-memory ledger behind a write-ahead log.
+
+A change is applied in memory at once and queued as a log record. A single
+committer thread writes whatever has queued up every `commit_interval`
+seconds and fsyncs it once (group commit), so a bet never waits on the disk
+and one fsync covers every table's changes in that window. A crash loses at
+most the last window. Once the log holds `compact_every` records the balances
+are written to a snapshot and the log starts over.
+
+On disk, in the ledger directory:
+
+* balances.json -- snapshot: ``{"seq": N, "balances": {name: chips}}``
+* ledger.wal    -- one JSON record per line:
+                   ``{"seq", "acct", "delta", "bal", "why"}``
+
+Records carry the resulting balance, so recovery loads the snapshot and then
+takes the balance of every logged record newer than it. A torn last line
+(from a crash mid-write) ends the replay and is cut off.
+"""
+import json
+import os
+import threading
+import time
+from network.metrics import Histogram, FAST_BUCKETS
+
+STARTING_CHIPS = 1000
+COMMIT_INTERVAL = 0.05
+COMPACT_EVERY = 10_000
+
+SNAPSHOT_FILE = "balances.json"
+WAL_FILE = "ledger.wal"
+
+
+class Ledger:
+    """Chip balances by account name. With path=None nothing is persisted.
+
+    apply() and balance() are safe to call from any thread or event loop and
+    never touch the disk.
+    """
+    def __init__(self, path=None, starting_chips=STARTING_CHIPS, commit_interval=COMMIT_INTERVAL,
+                 compact_every=COMPACT_EVERY):
+        self.path = path
+        self.starting_chips = starting_chips
+        self.commit_interval = commit_interval
+        self.compact_every = compact_every
+        self.balances = {}
+        self.seq = 0               # last record applied in memory
+        self.committed = 0         # last record known to be on disk
+        self.commits = 0
+        self.records = 0
+        self.compactions = 0
+        self.commit_time = Histogram(FAST_BUCKETS)
+        self._pending = []
+        self._logged = 0           # records in the current log file
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._wal = None
+        self._thread = None
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            self._recover()
+            self._wal = open(os.path.join(path, WAL_FILE), "ab")
+            self._thread = threading.Thread(target=self._run, name="ledger-commit", daemon=True)
+            self._thread.start()
+
+    def balance(self, name) -> int:
+        with self._lock:
+            return self.balances.get(name, self.starting_chips)
+
+    def apply(self, name, delta, why="") -> int:
+        """Add delta (negative to debit) to name's balance and return the new balance.
+
+        Raises ValueError rather than take a balance below zero.
+        """
+        with self._lock:
+            balance = self.balances.get(name, self.starting_chips) + delta
+            if balance < 0:
+                raise ValueError(f"{name} does not have enough chips!")
+            self.balances[name] = balance
+            self.seq += 1
+            self.records += 1
+            if self._wal is not None:
+                record = {"seq": self.seq, "acct": name, "delta": delta, "bal": balance, "why": why}
+                self._pending.append(json.dumps(record, separators=(",", ":")) + "\n")
+                if len(self._pending) == 1:
+                    self._wakeup.notify()
+            else:
+                self.committed = self.seq
+        return balance
+
+    def flush(self, timeout=None) -> bool:
+        """Block until every change applied so far is on disk."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._wakeup:
+            target = self.seq
+            while self.committed < target and self._thread is not None and self._thread.is_alive():
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    return False
+                self._wakeup.wait(left)
+            return self.committed >= target
+
+    def close(self):
+        """Commit what is pending, write a final snapshot and stop the committer."""
+        with self._wakeup:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._compact(*self._snapshot_state())
+            self._wal.close()
+
+    # --- committer ---
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                while not self._pending and not self._closed:
+                    self._wakeup.wait()
+                if not self._pending:
+                    return
+            if not self._closed:
+                # Let records from every table pile up before paying for the fsync.
+                time.sleep(self.commit_interval)
+            with self._wakeup:
+                batch, self._pending = self._pending, []
+                last = self.seq
+                compact = self._logged + len(batch) >= self.compact_every
+                state = self._snapshot_state_locked() if compact else None
+            self._commit(batch, last)
+            if state is not None:
+                self._compact(*state)
+
+    def _commit(self, batch, last):
+        started = time.perf_counter()
+        self._wal.write("".join(batch).encode())
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+        self.commit_time.observe(time.perf_counter() - started)
+        with self._wakeup:
+            self._logged += len(batch)
+            self.commits += 1
+            self.committed = last
+            self._wakeup.notify_all()
+
+    def _snapshot_state(self):
+        with self._lock:
+            return self._snapshot_state_locked()
+
+    def _snapshot_state_locked(self):
+        return self.seq, dict(self.balances)
+
+    def _compact(self, seq, balances):
+        """Write the balances as of seq to the snapshot, then empty the log.
+
+        The log only ever holds records up to seq when this runs, and replay
+        skips records the snapshot already covers, so a crash between the two
+        steps loses nothing.
+        """
+        snap = os.path.join(self.path, SNAPSHOT_FILE)
+        tmp = snap + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"seq": seq, "balances": balances}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, snap)
+        self._wal.truncate(0)
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+        with self._lock:
+            self._logged = 0
+            self.compactions += 1
+
+    # --- recovery ---
+
+    def _recover(self):
+        snap = os.path.join(self.path, SNAPSHOT_FILE)
+        if os.path.exists(snap):
+            with open(snap) as f:
+                data = json.load(f)
+            self.seq = data["seq"]
+            self.balances = dict(data["balances"])
+        wal = os.path.join(self.path, WAL_FILE)
+        if not os.path.exists(wal):
+            self.committed = self.seq
+            return
+        good = 0
+        with open(wal, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    seq, name, balance = record["seq"], record["acct"], record["bal"]
+                except (ValueError, KeyError, TypeError):
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                good += len(line)
+                self._logged += 1
+                if seq > self.seq:
+                    self.seq = seq
+                    self.balances[name] = balance
+        if good != os.path.getsize(wal):
+            with open(wal, "r+b") as f:
+                f.truncate(good)
+        self.committed = self.seq
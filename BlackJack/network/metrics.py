@@ -0,0 +1,285 @@
+"""Lightweight server metrics.
+
+Counters, gauges and histograms live in a Registry that renders the
+Prometheus text format; MetricsListener serves it over HTTP on a local port
+and Registry.summary() gives a one-line form for periodic logging. Every
+metric is safe to update from any thread.
+"""
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; sized for human decision times and whole rounds.
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 15, 20, 30, 45, 60, 120)
+# Seconds; sized for in-process work such as lock holds and broadcasts.
+FAST_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.1)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+    def samples(self, name):
+        yield name, self.value
+
+
+class LabeledCounter:
+    """A counter per value of one label, e.g. bytes sent per message type."""
+    kind = "counter"
+
+    def __init__(self, label):
+        self.label = label
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, key, n=1):
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + n
+
+    def samples(self, name):
+        with self._lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            yield f'{name}{{{self.label}="{key}"}}', value
+
+
+class Gauge:
+    """A value read from a callback when the registry is rendered."""
+    def __init__(self, fn, kind="gauge"):
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self, name):
+        yield name, self.fn()
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style (`le` upper bounds)."""
+    kind = "histogram"
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (inf if past the last bound)."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank, seen = q * self.count, 0
+            for bound, n in zip(self.bounds + (float("inf"),), self.counts):
+                seen += n
+                if seen >= rank:
+                    return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cumulative, seen = [], 0
+            for bound, n in zip(self.bounds + (float("inf"),), self.counts):
+                seen += n
+                cumulative.append((bound, seen))
+            return {"buckets": cumulative, "count": self.count, "sum": self.sum}
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def samples(self, name):
+        snap = self.snapshot()
+        for bound, n in snap["buckets"]:
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield f'{name}_bucket{{le="{le}"}}', n
+        yield f"{name}_sum", snap["sum"]
+        yield f"{name}_count", snap["count"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, name, help, metric):
+        """Add (or replace) a metric under name and return it."""
+        self._metrics[name] = (help, metric)
+        return metric
+
+    def counter(self, name, help) -> Counter:
+        return self.register(name, help, Counter())
+
+    def labeled(self, name, help, label) -> LabeledCounter:
+        return self.register(name, help, LabeledCounter(label))
+
+    def histogram(self, name, help, bounds=FAST_BUCKETS) -> Histogram:
+        return self.register(name, help, Histogram(bounds))
+
+    def gauge(self, name, help, fn, kind="gauge") -> Gauge:
+        return self.register(name, help, Gauge(fn, kind))
+
+    def render(self) -> str:
+        lines = []
+        for name, (help, metric) in list(self._metrics.items()):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines += [f"{key} {value}" for key, value in metric.samples(name)]
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """Counters and gauges as name=value, histograms as name=count/p50/p99."""
+        parts = []
+        for name, (_, metric) in list(self._metrics.items()):
+            short = name.replace("blackjack_", "")
+            if isinstance(metric, Histogram):
+                if metric.count:
+                    parts.append(f"{short}={metric.count}/{metric.quantile(0.5)}/{metric.quantile(0.99)}")
+            elif isinstance(metric, LabeledCounter):
+                parts.append(f"{short}={sum(v for _, v in metric.samples(name))}")
+            else:
+                parts += [f"{short}={v}" for _, v in metric.samples(name)]
+        return " ".join(parts)
+
+REGISTRY = Registry()
+
+
+class ServerMetrics:
+    """The instruments both server engines update."""
+    def __init__(self, registry: Registry = REGISTRY):
+        self.registry = registry
+        self.connections = registry.counter("blackjack_connections_total", "Client connections accepted.")
+        self.rounds = registry.counter("blackjack_rounds_total", "Rounds dealt.")
+        self.lock_hold = registry.histogram(
+            "blackjack_lock_hold_seconds",
+            "Time the table lock is held (asyncio: time one table step runs on the loop).")
+        self.broadcast = registry.histogram("blackjack_broadcast_seconds",
+                                            "Time to encode and queue one broadcast to every client.")
+        self.fanout = registry.histogram("blackjack_broadcast_recipients", "Clients reached per broadcast.",
+                                         (1, 2, 5, 10, 25, 50, 100, 250, 1000))
+        self.sent_bytes = registry.labeled("blackjack_sent_bytes_total", "Bytes queued to clients.", "type")
+        self.errors = registry.labeled("blackjack_handler_errors_total", "Unexpected handler exceptions.",
+                                       "error")
+
+    def count_sent(self, sizes, recipients=1):
+        """Add one encoding's per-type byte sizes, sent to `recipients` clients."""
+        for t, n in sizes.items():
+            self.sent_bytes.inc(t, n * recipients)
+
+    def error(self, where, exc):
+        self.errors.inc(type(exc).__name__)
+        print(f"{where}: {type(exc).__name__}: {exc}")
+
+    def watch(self, connections, tables, timings=None, outbound=None, spectators=None, ledger=None):
+        """Register gauges read from the server's own state at render time."""
+        r = self.registry
+        r.gauge("blackjack_active_connections", "Connected clients.", connections)
+        r.gauge("blackjack_tables", "Tables with at least one client.", tables)
+        if spectators is not None:
+            r.gauge("blackjack_spectators", "Connected spectators.", spectators)
+        if timings is not None:
+            r.register("blackjack_turn_seconds", "Time players take per turn.", timings.turn)
+            r.register("blackjack_round_seconds", "Round length from deal to results.", timings.round)
+            r.gauge("blackjack_turn_timeouts_total", "Turns ended by the deadline.", lambda: timings.timeouts,
+                    "counter")
+        if ledger is not None:
+            r.gauge("blackjack_ledger_records_total", "Chip ledger changes.", lambda: ledger.records, "counter")
+            r.gauge("blackjack_ledger_commits_total", "Ledger group commits (one fsync each).",
+                    lambda: ledger.commits, "counter")
+            r.gauge("blackjack_ledger_uncommitted", "Ledger changes not yet on disk.",
+                    lambda: ledger.seq - ledger.committed)
+            r.register("blackjack_ledger_commit_seconds", "Time to write and fsync one ledger batch.",
+                       ledger.commit_time)
+        if outbound is not None:
+            r.gauge("blackjack_dropped_clients_total", "Clients dropped for a full outbound queue.",
+                    lambda: outbound.evictions, "counter")
+            for key in outbound.snapshot():
+                if key != "outbound_evictions":
+                    r.gauge(f"blackjack_{key}", f"Outbound queue {key[9:].replace('_', ' ')}.",
+                            lambda key=key: outbound.snapshot()[key],
+                            "gauge" if key == "outbound_peak_backlog" else "counter")
+
+METRICS = ServerMetrics()
+
+
+class TimedLock:
+    """A threading.Lock that records how long each hold lasts."""
+    def __init__(self, histogram: Histogram):
+        self._lock = threading.Lock()
+        self.histogram = histogram
+        self._acquired = 0.0
+
+    def __enter__(self):
+        self._lock.acquire()
+        self._acquired = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        held = time.perf_counter() - self._acquired
+        self._lock.release()
+        self.histogram.observe(held)
+
+
+class MetricsListener:
+    """Serve a registry's text rendering at http://host:port/metrics from a daemon thread."""
+    def __init__(self, registry: Registry = REGISTRY, host="127.0.0.1", port=9100):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class TableTimings:
+    """Turn and round latency for one table.
+
+    `round` times a round from the deal to its results; rounds_per_hour() adds
+    the pause between rounds to get the table's throughput.
+    """
+    def __init__(self):
+        self.turn = Histogram()
+        self.round = Histogram()
+        self.timeouts = 0
+
+    def rounds_per_hour(self, pause=0.0):
+        mean = self.round.mean()
+        return 3600 / (mean + pause) if mean else 0.0
+
+    def summary(self, pause=0.0) -> str:
+        return (f"turns={self.turn.count} turn_p50={self.turn.quantile(0.5)}s "
+                f"turn_p90={self.turn.quantile(0.9)}s timeouts={self.timeouts} "
+                f"rounds={self.round.count} rounds/h={self.rounds_per_hour(pause):.0f}")
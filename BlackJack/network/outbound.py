@@ -0,0 +1,175 @@
+"""Per-connection outbound buffers so one slow client never blocks a table.
+
+Servers hand encoded bytes to a connection's outbound queue instead of writing
+to the socket themselves. Queued chunks are coalesced into one write per
+drain, and a client whose backlog passes the policy's high-water mark is
+disconnected rather than allowed to stall everyone else.
+"""
+import asyncio
+import socket
+import threading
+from collections import deque
+
+
+class OutboundPolicy:
+    """Limits for a connection's outbound queue.
+
+    high_water: queued bytes at which the client is considered too slow and dropped.
+    max_batch:  most bytes coalesced into a single socket write.
+    """
+    def __init__(self, high_water=256 * 1024, max_batch=64 * 1024):
+        self.high_water = high_water
+        self.max_batch = max_batch
+
+
+class OutboundStats:
+    """Process-wide counters for every outbound queue."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queued_bytes = 0
+        self.sent_bytes = 0
+        self.writes = 0
+        self.messages = 0
+        self.evictions = 0
+        self.peak_backlog = 0
+
+    def on_queue(self, n, backlog):
+        with self._lock:
+            self.queued_bytes += n
+            self.messages += 1
+            if backlog > self.peak_backlog:
+                self.peak_backlog = backlog
+
+    def on_write(self, n):
+        with self._lock:
+            self.sent_bytes += n
+            self.writes += 1
+
+    def on_evict(self):
+        with self._lock:
+            self.evictions += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"outbound_messages": self.messages, "outbound_queued_bytes": self.queued_bytes,
+                    "outbound_sent_bytes": self.sent_bytes, "outbound_writes": self.writes,
+                    "outbound_evictions": self.evictions, "outbound_peak_backlog": self.peak_backlog}
+
+STATS = OutboundStats()
+
+
+class ThreadedOutbound:
+    """Outbound queue for a blocking socket, drained by its own writer thread."""
+    def __init__(self, sock, policy: OutboundPolicy = None, stats: OutboundStats = STATS):
+        self.sock = sock
+        self.policy = policy or OutboundPolicy()
+        self.stats = stats
+        self._chunks = deque()
+        self._backlog = 0
+        self._cond = threading.Condition()
+        self.closed = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def __len__(self):
+        return self._backlog
+
+    def send(self, data: bytes) -> bool:
+        """Queue data; returns False if the connection is closed or was just evicted."""
+        with self._cond:
+            if self.closed:
+                return False
+            if self._backlog + len(data) > self.policy.high_water:
+                self.stats.on_evict()
+                self._close_locked()
+                return False
+            self._chunks.append(data)
+            self._backlog += len(data)
+            self.stats.on_queue(len(data), self._backlog)
+            self._cond.notify()
+        return True
+
+    def close(self):
+        with self._cond:
+            self._close_locked()
+
+    def _close_locked(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._cond.notify()
+        # Unblock both this writer and the connection's reader thread.
+        try: self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError: pass
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._chunks and not self.closed:
+                    self._cond.wait()
+                if self.closed:
+                    return
+                batch = [self._chunks.popleft()]
+                size = len(batch[0])
+                while self._chunks and size + len(self._chunks[0]) <= self.policy.max_batch:
+                    size += len(self._chunks[0])
+                    batch.append(self._chunks.popleft())
+                self._backlog -= size
+            try:
+                self.sock.sendall(b"".join(batch))
+            except OSError:
+                self.close()
+                return
+            self.stats.on_write(size)
+
+
+class AsyncOutbound:
+    """Outbound queue for an asyncio StreamWriter.
+
+    Everything sent during one event-loop callback is written with a single
+    transport write on the next loop iteration (a backlog over max_batch goes
+    out max_batch bytes per iteration); the pending bytes plus the transport's
+    own buffer are the backlog checked against the high-water mark.
+    """
+    def __init__(self, writer, policy: OutboundPolicy = None, stats: OutboundStats = STATS):
+        self.writer = writer
+        self.policy = policy or OutboundPolicy()
+        self.stats = stats
+        self._pending = bytearray()
+        self._scheduled = False
+        self.closed = False
+
+    def __len__(self):
+        return len(self._pending) + self.writer.transport.get_write_buffer_size()
+
+    def send(self, data: bytes) -> bool:
+        if self.closed or self.writer.is_closing():
+            return False
+        backlog = len(self) + len(data)
+        if backlog > self.policy.high_water:
+            self.stats.on_evict()
+            self.abort()
+            return False
+        self._pending += data
+        self.stats.on_queue(len(data), backlog)
+        if not self._scheduled:
+            self._scheduled = True
+            asyncio.get_running_loop().call_soon(self.flush)
+        return True
+
+    def flush(self):
+        self._scheduled = False
+        if self.closed or not self._pending:
+            return
+        data = bytes(self._pending[:self.policy.max_batch])
+        del self._pending[:len(data)]
+        self.writer.write(data)
+        self.stats.on_write(len(data))
+        if self._pending:
+            self._scheduled = True
+            asyncio.get_running_loop().call_soon(self.flush)
+
+    def abort(self):
+        """Drop the connection immediately without flushing its backlog."""
+        self.closed = True
+        self._pending.clear()
+        self.writer.transport.abort()
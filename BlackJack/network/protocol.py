@@ -0,0 +1,466 @@
+"""Wire protocol shared by the servers and BlackjackClient.
+
+Messages are plain tuples whose first item is a message type id, e.g.
+``(TURN, "Alice")``. They can be written in two encodings:
+
+* text   -- the original newline-terminated lines (``"TURN: Alice\\n"``); the
+            default, and what every existing client speaks.
+* binary -- length-prefixed frames: a 2-byte big-endian length (type byte plus
+            payload), a 1-byte type id, then the payload. Cards are one byte
+            each (their index in game.deck.CARDS).
+
+A client selects binary by sending ``"PROTO BIN1 <name>\\n"`` instead of its
+name as the first line; everything after that line is binary both ways. A
+name of ``"WATCH"`` (optionally ``"WATCH <table id>"``) joins as a spectator:
+it receives the table's state stream but takes no seat and may only PING and
+RESYNC.
+
+When the server holds dropped seats, NAME is followed by a resume token
+(``"RESUME_TOKEN <token>"``). A player whose connection drops (without
+QUIT) keeps their seat for a grace period, shown to the table as
+``"EVENT: AWAY Alice"``; connecting again with ``"RESUME <token>"`` as the
+name takes the seat back with a fresh NAME, token and snapshot
+(``"EVENT: BACK Alice"``). A seat left away sits out new
+rounds, and is given up (LEAVE) when the grace period ends.
+
+Table state is versioned. A SNAPSHOT carrying the current sequence number is
+followed by the full STATE_PLAYER/STATE_DEALER (and TURN) messages; after that
+each change arrives as one DELTA with the next sequence number. A client that
+sees a gap sends RESYNC and gets a fresh snapshot.
+
+Chips are bet between rounds: ``"BET <amount>"`` (a BET message in binary)
+sets the stake taken when the next round is dealt. CHIPS reports a player's
+balance and the stake riding on (or queued for) the current round; snapshots
+include one per seated player.
+
+After the deal a player may DOUBLE, SPLIT a pair (up to four hands) or
+SURRENDER their first two cards; when the dealer shows an ace every seat is
+offered insurance (``"ACTION: INSURANCE Dealer"``) and answers INSURE or
+DECLINE before play starts. A split hand is labelled with its owner's name
+and position -- ``"Alice"``, ``"Alice#2"`` -- in STATE_PLAYER, TURN, RESULT
+and card deltas; a SPLIT delta moves the last card of the hand whose turn it
+is to the newly labelled hand.
+"""
+import struct
+from game.deck import CARDS
+
+BINARY_HELLO = "PROTO BIN1"
+WATCH = "WATCH"     # handshake name that joins as a read-only spectator
+RESUME = "RESUME"   # handshake name that takes back a dropped seat
+
+# --- message type ids ---
+NAME = 1
+INFO = 2
+EVENT = 3
+COUNTDOWN = 4
+GAME_START = 5
+ROUND_START = 6
+ROUND_END = 7
+STATE_PLAYER = 8
+STATE_DEALER = 9
+TURN = 10
+ACTION = 11
+RESULT = 12
+RESULT_SUMMARY = 13
+PING = 14
+HINT = 15
+ERROR = 16
+SNAPSHOT = 17
+DELTA = 18
+CHIPS = 19
+RESUME_TOKEN = 20
+COMMAND = 32        # client -> server
+BET = 33            # client -> server
+
+TYPE_NAMES = {t: n for n, t in list(globals().items()) if n.isupper() and isinstance(t, int)}
+
+# Enumerated fields are sent as their index in these tuples.
+EVENT_KINDS = ("JOIN", "LEAVE", "JOIN_WAIT", "AWAY", "BACK")
+JOIN, LEAVE, JOIN_WAIT, AWAY, BACK = range(5)
+ACTION_KINDS = ("HIT", "STAND", "BUST", "BLACKJACK", "DEALER_HIT", "TIMEOUT",
+                "DOUBLE", "SPLIT", "SURRENDER", "INSURE", "INSURANCE")
+(ACT_HIT, ACT_STAND, ACT_BUST, ACT_BLACKJACK, ACT_DEALER_HIT, ACT_TIMEOUT,
+ ACT_DOUBLE, ACT_SPLIT, ACT_SURRENDER, ACT_INSURE, ACT_INSURANCE) = range(11)
+OUTCOMES = ("WIN", "PUSH", "LOSE", "SURRENDER")
+COMMANDS = ("HIT", "STAND", "PING", "HINT", "QUIT", "RESYNC",
+            "DOUBLE", "SPLIT", "SURRENDER", "INSURE", "DECLINE")
+CLIENT_TYPES = (COMMAND, BET)
+DELTA_KINDS = ("CARD", "TURN", "REVEAL", "SPLIT")
+D_CARD, D_TURN, D_REVEAL, D_SPLIT = range(4)
+
+NO_CARD = 0xFF
+MAX_NAME = 255      # bytes in a binary string field
+
+# Field layout of each message after its type id:
+#   s = string, b = byte, H = uint16, I = uint32, c = card list, C = single card,
+#   f = float, L = list of strings
+SCHEMAS = {
+    NAME: "s", INFO: "s", EVENT: "bs", COUNTDOWN: "H",
+    GAME_START: "", ROUND_START: "", ROUND_END: "", PING: "",
+    STATE_PLAYER: "scb", STATE_DEALER: "bcb", TURN: "s",
+    ACTION: "bsC", RESULT: "sb", RESULT_SUMMARY: "LLL",
+    HINT: "bff", ERROR: "s", SNAPSHOT: "I", DELTA: "IbsCb", CHIPS: "sII",
+    RESUME_TOKEN: "s",
+    COMMAND: "b", BET: "I",
+}
+
+_CODES = {(c.suit, c.rank): i for i, c in enumerate(CARDS)}
+_CODES_BY_TEXT = {str(c): i for i, c in enumerate(CARDS)}
+
+
+def card_code(card):
+    return _CODES[(card.suit, card.rank)]
+
+def card_codes(cards):
+    return tuple(_CODES[(c.suit, c.rank)] for c in cards)
+
+def hand_label(name, index=0):
+    """How a player's hand is named on the wire: the player's name for their
+    first hand, "name#2" and so on for hands split off it."""
+    return f"{name}#{index + 1}" if index else name
+
+def hand_owner(label):
+    """The player name a hand label belongs to."""
+    name, sep, n = label.rpartition("#")
+    return name if sep and n.isdigit() else label
+
+
+# --- text encoding ---
+
+def cards_text(codes):
+    return ", ".join(str(CARDS[c]) for c in codes)
+
+def to_text(msg) -> str:
+    """Render one message as its legacy text line (without the newline)."""
+    t = msg[0]
+    if t == NAME: return f"NAME: {msg[1]}"
+    if t == INFO: return msg[1]
+    if t == EVENT: return f"EVENT: {EVENT_KINDS[msg[1]]} {msg[2]}"
+    if t == COUNTDOWN: return f"GAME_COUNTDOWN {msg[1]}"
+    if t == GAME_START: return "GAME_START"
+    if t == ROUND_START: return "ROUND_START"
+    if t == ROUND_END: return "ROUND_END"
+    if t == PING: return "PING"
+    if t == STATE_PLAYER: return f"STATE: PLAYER {msg[1]} | {cards_text(msg[2])} | VALUE={msg[3]}"
+    if t == STATE_DEALER:
+        if msg[1]:
+            return f"STATE: DEALER HIDDEN | {cards_text(msg[2]) or '(no card)'}"
+        return f"STATE: DEALER Dealer | {cards_text(msg[2])} | VALUE={msg[3]}"
+    if t == TURN: return f"TURN: {msg[1]}"
+    if t == ACTION:
+        kind, name, card = msg[1], msg[2], msg[3]
+        parts = ["ACTION:", ACTION_KINDS[kind]]
+        if name: parts.append(name)
+        if card != NO_CARD: parts.append(str(CARDS[card]))
+        return " ".join(parts)
+    if t == RESULT: return f"RESULT: {msg[1]} {OUTCOMES[msg[2]]}"
+    if t == RESULT_SUMMARY:
+        w, p, l = (",".join(names) or "-" for names in msg[1:4])
+        return f"RESULT_SUMMARY: WINNERS={w} PUSHES={p} LOSERS={l}"
+    if t == HINT: return f"HINT: {COMMANDS[msg[1]]} STAND={msg[2]:+.3f} HIT={msg[3]:+.3f}"
+    if t == ERROR: return f"SERVER_ERROR {msg[1]}"
+    if t == SNAPSHOT: return f"SNAPSHOT: {msg[1]}"
+    if t == DELTA:
+        seq, kind, name, card, value = msg[1:]
+        if kind == D_CARD: return f"DELTA: {seq} CARD {name} {CARDS[card]} VALUE={value}"
+        if kind == D_REVEAL: return f"DELTA: {seq} REVEAL {CARDS[card]} VALUE={value}"
+        if kind == D_SPLIT: return f"DELTA: {seq} SPLIT {name} {CARDS[card]} VALUE={value}"
+        return f"DELTA: {seq} TURN {name}"
+    if t == CHIPS: return f"CHIPS: {msg[1]} {msg[2]} BET={msg[3]}"
+    if t == RESUME_TOKEN: return f"RESUME_TOKEN {msg[1]}"
+    if t == COMMAND: return COMMANDS[msg[1]]
+    if t == BET: return f"BET {msg[1]}"
+    raise ValueError(f"Unknown message type {t}")
+
+def _parse_cards(text):
+    text = text.strip()
+    if not text or text == "(no card)":
+        return ()
+    return tuple(_CODES_BY_TEXT[c.strip()] for c in text.split(","))
+
+def _parse_value(text):
+    return int(text.split("=", 1)[1]) if text.startswith("VALUE=") else 0
+
+def parse_text(line: str):
+    """Parse one legacy text line into a message; unknown lines become INFO."""
+    try:
+        if line.startswith("STATE:"):
+            parts = [p.strip() for p in line[len("STATE:"):].split("|")]
+            tokens = parts[0].split()
+            cards = _parse_cards(parts[1] if len(parts) > 1 else "")
+            value = _parse_value(parts[2] if len(parts) > 2 else "")
+            if tokens[0] == "PLAYER":
+                return (STATE_PLAYER, " ".join(tokens[1:]), cards, value)
+            return (STATE_DEALER, tokens[1] == "HIDDEN", cards, value)
+        if line.startswith("DELTA:"):
+            tokens = line.split()
+            seq, kind = int(tokens[1]), DELTA_KINDS.index(tokens[2])
+            if kind == D_TURN:
+                return (DELTA, seq, kind, " ".join(tokens[3:]), NO_CARD, 0)
+            value = _parse_value(tokens[-1])
+            if kind == D_REVEAL:
+                return (DELTA, seq, kind, "Dealer", _CODES_BY_TEXT[" ".join(tokens[3:-1])], value)
+            return (DELTA, seq, kind, tokens[3], _CODES_BY_TEXT[" ".join(tokens[4:-1])], value)
+        if line.startswith("CHIPS:"):
+            name, chips, bet = line[len("CHIPS:"):].strip().rsplit(maxsplit=2)
+            return (CHIPS, name, int(chips), int(bet.split("=", 1)[1]))
+        if line.startswith("SNAPSHOT:"):
+            return (SNAPSHOT, int(line.split()[1]))
+        if line.startswith("TURN:"):
+            return (TURN, line[len("TURN:"):].strip())
+        if line.startswith("GAME_COUNTDOWN "):
+            return (COUNTDOWN, int(line.split()[1]))
+        if line.startswith("ACTION:"):
+            tokens = line[len("ACTION:"):].split(maxsplit=2)
+            kind = ACTION_KINDS.index(tokens[0])
+            if kind == ACT_DEALER_HIT:
+                return (ACTION, kind, "", _CODES_BY_TEXT[line.split(maxsplit=2)[2]])
+            card = _CODES_BY_TEXT[tokens[2]] if len(tokens) > 2 else NO_CARD
+            return (ACTION, kind, tokens[1], card)
+        if line.startswith("RESULT:"):
+            name, outcome = line[len("RESULT:"):].strip().rsplit(maxsplit=1)
+            return (RESULT, name, OUTCOMES.index(outcome.upper()))
+        if line.startswith("RESULT_SUMMARY:"):
+            fields = dict(f.split("=", 1) for f in line.split()[1:])
+            return (RESULT_SUMMARY,) + tuple(
+                tuple(n for n in fields.get(k, "-").split(",") if n != "-")
+                for k in ("WINNERS", "PUSHES", "LOSERS"))
+        if line.startswith("EVENT:"):
+            kind, name = line[len("EVENT:"):].split(maxsplit=1)
+            return (EVENT, EVENT_KINDS.index(kind), name.strip())
+        if line.startswith("NAME:"):
+            return (NAME, line[len("NAME:"):].strip())
+        if line.startswith("RESUME_TOKEN "):
+            return (RESUME_TOKEN, line[len("RESUME_TOKEN "):].strip())
+        if line.startswith("HINT:"):
+            tokens = line.split()
+            return (HINT, COMMANDS.index(tokens[1]), float(tokens[2].split("=")[1]), float(tokens[3].split("=")[1]))
+        if line.startswith("SERVER_ERROR "):
+            return (ERROR, line[len("SERVER_ERROR "):])
+        if line in ("GAME_START", "ROUND_START", "ROUND_END", "PING"):
+            return ({"GAME_START": GAME_START, "ROUND_START": ROUND_START,
+                     "ROUND_END": ROUND_END, "PING": PING}[line],)
+    except (ValueError, KeyError, IndexError):
+        pass
+    return (INFO, line)
+
+
+# --- binary encoding ---
+
+def _pack_str(out, s):
+    b = s.encode()[:MAX_NAME]
+    out.append(len(b))
+    out += b
+
+def to_frame(msg) -> bytes:
+    """Encode one message as a length-prefixed binary frame."""
+    t = msg[0]
+    body = bytearray((t,))
+    for kind, val in zip(SCHEMAS[t], msg[1:]):
+        if kind == "s":
+            _pack_str(body, val)
+        elif kind == "b":
+            body.append(int(val))
+        elif kind == "H":
+            body += struct.pack(">H", val)
+        elif kind == "I":
+            body += struct.pack(">I", val)
+        elif kind == "C":
+            body.append(val)
+        elif kind == "c":
+            body.append(len(val))
+            body += bytes(val)
+        elif kind == "f":
+            body += struct.pack(">f", val)
+        elif kind == "L":
+            body.append(len(val))
+            for s in val:
+                _pack_str(body, s)
+    return struct.pack(">H", len(body)) + bytes(body)
+
+def from_frame(body) -> tuple:
+    """Decode a frame body (type byte plus payload, length prefix removed)."""
+    t = body[0]
+    pos = 1
+    fields = [t]
+    for kind in SCHEMAS[t]:
+        if kind == "s":
+            n = body[pos]
+            fields.append(bytes(body[pos + 1:pos + 1 + n]).decode(errors="replace"))
+            pos += 1 + n
+        elif kind in "bC":
+            fields.append(body[pos])
+            pos += 1
+        elif kind == "H":
+            fields.append(struct.unpack_from(">H", body, pos)[0])
+            pos += 2
+        elif kind == "I":
+            fields.append(struct.unpack_from(">I", body, pos)[0])
+            pos += 4
+        elif kind == "c":
+            n = body[pos]
+            fields.append(tuple(body[pos + 1:pos + 1 + n]))
+            pos += 1 + n
+        elif kind == "f":
+            fields.append(struct.unpack_from(">f", body, pos)[0])
+            pos += 4
+        elif kind == "L":
+            n = body[pos]
+            pos += 1
+            names = []
+            for _ in range(n):
+                k = body[pos]
+                names.append(bytes(body[pos + 1:pos + 1 + k]).decode(errors="replace"))
+                pos += 1 + k
+            fields.append(tuple(names))
+    if t == STATE_DEALER:
+        fields[1] = bool(fields[1])
+    return tuple(fields)
+
+MAX_LINE = 4096            # longest text line a peer may send
+MAX_FRAME = 16 * 1024      # largest binary frame body a peer may send
+
+class FrameError(ValueError):
+    """A peer sent a line or frame larger than the decoder allows."""
+
+class StreamDecoder:
+    """Reassembles text lines or binary frames from arbitrary chunks of a stream.
+
+    feed() appends received bytes; iterating yields every complete item in the
+    current mode -- str lines (without the newline) for text, message tuples
+    for binary. Partial input stays buffered for the next feed, so a line or
+    frame (or a UTF-8 character) split across reads is never mangled. `binary`
+    may be flipped between items, e.g. after the handshake line.
+    """
+    def __init__(self, binary=False, max_line=MAX_LINE, max_frame=MAX_FRAME):
+        self.binary = binary
+        self.max_line = max_line
+        self.max_frame = max_frame
+        self._buf = bytearray()
+        self._pos = 0      # start of the first unconsumed byte
+        self._scan = 0     # where to resume looking for a newline
+
+    def feed(self, data: bytes):
+        if self._pos:
+            # Compact once per read rather than once per item.
+            del self._buf[:self._pos]
+            self._scan -= self._pos
+            self._pos = 0
+        self._buf += data
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = self._next_frame() if self.binary else self._next_line()
+        if item is None:
+            raise StopIteration
+        return item
+
+    def _next_line(self):
+        buf = self._buf
+        end = buf.find(b"\n", max(self._scan, self._pos))
+        if end < 0:
+            if len(buf) - self._pos > self.max_line:
+                raise FrameError(f"line longer than {self.max_line} bytes")
+            self._scan = len(buf)
+            return None
+        if end - self._pos > self.max_line:
+            raise FrameError(f"line longer than {self.max_line} bytes")
+        line = buf[self._pos:end].decode(errors="replace").rstrip("\r")
+        self._pos = self._scan = end + 1
+        return line
+
+    def _next_frame(self):
+        buf, pos = self._buf, self._pos
+        if len(buf) - pos < 2:
+            return None
+        (n,) = struct.unpack_from(">H", buf, pos)
+        if n > self.max_frame or n == 0:
+            raise FrameError(f"bad frame length {n}")
+        if len(buf) - pos - 2 < n:
+            return None
+        try:
+            with memoryview(buf) as view:
+                msg = from_frame(view[pos + 2:pos + 2 + n])
+        except (KeyError, IndexError, struct.error, UnicodeDecodeError) as e:
+            raise FrameError(f"malformed frame: {e!r}") from None
+        self._pos = self._scan = pos + 2 + n
+        return msg
+
+
+class TextCodec:
+    binary = False
+
+    @staticmethod
+    def encode(msgs, sizes=None) -> bytes:
+        """Encode msgs; if a sizes dict is given, add each message's bytes under its type name."""
+        if sizes is None:
+            return "".join(to_text(m) + "\n" for m in msgs).encode()
+        parts = [(to_text(m) + "\n").encode() for m in msgs]
+        _count_sizes(sizes, msgs, parts)
+        return b"".join(parts)
+
+class BinaryCodec:
+    binary = True
+
+    @staticmethod
+    def encode(msgs, sizes=None) -> bytes:
+        if sizes is None:
+            return b"".join(to_frame(m) for m in msgs)
+        parts = [to_frame(m) for m in msgs]
+        _count_sizes(sizes, msgs, parts)
+        return b"".join(parts)
+
+def _count_sizes(sizes, msgs, parts):
+    for m, part in zip(msgs, parts):
+        name = TYPE_NAMES[m[0]]
+        sizes[name] = sizes.get(name, 0) + len(part)
+
+TEXT = TextCodec()
+BINARY = BinaryCodec()
+
+
+def negotiate(first_line: str):
+    """Split the client's first line into (codec, requested name)."""
+    if first_line.startswith(BINARY_HELLO):
+        return BINARY, first_line[len(BINARY_HELLO):].strip()
+    return TEXT, first_line.strip()
+
+def player_name(name: str) -> str:
+    """The seat name for a requested one. Whitespace and "#" (the text codec
+    splits on the first, hand labels on the second) become "_", and the name
+    is cut to MAX_NAME bytes of UTF-8 so both codecs carry it whole."""
+    name = "".join("_" if c.isspace() or c == "#" else c for c in name.strip())
+    return name.encode()[:MAX_NAME].decode(errors="ignore")
+
+def watch_request(name: str):
+    """For a handshake name of "WATCH [table id]" return the requested table id
+    ("" for any table); None if the client wants a seat."""
+    word, _, rest = name.partition(" ")
+    return rest.strip() if word.upper() == WATCH else None
+
+def resume_request(name: str):
+    """For a handshake name of "RESUME <token>" return the token; None otherwise."""
+    word, _, rest = name.partition(" ")
+    return rest.strip() if word.upper() == RESUME and rest.strip() else None
+
+def command(word: str):
+    """Binary COMMAND message for a client command word such as "HIT"."""
+    return (COMMAND, COMMANDS.index(word.strip().upper()))
+
+def client_message(line: str):
+    """The binary message for a client text line ("HIT", "BET 50", ...), or None
+    if the line is not a valid command."""
+    amount = parse_bet(line)
+    if amount is not None:
+        return (BET, amount)
+    word = line.strip().upper()
+    return command(word) if word in COMMANDS else None
+
+def parse_bet(line: str):
+    """The amount of a "BET <amount>" command line, or None for any other line."""
+    tokens = line.split()
+    if len(tokens) == 2 and tokens[0].upper() == "BET" and tokens[1].isdigit() and len(tokens[1]) <= 9:
+        return int(tokens[1])
+    return None
@@ -0,0 +1,178 @@
+"""A hashed timer wheel shared by every table's countdowns and timeouts.
+
+One wheel serves the whole process: the threaded server drives it from a
+single background thread, the asyncio server from one task on its loop. A
+table with nothing scheduled costs nothing, and cancelling a timer is a dict
+removal.
+"""
+import asyncio
+import math
+import threading
+import time
+from network.metrics import METRICS
+
+
+class Timer:
+    __slots__ = ("wheel", "deadline", "callback", "args", "interval", "slot")
+
+    def __init__(self, wheel, deadline, callback, args, interval):
+        self.wheel = wheel
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.interval = interval
+        self.slot = None
+
+    @property
+    def active(self):
+        return self.slot is not None
+
+    def cancel(self):
+        self.wheel.cancel(self)
+
+
+class TimerWheel:
+    """Timers bucketed by expiry tick into `slots` buckets of `tick` seconds each.
+
+    Callbacks run on whichever thread or task calls advance(); schedule() and
+    cancel() are safe to call from any thread.
+    """
+    def __init__(self, tick=0.1, slots=512):
+        self.tick = tick
+        self.slots = [{} for _ in range(slots)]
+        self.current = 0
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._count = 0
+        self._thread = None
+        self._task = None
+        self._idle = None
+
+    @property
+    def pending(self):
+        return self._count
+
+    def _now_tick(self):
+        return int((time.monotonic() - self._start) / self.tick)
+
+    def schedule(self, delay, callback, *args, interval=None) -> Timer:
+        """Call callback(*args) after `delay` seconds (then every `interval`, if given)."""
+        with self._lock:
+            if not self._count:
+                self.current = self._now_tick()
+            timer = Timer(self, 0, callback, args, interval)
+            self._insert(timer, delay)
+            self._wakeup.notify()
+            if self._idle is not None:
+                self._task.get_loop().call_soon_threadsafe(self._idle.set)
+        return timer
+
+    def every(self, interval, callback, *args) -> Timer:
+        return self.schedule(interval, callback, *args, interval=interval)
+
+    def cancel(self, timer: Timer):
+        with self._lock:
+            if timer.slot is not None:
+                del self.slots[timer.slot][timer]
+                timer.slot = None
+                self._count -= 1
+
+    def _insert(self, timer, delay):
+        timer.deadline = self.current + max(1, math.ceil(delay / self.tick - 1e-9))
+        timer.slot = timer.deadline % len(self.slots)
+        self.slots[timer.slot][timer] = None
+        self._count += 1
+
+    def advance(self):
+        """Fire every timer whose deadline has passed."""
+        due = []
+        with self._lock:
+            target = self._now_tick()
+            if not self._count:
+                self.current = target
+                return 0
+            while self.current < target:
+                self.current += 1
+                bucket = self.slots[self.current % len(self.slots)]
+                for timer in [t for t in bucket if t.deadline <= self.current]:
+                    del bucket[timer]
+                    timer.slot = None
+                    self._count -= 1
+                    if timer.interval:
+                        self._insert(timer, timer.interval)
+                    due.append(timer)
+        for timer in due:
+            # One failing callback must not take the driver (and every later timer) down with it.
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                METRICS.error("timer", e)
+        return len(due)
+
+    # --- drivers ---
+
+    def start_thread(self):
+        """Drive the wheel from one daemon thread that sleeps while nothing is scheduled."""
+        if self._thread:
+            return
+        def run():
+            while True:
+                with self._wakeup:
+                    while not self._count:
+                        self._wakeup.wait()
+                time.sleep(self.tick)
+                self.advance()
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def start_async(self):
+        """Drive the wheel from a task on the running event loop that parks while
+        nothing is scheduled."""
+        if self._task:
+            return
+        async def run():
+            while True:
+                with self._lock:
+                    if not self._count:
+                        self._idle = asyncio.Event()
+                if self._idle is not None:
+                    await self._idle.wait()
+                    self._idle = None
+                await asyncio.sleep(self.tick)
+                self.advance()
+        self._task = asyncio.get_running_loop().create_task(run())
+
+
+class Countdown:
+    """Call on_tick(n) for n = seconds..1 one second apart, then on_done().
+
+    on_done always runs from the wheel, never from the constructor, so a zero
+    countdown is safe to start while holding a lock on_done needs.
+    """
+    def __init__(self, wheel: TimerWheel, seconds, on_tick, on_done):
+        self.wheel = wheel
+        self.remaining = seconds
+        self.on_tick = on_tick
+        self.on_done = on_done
+        self.cancelled = False
+        self._timer = None
+        if seconds > 0:
+            self._step()
+        else:
+            self._timer = wheel.schedule(0, self._step)
+
+    def _step(self):
+        if self.cancelled:
+            return
+        if self.remaining <= 0:
+            self.on_done()
+            return
+        self.on_tick(self.remaining)
+        self.remaining -= 1
+        self._timer = self.wheel.schedule(1, self._step)
+
+    def cancel(self):
+        self.cancelled = True
+        if self._timer:
+            self._timer.cancel()
@@ -1,194 +1,389 @@
-import socket, threading, time
-from game.deck import Deck
+import secrets, socket, threading, time
+from game.deck import Shoe
 from game.player import Player, Dealer
-from game.blackjack import evaluate_player_outcome
-from game.blackjack import Round
+from game.strategy import StrategyEngine
+from game.rng import make_rng
+from game.history import RoundRecorder, HistoryWriter
+from game import engine as E
+from network import protocol as P
+from network.outbound import ThreadedOutbound, OutboundPolicy, STATS
+from network.scheduler import TimerWheel, Countdown
+from network.ledger import Ledger
+from network.metrics import TableTimings, TimedLock, MetricsListener, METRICS, REGISTRY
 
 HOST = "0.0.0.0"
 PORT = 5555
+RECV_SIZE = 4096
+SPECTATOR_HIGH_WATER = 64 * 1024
+TURN_TIMEOUT = 30.0
+INSURANCE_SECONDS = 5.0
+RESUME_GRACE = 30.0
+JOIN_COUNTDOWN = 10
+BETWEEN_COUNTDOWN = 8
+REPORT_INTERVAL = 60
+HISTORY_FLUSH = 1.0
+MIN_BET = 10
+MAX_BET = 500
 
-lock = threading.Lock()
-join_countdown_lock = threading.Lock()
+lock = TimedLock(METRICS.lock_hold)
+join_countdown_lock = TimedLock(METRICS.lock_hold)
 clients = {}
+codecs = {}
+outbound = {}
+outbound_policy = OutboundPolicy()
+spectators = set()
+spectator_policy = OutboundPolicy(SPECTATOR_HIGH_WATER)
 players = []
 waiting_players = []
 max_players = 5
 
-deck = Deck()
+deck = Shoe()
 dealer = Dealer()
 game_started = False
-current_turn_index = -1
 rounds_played = 0
+state_seq = 0
+dealer_hidden = True
 
-join_countdown_event = None
-between_countdown_event = None
-
-def broadcast(msg: str):
-    dead = []
-    for c in list(clients.keys()):
-        try:
-            c.sendall(msg.encode())
-        except:
-            dead.append(c)
-    for d in dead:
-        try: d.close()
-        except: pass
-        p = clients.pop(d, None)
-        if p and p in players:
-            players.remove(p)
-
-def push_state(hidden=True):
-    lines = []
-    for p in players:
-        hand_txt = ", ".join(str(c) for c in p.hand)
-        lines.append(f"STATE: PLAYER {p.name} | {hand_txt} | VALUE={p.hand_value()}")
-    if hidden:
-        if dealer.hand:
-            lines.append(f"STATE: DEALER HIDDEN | {dealer.hand[0]}")
-        else:
-            lines.append("STATE: DEALER HIDDEN | (no card)")
+strategy = StrategyEngine()
+ledger = Ledger()   # in memory until run_server opens one on disk
+stakes = {}         # Player -> stake to take at the next deal
+tokens = {}         # Player -> resume token
+sessions = {}       # resume token -> Player
+away = {}           # Player -> grace timer, while their connection is down
+recorder = RoundRecorder(None, 0, dealer.hit_on_soft_17)
+engine = E.RoundEngine(deck, dealer, recorder)
+
+wheel = TimerWheel()
+join_seconds = JOIN_COUNTDOWN
+between_seconds = BETWEEN_COUNTDOWN
+join_countdown = None
+between_countdown = None
+
+turn_deadline = TURN_TIMEOUT
+resume_grace = RESUME_GRACE
+turn_timer = None
+insurance_timer = None
+turn_no = 0
+turn_started = 0.0
+round_started = 0.0
+timings = TableTimings()
+reported_rounds = 0
+
+def send(conn, *msgs):
+    out = outbound.get(conn)
+    if out is not None:
+        sizes = {}
+        out.send(codecs.get(conn, P.TEXT).encode(msgs, sizes))
+        METRICS.count_sent(sizes)
+
+def broadcast(*msgs):
+    # Only queues bytes; each connection's writer thread does the socket I/O.
+    # A client over the high-water mark is shut down here and cleaned up by
+    # its own handle_client thread. Seated players are queued first; every
+    # spectator then gets the same already-encoded bytes.
+    started = time.perf_counter()
+    encoded = {}
+    sizes = {}
+    recipients = {}
+    for c in list(clients.keys()) + list(spectators):
+        codec = codecs.get(c, P.TEXT)
+        data = encoded.get(codec)
+        if data is None:
+            sizes[codec] = {}
+            data = encoded[codec] = codec.encode(msgs, sizes[codec])
+        out = outbound.get(c)
+        if out is not None:
+            out.send(data)
+            recipients[codec] = recipients.get(codec, 0) + 1
+    for codec, n in recipients.items():
+        METRICS.count_sent(sizes[codec], n)
+    METRICS.fanout.observe(sum(recipients.values()))
+    METRICS.broadcast.observe(time.perf_counter() - started)
+
+def snapshot(turn=True):
+    """The full table state; turn=False leaves out TURN (at the deal, whose D_TURN delta follows)."""
+    msgs = [(P.SNAPSHOT, state_seq)]
+    msgs += [(P.STATE_PLAYER, P.hand_label(p.name, i), P.card_codes(h.hand), h.hand_value())
+             for p in players for i, h in enumerate(p.hands)]
+    msgs += [chips(p) for p in players]
+    if dealer_hidden:
+        msgs.append((P.STATE_DEALER, True, P.card_codes(dealer.hand[:1]), 0))
     else:
-        d_txt = ", ".join(str(c) for c in dealer.hand)
-        lines.append(f"STATE: DEALER Dealer | {d_txt} | VALUE={dealer.hand_value()}")
-    broadcast("\n".join(lines) + "\n")
+        msgs.append((P.STATE_DEALER, False, P.card_codes(dealer.hand), dealer.hand_value()))
+    current = engine.current() if turn else None
+    if current is not None:
+        msgs.append((P.TURN, label(current)))
+    return msgs
 
-def start_join_countdown(seconds=10):
-    global join_countdown_event
-    with join_countdown_lock:
-        if game_started or not players or rounds_played > 0 or join_countdown_event:
-            return
-        join_countdown_event = threading.Event()
-
-    def run():
-        for s in range(seconds, 0, -1):
-            if join_countdown_event.is_set(): return
-            broadcast(f"GAME_COUNTDOWN {s}\n")
-            time.sleep(1)
-        if join_countdown_event.is_set(): return
-        broadcast("GAME_START\n")
-        start_round()
+def label(p: Player):
+    """Wire label of p's active hand."""
+    return P.hand_label(p.name, p.current)
 
-    threading.Thread(target=run, daemon=True).start()
+def chips(p: Player):
+    """p's balance and the stake riding on this round (or queued for the next)."""
+    return (P.CHIPS, p.name, p.chips, p.bet if p.hand else stakes.get(p, MIN_BET))
 
-def start_between_round_countdown(seconds=8):
-    global between_countdown_event
+def delta(kind, name, card=P.NO_CARD, value=0):
+    """Build the next sequenced state delta."""
+    global state_seq
+    state_seq += 1
+    return (P.DELTA, state_seq, kind, name, card, value)
+
+def card_delta(p, i, card, value):
+    return delta(P.D_CARD, P.hand_label(p.name, i), P.card_code(card), value)
+
+# Engine events broadcast as a bare ACTION line.
+_ACTS = {E.HIT: P.ACT_HIT, E.DOUBLE: P.ACT_DOUBLE, E.STAND: P.ACT_STAND, E.TIMEOUT: P.ACT_TIMEOUT,
+         E.SURRENDER: P.ACT_SURRENDER, E.BLACKJACK: P.ACT_BLACKJACK, E.BUST: P.ACT_BUST}
+
+def publish(events):
+    """Broadcast what the engine did; settle the round when it says so."""
+    global dealer_hidden, game_started, insurance_timer
+    msgs = []
+    for ev in events:
+        kind = ev[0]
+        if kind == E.DEAL:
+            msgs += [(P.ROUND_START,)] + snapshot(turn=False)
+        elif kind == E.INSURANCE:
+            seconds = min(INSURANCE_SECONDS, turn_deadline) if turn_deadline else INSURANCE_SECONDS
+            insurance_timer = wheel.schedule(seconds, insurance_timed_out, rounds_played)
+            msgs.append((P.ACTION, P.ACT_INSURANCE, "Dealer", P.NO_CARD))
+        elif kind == E.INSURED:
+            msgs += [(P.ACTION, P.ACT_INSURE, ev[1].name, P.NO_CARD), chips(ev[1])]
+        elif kind == E.TURN:
+            end_turn()
+            msgs.append(begin_turn(ev[1], ev[2]))
+        elif kind in (E.HIT, E.DOUBLE):
+            p, i, card, value = ev[1:]
+            msgs += [(P.ACTION, _ACTS[kind], P.hand_label(p.name, i), P.card_code(card)), card_delta(p, i, card, value)]
+            if kind == E.DOUBLE:
+                msgs.append(chips(p))
+        elif kind == E.SPLIT:
+            p, i, moved, new = ev[1:]
+            msgs += [(P.ACTION, P.ACT_SPLIT, P.hand_label(p.name, i), P.NO_CARD),
+                     delta(P.D_SPLIT, P.hand_label(p.name, new), P.card_code(moved), moved.value), chips(p)]
+        elif kind == E.CARD:
+            msgs.append(card_delta(*ev[1:]))
+        elif kind in _ACTS:
+            msgs.append((P.ACTION, _ACTS[kind], P.hand_label(ev[1].name, ev[2]), P.NO_CARD))
+        elif kind == E.DEALER:
+            end_turn()
+            msgs.append(delta(P.D_TURN, "Dealer"))
+        elif kind == E.REVEAL:
+            dealer_hidden = False
+            msgs.append(delta(P.D_REVEAL, "Dealer", P.card_code(ev[1]), ev[2]))
+        elif kind == E.DEALER_HIT:
+            msgs += [(P.ACTION, P.ACT_DEALER_HIT, "", P.card_code(ev[1])), card_delta(dealer, 0, ev[1], ev[2])]
+        elif kind == E.SETTLE:
+            broadcast(*msgs)
+            msgs = []
+            resolve_round()
+        elif kind == E.ABORT:
+            end_turn()
+            game_started = False
+    if insurance_timer and engine.phase != E.INSURING:
+        insurance_timer.cancel()
+        insurance_timer = None
+    if msgs:
+        broadcast(*msgs)
+
+def _countdown(seconds):
+    def done():
+        broadcast((P.GAME_START,))
+        start_round()
+    return Countdown(wheel, seconds, lambda s: broadcast((P.COUNTDOWN, s)), done)
+
+def start_join_countdown(seconds=None):
+    global join_countdown
     with join_countdown_lock:
-        if game_started or not players or between_countdown_event:
+        if game_started or not players or rounds_played > 0 or join_countdown:
             return
-        between_countdown_event = threading.Event()
-
-    def run():
-        for s in range(seconds, 0, -1):
-            if between_countdown_event.is_set(): return
-            broadcast(f"GAME_COUNTDOWN {s}\n")
-            time.sleep(1)
-        if between_countdown_event.is_set(): return
-        broadcast("GAME_START\n")
-        start_round()
+        join_countdown = _countdown(join_seconds if seconds is None else seconds)
 
-    threading.Thread(target=run, daemon=True).start()
+def start_between_round_countdown(seconds=None):
+    global between_countdown
+    with join_countdown_lock:
+        if game_started or not players or between_countdown:
+            return
+        between_countdown = _countdown(between_seconds if seconds is None else seconds)
 
 def cancel_countdowns():
-    global join_countdown_event, between_countdown_event
-    if join_countdown_event: join_countdown_event.set(); join_countdown_event = None
-    if between_countdown_event: between_countdown_event.set(); between_countdown_event = None
+    global join_countdown, between_countdown
+    if join_countdown: join_countdown.cancel(); join_countdown = None
+    if between_countdown: between_countdown.cancel(); between_countdown = None
 
 def start_round():
-    global deck, dealer, current_turn_index, game_started, rounds_played
+    global game_started, rounds_played, dealer_hidden, round_started
     with lock:
         cancel_countdowns()
-        if not players:
+        seated = [p for p in players if p not in away]     # a dropped seat sits the round out
+        taken = take_bets(seated)
+        if not taken:
             return
         game_started = True
+        dealer_hidden = True
         rounds_played += 1
-        deck = Deck()
-        if hasattr(deck, "shuffle"): deck.shuffle()
-        dealer.clear_hand()
+        round_started = time.monotonic()
+        METRICS.rounds.inc()
+        deck.shuffle_if_needed()
         for p in players: p.clear_hand()
-        for _ in range(2):
-            for p in players:
-                p.add_card(deck.deal())
-            dealer.add_card(deck.deal())
-        broadcast("ROUND_START\n")
-        push_state(hidden=True)
-        dealer_blackjack = dealer.hand_value() == 21
-        player_blackjacks = any(p.hand_value() == 21 for p in players)
-        if dealer_blackjack or player_blackjacks:
-            push_state(hidden=False)
-            resolve_round(immediate=True)
+        publish(engine.start([p for p in seated if p in taken], taken, rounds_played))
+
+def insurance_timed_out(round_no):
+    with lock:
+        if game_started and rounds_played == round_no:
+            publish(engine.close_insurance())
+
+def answer_insurance(p: Player, insure, conn):
+    with lock:
+        if engine.check(p, E.INSURE):
             return
-        current_turn_index = 0
-        broadcast(f"TURN: {players[0].name}\n")
+        if insure and not stake_more(p, p.bet // 2, "insure", conn):
+            insure = False
+        publish(engine.insure(p, insure))
+
+def take_bets(seated):
+    """Debit each seated player's stake (all they have, if less) for the round and
+    return {player: stake} for those dealt in; a player with no chips sits out.
+
+    The ledger logs the debit in the background; the deal never waits on disk.
+    """
+    taken = {}
+    for p in seated:
+        stake = min(stakes.get(p, MIN_BET), ledger.balance(p.name))
+        if stake:
+            p.chips = ledger.apply(p.name, -stake, "bet")
+            taken[p] = stake
+        else:
+            conn = next((c for c, q in clients.items() if q is p), None)
+            if conn is not None:
+                send(conn, (P.ERROR, "Not enough chips to bet."))
+    return taken
+
+def stake_more(p: Player, amount, why, conn):
+    """Debit an extra stake (a double, split or insurance) in full, or refuse it."""
+    if ledger.balance(p.name) < amount:
+        send(conn, (P.ERROR, f"Not enough chips to {why}."))
+        return False
+    p.chips = ledger.apply(p.name, -amount, why)
+    return True
 
-def next_turn():
-    global current_turn_index, game_started
+def set_stake(p: Player, amount, conn):
+    if not MIN_BET <= amount <= MAX_BET:
+        send(conn, (P.ERROR, f"Bets are {MIN_BET} to {MAX_BET} chips."))
+        return
+    with lock:
+        stakes[p] = amount
+        send(conn, chips(p))
+
+def begin_turn(p: Player, i):
+    """Arm the deadline for p's hand i; returns the delta announcing the turn."""
+    global turn_timer, turn_no, turn_started
+    turn_no += 1
+    turn_started = time.monotonic()
+    if turn_deadline:
+        turn_timer = wheel.schedule(turn_deadline, turn_timed_out, p, turn_no)
+    return delta(P.D_TURN, P.hand_label(p.name, i))
+
+def end_turn():
+    global turn_timer, turn_started
+    if turn_timer:
+        turn_timer.cancel()
+        turn_timer = None
+    if turn_started:
+        timings.turn.observe(time.monotonic() - turn_started)
+        turn_started = 0.0
+
+def turn_timed_out(p: Player, expected_turn):
+    """Auto-stand a player who let their turn deadline pass."""
     with lock:
-        if not game_started: return
-        current_turn_index += 1
-        if current_turn_index >= len(players):
-            broadcast("TURN: Dealer\n")
-            dealer_play()
+        if not game_started or turn_no != expected_turn or engine.current() is not p:
             return
-        broadcast(f"TURN: {players[current_turn_index].name}\n")
+        timings.timeouts += 1
+        publish(engine.act(p, E.TIMEOUT))
 
-def dealer_play():
-    broadcast("TURN: Dealer\n")
-    try:
-        while dealer.should_hit():
-            dealer.add_card(deck.deal())
-            broadcast(f"ACTION: DEALER_HIT {dealer.hand[-1]}\n")
-    except Exception as e:
-        broadcast(f"SERVER_ERROR DealerPlay {type(e).__name__}: {e}\n")
-    push_state(hidden=False)
-    resolve_round(immediate=False)
-
-
-def resolve_round(immediate=False):
-    global game_started
-    winners, pushes, losers = [], [], []
-    for p in players:
-        outcome = evaluate_player_outcome(p, dealer)
-        if outcome == "WIN": winners.append(p.name)
-        elif outcome == "PUSH": pushes.append(p.name)
-        else: losers.append(p.name)
-        broadcast(f"RESULT: {p.name} {outcome}\n")
-    broadcast(f"RESULT_SUMMARY: WINNERS={','.join(winners) or '-'} PUSHES={','.join(pushes) or '-'} LOSERS={','.join(losers) or '-'}\n")
-    broadcast("ROUND_END\n")
+def resolve_round():
+    """Pay out the engine's results and close the round."""
+    global game_started, dealer_hidden
+    by_outcome = ([], [], [])
+    msgs = []
+    for p, outcomes, won, insured in engine.results:
+        if insured:
+            p.chips = ledger.apply(p.name, insured, "insurance")
+        for i, outcome in enumerate(outcomes):
+            if won[i]:
+                p.chips = ledger.apply(p.name, won[i], outcome.lower())
+            code = P.OUTCOMES.index(outcome)
+            by_outcome[min(code, 2)].append(P.hand_label(p.name, i))     # a surrender counts as a loss
+            msgs.append((P.RESULT, P.hand_label(p.name, i), code))
+    msgs.append((P.RESULT_SUMMARY,) + tuple(tuple(names) for names in by_outcome))
+    msgs += [chips(p) for p in players]
+    msgs.append((P.ROUND_END,))
+    broadcast(*msgs)
+    end_turn()
+    timings.round.observe(time.monotonic() - round_started)
     game_started = False
     for p in players: p.clear_hand()
     dealer.clear_hand()
+    dealer_hidden = True
 
     while waiting_players and len(players) < max_players:
         np = waiting_players.pop(0)
         players.append(np)
-        broadcast(f"EVENT: JOIN {np.name}\n")
+        broadcast((P.EVENT, P.JOIN, np.name))
     if players:
         start_between_round_countdown()
 
+# Turn commands and the engine action each one takes.
+TURN_COMMANDS = {"HIT": E.HIT, "STAND": E.STAND, "DOUBLE": E.DOUBLE, "SPLIT": E.SPLIT, "SURRENDER": E.SURRENDER}
+
 def handle_action(player: Player, line: str, pingConn):
+    amount = P.parse_bet(line)
+    if amount is not None:
+        if player is not None:
+            set_stake(player, amount, pingConn)
+        return
     cmd = line.strip().upper()
     if cmd == "PING":
-        pingConn.sendall(b"PING\n")
+        send(pingConn, (P.PING,))
         return
-    if not game_started: return
-    if players[current_turn_index] != player:
+    if cmd == "HINT":
+        # Snapshot the cards under the lock; the (possibly slow) lookup runs without it.
+        with lock:
+            if not (game_started and player and dealer.hand and player.hand) or player.hand_value() >= 21:
+                return
+            hand, upcard = tuple(player.hand), dealer.hand[0]
+        ev_stand, ev_hit = strategy.evaluate(hand, upcard)
+        action = "HIT" if ev_hit > ev_stand else "STAND"
+        send(pingConn, (P.HINT, P.COMMANDS.index(action), ev_stand, ev_hit))
         return
-    if cmd == "HIT":
-        card = deck.deal()
-        player.add_card(card)
-        broadcast(f"ACTION: HIT {player.name} {card}\n")
-        push_state(hidden=True)
-        if player.hand_value() == 21:
-            broadcast(f"ACTION: BLACKJACK {player.name}\n")
-            next_turn()
-        if player.hand_value() > 21:
-            broadcast(f"ACTION: BUST {player.name}\n")
-            next_turn()
+    if cmd == "RESYNC":
+        with lock:
+            send(pingConn, *snapshot())
         return
-    if cmd == "STAND":
-        broadcast(f"ACTION: STAND {player.name}\n")
-        next_turn()
+    if not game_started or player is None: return
+    if cmd in ("INSURE", "DECLINE"):
+        answer_insurance(player, cmd == "INSURE", pingConn)
         return
+    kind = TURN_COMMANDS.get(cmd)
+    if kind is None:
+        return
+    with lock:
+        if engine.current() is not player:
+            return
+        err = engine.check(player, kind)
+        if err:
+            send(pingConn, (P.ERROR, err))
+            return
+        if kind in (E.DOUBLE, E.SPLIT) and not stake_more(player, player.active.bet, cmd.lower(), pingConn):
+            return
+        publish(engine.act(player, kind))
+
+def report_timings():
+    global reported_rounds
+    if timings.round.count != reported_rounds:
+        reported_rounds = timings.round.count
+        print(f"Table: {timings.summary(between_seconds)}")
 
 def next_available_player_name():
     used = {p.name for p in players} | {p.name for p in waiting_players}
@@ -199,67 +394,213 @@ def next_available_player_name():
     return f"Player{i}"
 
 def remove_player(p: Player):
-    if p in players:
-        players.remove(p)
+    """Unseat p. Mid-round their stake is forfeit and the turn order closes up."""
     if p in waiting_players:
         waiting_players.remove(p)
+    if p not in players:
+        return
+    players.remove(p)
+    if game_started:
+        publish(engine.leave(p))
+
+def greet(conn, p: Player):
+    """Send p their name (and resume token, if dropped seats are held), then the table state."""
+    msgs = [(P.NAME, p.name)]
+    if resume_grace:
+        token = tokens.get(p)
+        if token is None:
+            token = tokens[p] = secrets.token_hex(8)
+            sessions[token] = p
+        msgs.append((P.RESUME_TOKEN, token))
+    send(conn, *msgs, *snapshot())
+
+def resume(conn, codec, token):
+    """Hand a held seat to the connection presenting its token; None if no seat holds it."""
+    p = sessions.get(token)
+    if p is None:
+        return None
+    outbound[conn] = ThreadedOutbound(conn, outbound_policy)
+    codecs[conn] = codec
+    for old, q in list(clients.items()):
+        if q is p:      # the old connection has not noticed it is dead yet
+            del clients[old]
+            try: old.shutdown(socket.SHUT_RDWR)
+            except OSError: pass
+    timer = away.pop(p, None)
+    if timer:
+        timer.cancel()
+    clients[conn] = p
+    greet(conn, p)
+    broadcast((P.EVENT, P.BACK, p.name))
+    if not game_started:
+        start_join_countdown() if rounds_played == 0 else start_between_round_countdown()
+    return p
+
+def hold(p: Player):
+    """p's connection dropped: keep the seat for resume_grace seconds."""
+    away[p] = wheel.schedule(resume_grace, grace_expired, p)
+    broadcast((P.EVENT, P.AWAY, p.name))
+
+def grace_expired(p: Player):
+    with lock:
+        if away.pop(p, None) is not None:
+            depart(p)
+
+def depart(p: Player):
+    """p is gone for good: give up the seat and forget the resume token."""
+    sessions.pop(tokens.pop(p, None), None)
+    broadcast((P.EVENT, P.LEAVE, p.name))
+    remove_player(p)
+    stakes.pop(p, None)
+    if not game_started and players and rounds_played == 0 and not join_countdown:
+        start_join_countdown()
 
 def handle_client(conn):
+    METRICS.connections.inc()
+    dropped = True
     try:
-        name = conn.recv(128).decode().strip()
-        used = {p.name for p in players} | {p.name for p in waiting_players}
-        used |= {p.name for p in clients.values()}
-
-        # --- ADDED: if blank OR taken, assign next Player# ---
-        if (not name) or (name in used):
-            name = next_available_player_name()
-        with lock:
-            pl = Player(name)
-            clients[conn] = pl
-            if game_started:
-                waiting_players.append(pl)
-                conn.sendall(b"Round in progress. You will join next round.\n")
-                broadcast(f"EVENT: JOIN_WAIT {name}\n")
-                conn.sendall(f"NAME: {name}\n".encode())
-            else:
-                players.append(pl)
-                broadcast(f"EVENT: JOIN {name}\n")
-                conn.sendall(f"NAME: {name}\n".encode())
-                push_state(hidden=not game_started)
-                if rounds_played == 0:
-                    start_join_countdown()
-
-        while True:
-            data = conn.recv(256)
+        decoder = P.StreamDecoder()
+        hello = None
+        while hello is None:
+            data = conn.recv(RECV_SIZE)
             if not data:
+                return      # closed before saying hello (e.g. a readiness probe): seat nobody
+            decoder.feed(data)
+            hello = next(decoder, None)
+        codec, name = P.negotiate(hello)
+        decoder.binary = codec.binary
+        if P.watch_request(name) is not None:
+            spectate(conn, codec, decoder)
+            return
+        token = P.resume_request(name)
+        if token is not None:
+            with lock:
+                pl = resume(conn, codec, token)
+            if pl is None:
+                # Not queued: the connection has no outbound writer. Sent without the lock held.
+                conn.sendall(codec.encode([(P.ERROR, "Unknown or expired resume token.")]))
+                return
+        else:
+            pl = seat(conn, codec, name)
+        for line in read_commands(conn, codec, decoder):
+            if line.lower() == "quit":
+                dropped = False
                 break
-            for line in data.decode().splitlines():
-                if line.lower() == "quit":
-                    raise ConnectionError()
-                handle_action(pl, line, conn)
-    except:
-        pass
+            handle_action(pl, line, conn)
+    except OSError:
+        pass  # disconnects
+    except Exception as e:
+        dropped = False
+        METRICS.error("handle_client", e)
     finally:
         with lock:
+            codecs.pop(conn, None)
+            spectators.discard(conn)
+            out = outbound.pop(conn, None)
+            if out is not None: out.close()
             p = clients.pop(conn, None)
-            if p:
-                remove_player(p)
-                broadcast(f"EVENT: LEAVE {p.name}\n")
-            if not game_started and players:
-                if rounds_played == 0 and not join_countdown_event:
-                    start_join_countdown()
+            if p and dropped and resume_grace and (p in players or p in waiting_players):
+                hold(p)
+            elif p:
+                depart(p)
         try: conn.close()
-        except: pass
+        except OSError: pass
+
+def seat(conn, codec, name):
+    """Seat a new player (or queue them for the next round)."""
+    name = P.player_name(name)
+    used = {p.name for p in players} | {p.name for p in waiting_players}
+    used |= {p.name for p in clients.values()}
+
+    # --- ADDED: if blank OR taken, assign next Player# ---
+    if (not name) or (name in used):
+        name = next_available_player_name()
+    with lock:
+        pl = Player(name, ledger.balance(name))
+        outbound[conn] = ThreadedOutbound(conn, outbound_policy)
+        clients[conn] = pl
+        codecs[conn] = codec
+        if game_started:
+            waiting_players.append(pl)
+            send(conn, (P.INFO, "Round in progress. You will join next round."))
+            broadcast((P.EVENT, P.JOIN_WAIT, name))
+            greet(conn, pl)
+        else:
+            players.append(pl)
+            broadcast((P.EVENT, P.JOIN, name))
+            greet(conn, pl)
+            # Between rounds too: the table may be idle because nobody could cover a bet.
+            start_join_countdown() if rounds_played == 0 else start_between_round_countdown()
+    return pl
+
+def spectate(conn, codec, decoder):
+    """Stream table state to a read-only spectator until it disconnects."""
+    with lock:
+        outbound[conn] = ThreadedOutbound(conn, spectator_policy)
+        codecs[conn] = codec
+        spectators.add(conn)
+        send(conn, (P.INFO, "Spectating. You will not be dealt in."), *snapshot())
+    for line in read_commands(conn, codec, decoder):
+        handle_action(None, line, conn)
 
-def run_server(host=HOST, port=PORT):
+def read_commands(conn, codec, decoder):
+    """Yield the client's command words until it disconnects or sends QUIT (yielded last)."""
+    while True:
+        # Commands pipelined behind the hello are already in the decoder.
+        for item in decoder:
+            if codec.binary:
+                if item[0] not in P.CLIENT_TYPES:
+                    continue
+                item = P.to_text(item)
+            yield item
+            if item.lower() == "quit":
+                return
+        data = conn.recv(RECV_SIZE)
+        if not data:
+            return
+        decoder.feed(data)
+
+def run_server(host=HOST, port=PORT, high_water=None, turn_timeout=None, countdown=None,
+               metrics_port=None, metrics_log=None, ledger_path=None, history_path=None,
+               seed=None, resume_grace_seconds=None):
+    global outbound_policy, turn_deadline, join_seconds, between_seconds, ledger, deck, resume_grace
+    if high_water:
+        outbound_policy = OutboundPolicy(high_water)
+    if turn_timeout is not None:
+        turn_deadline = turn_timeout
+    if countdown is not None:
+        join_seconds = between_seconds = countdown
+    if resume_grace_seconds is not None:
+        resume_grace = resume_grace_seconds
+    # A seed makes the shoe reproducible (testing); otherwise it shuffles from the OS CSPRNG.
+    deck = engine.deck = Shoe(rng=make_rng(seed) if seed is not None else make_rng(mode="secure"))
+    if ledger_path:
+        ledger = Ledger(ledger_path)
+        print(f"Ledger in {ledger_path}: {len(ledger.balances)} accounts")
+    if history_path:
+        recorder.writer = HistoryWriter(history_path)
+        wheel.every(HISTORY_FLUSH, recorder.writer.flush)
     print(f"Server on {host}:{port}")
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind((host, port))
-        s.listen()
-        while True:
-            c, a = s.accept()
-            threading.Thread(target=handle_client, args=(c,), daemon=True).start()
+    METRICS.watch(lambda: len(clients), lambda: int(bool(clients)), timings, STATS, lambda: len(spectators),
+                  ledger)
+    if metrics_port:
+        print(f"Metrics on http://127.0.0.1:{MetricsListener(REGISTRY, port=metrics_port).port}/metrics")
+    if metrics_log:
+        wheel.every(metrics_log, lambda: print(REGISTRY.summary()))
+    wheel.every(REPORT_INTERVAL, report_timings)
+    wheel.start_thread()
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            s.bind((host, port))
+            s.listen()
+            while True:
+                c, a = s.accept()
+                threading.Thread(target=handle_client, args=(c,), daemon=True).start()
+    finally:
+        ledger.close()
+        if recorder.writer is not None:
+            recorder.writer.close()
 
 if __name__ == "__main__":
     run_server()
\ No newline at end of file
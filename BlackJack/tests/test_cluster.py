@@ -0,0 +1,36 @@
+import unittest
+import zlib
+from network.cluster import Placement
+
+
+class PlacementTest(unittest.TestCase):
+    def setUp(self):
+        self.placement = Placement(3)
+        self.loads = [{"conns": 5, "open_seats": 0}, {"conns": 1, "open_seats": 2}, {"conns": 9, "open_seats": 1}]
+
+    def choose(self, name, watch=None, available=None):
+        return self.placement.choose(name, watch, self.loads, available)
+
+    def test_named_player_goes_to_their_shard(self):
+        home = zlib.crc32(b"alice") % 3
+        self.assertEqual(self.choose("alice"), home)
+        self.assertIsNone(self.choose("alice", available={0, 1, 2} - {home}))
+
+    def test_worker_prefix_routes_resumes_and_made_up_names(self):
+        self.assertEqual(self.choose("RESUME w2-1234abcd"), 2)
+        self.assertEqual(self.choose("w1-Player3"), 1)
+        self.assertIsNone(self.choose("RESUME w1-1234abcd", available={0, 2}))
+
+    def test_nameless_player_takes_an_open_seat(self):
+        self.assertEqual(self.choose(""), 1)
+        self.assertEqual(self.choose("", available={0, 2}), 2)
+        self.assertIsNone(self.choose("", available=set()))
+
+    def test_spectator_falls_back_to_the_busiest_worker(self):
+        self.assertEqual(self.choose("WATCH 2", "2"), 1)
+        self.assertEqual(self.choose("WATCH 2", "2", available={0, 2}), 2)
+        self.assertEqual(self.choose("WATCH", ""), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+from game import engine as E
+from game.deck import CARDS
+from game.player import Player, Dealer
+
+
+def card(rank):
+    return next(c for c in CARDS if c.rank == rank)
+
+
+class StackedDeck:
+    """Deals the given ranks in order. With one seat the deal is player, dealer
+    upcard, player, dealer hole card; later cards go to draws."""
+    def __init__(self, *ranks):
+        self.cards = [card(r) for r in ranks]
+
+    def deal(self):
+        return self.cards.pop(0)
+
+
+def play(ranks, stake=10):
+    player = Player("alice")
+    engine = E.RoundEngine(StackedDeck(*ranks), Dealer())
+    engine.start([player], {player: stake})
+    return engine, player
+
+
+def results(engine):
+    (_, outcomes, won, insured), = engine.results
+    return outcomes, won, insured
+
+
+class PayoutTest(unittest.TestCase):
+    def test_win_pays_even_money(self):
+        engine, p = play(["10", "10", "9", "7"])
+        engine.act(p, E.STAND)
+        self.assertEqual(results(engine), (["WIN"], [20], 0))
+
+    def test_natural_pays_three_to_two_and_settles_at_once(self):
+        engine, p = play(["A", "10", "K", "7"])
+        self.assertEqual(engine.phase, E.IDLE)
+        self.assertEqual(results(engine), (["WIN"], [25], 0))
+
+    def test_double_doubles_the_stake_and_draws_one_card(self):
+        engine, p = play(["6", "10", "5", "7", "10"])
+        events = engine.act(p, E.DOUBLE)
+        self.assertEqual(events[0][0], E.DOUBLE)
+        self.assertEqual(p.hands[0].bet, 20)
+        self.assertEqual(len(p.hands[0].hand), 3)
+        self.assertEqual(results(engine), (["WIN"], [40], 0))
+
+    def test_double_is_only_on_two_cards(self):
+        engine, p = play(["2", "10", "3", "7", "4"])
+        engine.act(p, E.HIT)
+        self.assertIsNotNone(engine.check(p, E.DOUBLE))
+        with self.assertRaises(E.IllegalAction):
+            engine.act(p, E.DOUBLE)
+
+    def test_split_plays_and_pays_each_hand(self):
+        engine, p = play(["8", "10", "8", "7", "3", "2", "10", "9"])
+        events = engine.act(p, E.SPLIT)
+        self.assertEqual([e[0] for e in events], [E.SPLIT, E.CARD, E.CARD])
+        self.assertEqual([h.bet for h in p.hands], [10, 10])
+        engine.act(p, E.DOUBLE)             # 8, 3 and a 10
+        engine.act(p, E.HIT)                # 8, 2 and a 9
+        engine.act(p, E.STAND)
+        self.assertEqual(results(engine), (["WIN", "WIN"], [40, 20], 0))
+
+    def test_split_aces_take_one_card_and_21_is_not_a_natural(self):
+        engine, p = play(["A", "10", "A", "7", "K", "5"])
+        events = engine.act(p, E.SPLIT)
+        self.assertEqual(events[-1], (E.SETTLE,))
+        self.assertEqual(results(engine), (["WIN", "LOSE"], [20, 0], 0))
+
+    def test_split_needs_a_pair(self):
+        engine, p = play(["8", "10", "9", "7"])
+        self.assertIsNotNone(engine.check(p, E.SPLIT))
+
+    def test_surrender_returns_half_the_stake(self):
+        engine, p = play(["10", "10", "6", "9"])
+        engine.act(p, E.SURRENDER)
+        self.assertEqual(results(engine), (["SURRENDER"], [5], 0))
+
+    def test_surrender_is_only_on_the_first_two_cards(self):
+        engine, p = play(["2", "10", "3", "7", "4"])
+        engine.act(p, E.HIT)
+        self.assertIsNotNone(engine.check(p, E.SURRENDER))
+
+    def test_insurance_pays_two_to_one_on_a_dealer_natural(self):
+        engine, p = play(["10", "A", "9", "K"])
+        self.assertEqual(engine.phase, E.INSURING)
+        events = engine.insure(p)
+        self.assertEqual(events[0], (E.INSURED, p))
+        self.assertEqual(p.insurance, 5)
+        self.assertEqual(engine.phase, E.IDLE)
+        self.assertEqual(results(engine), (["LOSE"], [0], 15))
+
+    def test_lost_insurance_pays_nothing(self):
+        engine, p = play(["10", "A", "9", "7"])
+        engine.insure(p)
+        self.assertEqual(engine.phase, E.PLAYING)
+        engine.act(p, E.STAND)
+        self.assertEqual(results(engine), (["WIN"], [20], 0))
+
+    def test_declined_insurance(self):
+        engine, p = play(["10", "A", "9", "K"])
+        engine.close_insurance()
+        self.assertEqual(p.insurance, 0)
+        self.assertEqual(results(engine), (["LOSE"], [0], 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from game import engine as E
+from game.deck import Shoe
+from game.history import (HistoryWriter, RoundRecord, RoundRecorder, read_records, replay, split_records,
+                          verify)
+from game.player import Player, Dealer
+
+
+def choose(engine, p):
+    """A policy that reaches every action the log can hold."""
+    if engine.check(p, E.SPLIT) is None:
+        return E.SPLIT
+    value = p.hand_value()
+    if value in (10, 11) and engine.check(p, E.DOUBLE) is None:
+        return E.DOUBLE
+    if value == 16 and engine.check(p, E.SURRENDER) is None:
+        return E.SURRENDER
+    return E.HIT if value < 17 else E.STAND
+
+
+def play_rounds(path, rounds, seed=7):
+    writer = HistoryWriter(path)
+    shoe = Shoe(rng=random.Random(seed))
+    engine = E.RoundEngine(shoe, Dealer(), RoundRecorder(writer, table_id=3))
+    players = [Player(f"p{i}") for i in range(3)]
+    for n in range(1, rounds + 1):
+        shoe.shuffle_if_needed()
+        engine.start(players, {p: 10 * (i + 1) for i, p in enumerate(players)}, n)
+        if engine.phase == E.INSURING:
+            engine.insure(players[0])
+            engine.close_insurance()
+        while engine.phase == E.PLAYING:
+            p = engine.current()
+            if n % 50 == 0 and p is players[2]:
+                engine.leave(p)         # a mid-round departure now and then
+            else:
+                engine.act(p, choose(engine, p))
+    writer.close()
+
+
+class HistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "rounds.bjh")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_record_encodes_and_decodes(self):
+        rec = RoundRecord(7, 42, 1_700_000_000, True, ["alice", "zoë"], [10, 20], [(0,), (2, 1)], [20, 20],
+                          bytes([1, 14, 27, 40, 2, 3, 51]), bytes([0 << 3 | E.HIT, 1 << 3 | E.SPLIT]))
+        back = RoundRecord.decode(rec.encode()[2:])
+        for field in RoundRecord.__slots__:
+            self.assertEqual(getattr(back, field), getattr(rec, field), field)
+
+    def test_torn_last_record_is_skipped(self):
+        rec = RoundRecord(1, 1, 0, False, ["a"], [10], [(2,)], [0], bytes(range(5)), bytes([E.STAND]))
+        data = rec.encode() * 2
+        self.assertEqual(len(list(split_records(data[:-3]))), 1)
+
+    def test_logged_rounds_replay_to_their_results(self):
+        play_rounds(self.path, 400)
+        records = list(read_records(self.path))
+        self.assertEqual(len(records), 400)
+        kinds = {a & 7 for rec in records for a in rec.actions}
+        self.assertTrue({E.DOUBLE, E.SPLIT, E.SURRENDER, E.INSURE, E.LEAVE} <= kinds)
+        for rec in records:
+            self.assertEqual(replay(rec), (rec.outcomes, rec.payouts), str(rec))
+        result = verify(self.path, workers=1)
+        self.assertEqual((result.rounds, result.failures), (400, 0))
+
+    def test_tampered_round_fails_verification(self):
+        play_rounds(self.path, 20)
+        records = list(read_records(self.path))
+        records[5].payouts[0] += 10
+        with open(self.path, "wb") as f:
+            f.write(b"".join(rec.encode() for rec in records))
+        result = verify(self.path, workers=1)
+        self.assertEqual((result.rounds, result.failures), (20, 1))
+        self.assertIn("round 6", result.examples[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from network.ledger import Ledger, SNAPSHOT_FILE, WAL_FILE
+
+
+def record(seq, acct, delta, bal, why="test"):
+    return json.dumps({"seq": seq, "acct": acct, "delta": delta, "bal": bal, "why": why}) + "\n"
+
+
+class LedgerTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.ledgers = []
+
+    def tearDown(self):
+        for ledger in self.ledgers:
+            ledger.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def open(self, path, **kw):
+        ledger = Ledger(path, commit_interval=0, **kw)
+        self.ledgers.append(ledger)
+        return ledger
+
+    def crash_image(self, name="crashed"):
+        """A copy of the ledger directory as it stands, as if the process died now."""
+        path = os.path.join(self.dir, name)
+        shutil.copytree(os.path.join(self.dir, "live"), path)
+        return path
+
+    def write_files(self, wal=b"", snapshot=None):
+        path = os.path.join(self.dir, "live")
+        os.makedirs(path)
+        with open(os.path.join(path, WAL_FILE), "wb") as f:
+            f.write(wal)
+        if snapshot is not None:
+            with open(os.path.join(path, SNAPSHOT_FILE), "w") as f:
+                json.dump(snapshot, f)
+        return path
+
+    def test_in_memory_ledger(self):
+        ledger = Ledger()
+        self.assertEqual(ledger.balance("alice"), 1000)
+        self.assertEqual(ledger.apply("alice", -250, "bet"), 750)
+        with self.assertRaises(ValueError):
+            ledger.apply("alice", -751, "bet")
+        self.assertEqual(ledger.balance("alice"), 750)
+
+    def test_committed_changes_replay_from_the_log(self):
+        ledger = self.open(os.path.join(self.dir, "live"))
+        ledger.apply("alice", -100, "bet")
+        ledger.apply("bob", 50, "win")
+        ledger.apply("alice", 30, "win")
+        self.assertTrue(ledger.flush(5))
+        path = self.crash_image()
+        self.assertFalse(os.path.exists(os.path.join(path, SNAPSHOT_FILE)))
+        recovered = self.open(path)
+        self.assertEqual(recovered.balances, {"alice": 930, "bob": 1050})
+        self.assertEqual(recovered.seq, 3)
+
+    def test_torn_tail_is_cut_off(self):
+        good = record(1, "alice", -10, 990) + record(2, "bob", 20, 1020)
+        torn = record(3, "alice", -10, 980)
+        path = self.write_files((good + torn[:-12]).encode())
+        ledger = self.open(path)
+        self.assertEqual(ledger.balances, {"alice": 990, "bob": 1020})
+        self.assertEqual(ledger.seq, 2)
+        self.assertEqual(os.path.getsize(os.path.join(path, WAL_FILE)), len(good))
+
+    def test_complete_record_without_newline_is_torn(self):
+        good = record(1, "alice", -10, 990)
+        path = self.write_files((good + record(2, "alice", -10, 980).rstrip("\n")).encode())
+        ledger = self.open(path)
+        self.assertEqual(ledger.balance("alice"), 990)
+        self.assertEqual(os.path.getsize(os.path.join(path, WAL_FILE)), len(good))
+
+    def test_replay_skips_records_the_snapshot_covers(self):
+        wal = record(1, "alice", -10, 990) + record(2, "alice", -10, 980) + record(3, "bob", 5, 1005)
+        path = self.write_files(wal.encode(), {"seq": 2, "balances": {"alice": 500}})
+        ledger = self.open(path)
+        self.assertEqual(ledger.balances, {"alice": 500, "bob": 1005})
+        self.assertEqual(ledger.seq, 3)
+
+    def test_compaction_writes_a_snapshot_and_empties_the_log(self):
+        ledger = self.open(os.path.join(self.dir, "live"), compact_every=3)
+        for _ in range(5):
+            ledger.apply("alice", -10, "bet")
+        ledger.close()
+        path = os.path.join(self.dir, "live")
+        self.assertGreaterEqual(ledger.compactions, 1)
+        self.assertEqual(os.path.getsize(os.path.join(path, WAL_FILE)), 0)
+        with open(os.path.join(path, SNAPSHOT_FILE)) as f:
+            self.assertEqual(json.load(f), {"seq": 5, "balances": {"alice": 950}})
+        reopened = self.open(path)
+        self.assertEqual(reopened.balance("alice"), 950)
+        reopened.apply("alice", 100, "win")
+        self.assertTrue(reopened.flush(5))
+        recovered = self.open(self.crash_image())
+        self.assertEqual(recovered.balance("alice"), 1050)
+        self.assertEqual(recovered.seq, 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+from network import protocol as P
+
+SERVER_MESSAGES = [
+    (P.NAME, "alice"), (P.RESUME_TOKEN, "w1-0123abcd"), (P.INFO, "Round in progress. You will join next round."),
+    (P.EVENT, P.JOIN_WAIT, "bob"), (P.COUNTDOWN, 300), (P.GAME_START,), (P.ROUND_START,), (P.ROUND_END,),
+    (P.PING,), (P.STATE_PLAYER, "alice#2", (0, 12), 13), (P.STATE_DEALER, True, (5,), 0),
+    (P.STATE_DEALER, False, (5, 21), 17), (P.TURN, "alice#2"), (P.ACTION, P.ACT_HIT, "alice", 3),
+    (P.ACTION, P.ACT_STAND, "alice#2", P.NO_CARD), (P.ACTION, P.ACT_DEALER_HIT, "", 7),
+    (P.ACTION, P.ACT_INSURANCE, "Dealer", P.NO_CARD), (P.RESULT, "alice#2", P.OUTCOMES.index("SURRENDER")),
+    (P.RESULT_SUMMARY, ("alice",), (), ("bob", "carol")), (P.HINT, P.COMMANDS.index("HIT"), -0.25, 0.5),
+    (P.ERROR, "Not enough chips to bet."), (P.SNAPSHOT, 70000), (P.DELTA, 5, P.D_CARD, "alice", 3, 15),
+    (P.DELTA, 6, P.D_TURN, "Dealer", P.NO_CARD, 0), (P.DELTA, 7, P.D_REVEAL, "Dealer", 9, 19),
+    (P.DELTA, 8, P.D_SPLIT, "alice#2", 9, 10), (P.CHIPS, "alice", 990, 10),
+]
+
+
+class RoundTripTest(unittest.TestCase):
+    def test_every_server_message_type_is_covered(self):
+        covered = {m[0] for m in SERVER_MESSAGES}
+        self.assertEqual(covered, set(P.SCHEMAS) - set(P.CLIENT_TYPES))
+
+    def test_text_round_trip(self):
+        for msg in SERVER_MESSAGES:
+            self.assertEqual(P.parse_text(P.to_text(msg)), msg)
+
+    def test_binary_round_trip(self):
+        for msg in SERVER_MESSAGES:
+            frame = P.to_frame(msg)
+            self.assertEqual(len(frame) - 2, int.from_bytes(frame[:2], "big"))
+            self.assertEqual(P.from_frame(frame[2:]), msg)
+
+    def test_codec_streams_decode_to_the_same_messages(self):
+        text = P.StreamDecoder()
+        text.feed(P.TEXT.encode(SERVER_MESSAGES))
+        self.assertEqual([P.parse_text(line) for line in text], SERVER_MESSAGES)
+        binary = P.StreamDecoder(binary=True)
+        binary.feed(P.BINARY.encode(SERVER_MESSAGES))
+        self.assertEqual(list(binary), SERVER_MESSAGES)
+
+    def test_client_messages(self):
+        for line, msg in (("hit", (P.COMMAND, P.COMMANDS.index("HIT"))), ("BET 50", (P.BET, 50)),
+                          ("RESYNC", (P.COMMAND, P.COMMANDS.index("RESYNC")))):
+            self.assertEqual(P.client_message(line), msg)
+            self.assertEqual(P.from_frame(P.to_frame(msg)[2:]), msg)
+            self.assertEqual(P.to_text(msg), line.upper())
+
+    def test_handshake(self):
+        self.assertEqual(P.negotiate("alice\n"), (P.TEXT, "alice"))
+        self.assertEqual(P.negotiate(f"{P.BINARY_HELLO} alice\n"), (P.BINARY, "alice"))
+        self.assertEqual(P.watch_request("WATCH 3"), "3")
+        self.assertIsNone(P.watch_request("alice"))
+        self.assertEqual(P.resume_request("RESUME w0-ab12"), "w0-ab12")
+        self.assertIsNone(P.resume_request("RESUME"))
+
+
+class StreamDecoderTest(unittest.TestCase):
+    def test_line_split_across_reads(self):
+        decoder = P.StreamDecoder()
+        decoder.feed(b"TURN: Al")
+        self.assertEqual(list(decoder), [])
+        decoder.feed(b"ice\nPING\r\nROUND")
+        self.assertEqual(list(decoder), ["TURN: Alice", "PING"])
+        decoder.feed(b"_END\n")
+        self.assertEqual(list(decoder), ["ROUND_END"])
+
+    def test_multibyte_character_split_across_reads(self):
+        decoder = P.StreamDecoder()
+        data = "NAME: Zoë\n".encode()
+        decoder.feed(data[:8])
+        self.assertEqual(list(decoder), [])
+        decoder.feed(data[8:])
+        self.assertEqual(list(decoder), ["NAME: Zoë"])
+
+    def test_oversized_line_without_newline(self):
+        decoder = P.StreamDecoder(max_line=16)
+        decoder.feed(b"X" * 17)
+        with self.assertRaises(P.FrameError):
+            list(decoder)
+
+    def test_oversized_line_with_newline(self):
+        decoder = P.StreamDecoder()
+        decoder.feed(b"X" * 6000 + b"\n")
+        with self.assertRaises(P.FrameError):
+            list(decoder)
+
+    def test_line_at_the_limit(self):
+        decoder = P.StreamDecoder(max_line=16)
+        decoder.feed(b"X" * 16 + b"\n")
+        self.assertEqual(list(decoder), ["X" * 16])
+
+    def test_frame_split_across_reads(self):
+        data = P.to_frame((P.TURN, "Alice")) + P.to_frame((P.PING,))
+        decoder = P.StreamDecoder(binary=True)
+        got = []
+        for i in range(len(data)):
+            decoder.feed(data[i:i + 1])
+            got += list(decoder)
+        self.assertEqual(got, [(P.TURN, "Alice"), (P.PING,)])
+
+    def test_oversized_frame(self):
+        decoder = P.StreamDecoder(binary=True, max_frame=8)
+        decoder.feed(P.to_frame((P.INFO, "a long message")))
+        with self.assertRaises(P.FrameError):
+            list(decoder)
+
+
+
+class PlayerNameTest(unittest.TestCase):
+    def test_separators_are_replaced(self):
+        self.assertEqual(P.player_name("  Ann Lee\t#2 "), "Ann_Lee__2")
+
+    def test_long_names_are_cut_on_a_character_boundary(self):
+        name = P.player_name("é" * 200)
+        self.assertEqual(name, "é" * 127)
+        self.assertLessEqual(len(name.encode()), P.MAX_NAME)
+
+    def test_sanitised_name_survives_both_codecs(self):
+        name = P.player_name("Zoë #1 " + "x" * 300)
+        msg = (P.TURN, name)
+        self.assertEqual(P.parse_text(P.to_text(msg)), msg)
+        self.assertEqual(P.from_frame(P.to_frame(msg)[2:]), msg)
+        self.assertEqual(P.hand_owner(P.hand_label(name, 1)), name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,23 @@
+import time
+import unittest
+from network.scheduler import TimerWheel
+
+
+class TimerWheelTest(unittest.TestCase):
+    def test_raising_callback_does_not_stop_the_batch(self):
+        wheel = TimerWheel(tick=0.01)
+        fired = []
+
+        def boom():
+            raise RuntimeError("boom")
+
+        wheel.schedule(0.01, boom)
+        wheel.schedule(0.01, fired.append, "after")
+        time.sleep(0.05)
+        self.assertEqual(wheel.advance(), 2)
+        self.assertEqual(fired, ["after"])
+        self.assertEqual(wheel.pending, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+from bench.loadgen import free_port, start_server
+from network import protocol as P
+from network.ledger import Ledger
+
+
+class Client:
+    """A text-protocol player reading parsed messages off a real server."""
+    def __init__(self, port, name):
+        self.sock = socket.create_connection(("127.0.0.1", port), timeout=10)
+        self.sock.sendall(f"{name}\n".encode())
+        self.decoder = P.StreamDecoder()
+
+    def send(self, line):
+        self.sock.sendall(f"{line}\n".encode())
+
+    def wait(self, match, timeout=6.0):
+        """Return the first message satisfying match, or None after timeout seconds."""
+        deadline = time.monotonic() + timeout
+        while True:
+            for line in self.decoder:
+                msg = P.parse_text(line)
+                if match(msg):
+                    return msg
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self.sock.settimeout(remaining)
+            try:
+                data = self.sock.recv(4096)
+            except socket.timeout:
+                return None
+            if not data:
+                return None
+            self.decoder.feed(data)
+
+    def close(self):
+        self.sock.close()
+
+
+def is_type(t):
+    return lambda msg: msg[0] == t
+
+
+class ServerTest:
+    engine = None
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        ledger = Ledger(self.dir)
+        ledger.apply("broke", -ledger.balance("broke"), "test")
+        ledger.close()
+        self.port = free_port()
+        self.proc = start_server(self.engine, self.port, 1, self.dir, countdown=1)
+        self.clients = []
+
+    def tearDown(self):
+        for c in self.clients:
+            c.close()
+        self.proc.terminate()
+        self.proc.wait(10)
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def connect(self, name):
+        c = Client(self.port, name)
+        self.clients.append(c)
+        return c
+
+    def test_broke_player_sits_out(self):
+        broke = self.connect("broke")
+        rich = self.connect("rich")
+        self.assertEqual(broke.wait(is_type(P.ERROR)), (P.ERROR, "Not enough chips to bet."))
+        self.assertIsNotNone(rich.wait(lambda m: m[0] == P.STATE_PLAYER and m[1] == "rich" and m[2]))
+        self.assertIsNotNone(rich.wait(lambda m: m[0] == P.RESULT and m[1] == "rich"))
+
+    def test_table_deals_again_after_nobody_could_bet(self):
+        alice = self.connect("alice")
+        broke = self.connect("broke")
+        self.assertIsNotNone(alice.wait(is_type(P.ROUND_END)))
+        alice.send("QUIT")
+        # The between-round countdown now deals to nobody: broke cannot bet.
+        self.assertIsNotNone(broke.wait(is_type(P.ERROR)))
+        self.assertIsNotNone(broke.wait(is_type(P.ERROR), timeout=3))
+        rich = self.connect("rich")
+        self.assertIsNotNone(rich.wait(is_type(P.ROUND_START)))
+
+
+class ThreadedServerTest(ServerTest, unittest.TestCase):
+    engine = "thread"
+
+
+class AsyncServerTest(ServerTest, unittest.TestCase):
+    engine = "asyncio"
+
+
+if __name__ == "__main__":
+    unittest.main()
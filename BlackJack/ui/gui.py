@@ -2,19 +2,13 @@ import tkinter as tk
 from tkinter import ttk, font
 import sv_ttk
 from network.client import BlackjackClient
+from network import protocol as P
 import platform
-import re
 import time
+from collections import deque
 
-COUNTDOWN_RE = re.compile(r"^GAME_COUNTDOWN (\d+)$")
-TURN_RE = re.compile(r"^TURN:\s+(.+)$")
-STATE_RE = re.compile(r"^STATE:\s+(.+)$")
-RESULT_RE = re.compile(r"^RESULT:\s+(.+?)\s+(WIN|LOSE|PUSH)$", re.IGNORECASE)
-SUMMARY_RE = re.compile(r"^RESULT_SUMMARY:")
-EVENT_RE = re.compile(r"^EVENT:\s+(JOIN|LEAVE|JOIN_WAIT)\s+(.+)$")
-ACTION_RE = re.compile(r"^ACTION:\s+(HIT|STAND|BUST)\s+([^\s]+)(?:\s+(.*))?$")
-PING_RE = re.compile(r"^PING$")
-NAME_RE = re.compile(r"^NAME:\s*(.+)$")
+PUMP_INTERVAL_MS = 50   # how often the receive queue is drained
+PUMP_BUDGET = 0.02      # seconds of handling per tick before yielding to Tk
 
 class BlackjackGUI(tk.Tk):
     def __init__(self):
@@ -23,11 +17,19 @@ class BlackjackGUI(tk.Tk):
         self.geometry("880x600")
 
         self.client = BlackjackClient()
-        self.q = []
+        self.q = deque()           # filled by the receive thread, drained by _pump
+        self._dirty = set()        # row names changed since the last flush
+        self._full = False         # re-check every row (after a snapshot)
+        self._rendered = {}        # iid -> values currently shown in the tree
+        self._log_buf = []         # (text, tag, ...) pending for the log widget
+        self._buttons_dirty = False
         self.players = {}
-        self.dealer = {"cards":"", "value":"", "hidden":True}
+        self.dealer = {"cards":[], "value":"", "hidden":True}
         self.turn = ""
+        self.seq = None
         self.connected = False
+        self.spectating = False
+        self.insurance_offered = False
         self._ping_start_ns = None
 
         if platform.system() == "Windows":
@@ -37,21 +39,37 @@ class BlackjackGUI(tk.Tk):
         self.host_var = tk.StringVar(value="127.0.0.1")
         self.port_var = tk.StringVar(value="5555")
         self.name_var = tk.StringVar(value="Player")
+        self.binary_var = tk.BooleanVar(value=True)
         ttk.Entry(top, textvariable=self.host_var, width=12).pack(side="left")
         ttk.Entry(top, textvariable=self.port_var, width=6).pack(side="left", padx=4)
         ttk.Entry(top, textvariable=self.name_var, width=12).pack(side="left")
+        ttk.Checkbutton(top, text="Binary", variable=self.binary_var).pack(side="left", padx=4)
         self.btn_connect = ttk.Button(top, text="Connect", command=self.on_connect)
         self.btn_connect.pack(side="left", padx=4)
+        self.btn_watch = ttk.Button(top, text="Watch", command=lambda: self.on_connect(watch=True))
+        self.btn_watch.pack(side="left", padx=(0, 4))
         self.btn_hit = ttk.Button(top, text="Hit", command=lambda: self.send("HIT"))
         self.btn_stand = ttk.Button(top, text="Stand", command=lambda: self.send("STAND"))
+        self.btn_hint = ttk.Button(top, text="Hint", command=lambda: self.send("HINT"))
         self.btn_ping = ttk.Button(top, text="Ping", command=self.ping)
-        self.btn_hit.pack(side="left"); self.btn_stand.pack(side="left"); self.btn_ping.pack(side="left")
+        self.btn_double = ttk.Button(top, text="Double", command=lambda: self.send("DOUBLE"))
+        self.btn_split = ttk.Button(top, text="Split", command=lambda: self.send("SPLIT"))
+        self.btn_surrender = ttk.Button(top, text="Surrender", command=lambda: self.send("SURRENDER"))
+        self.btn_insure = ttk.Button(top, text="Insure", command=lambda: self.answer_insurance("INSURE"))
+        self.btn_decline = ttk.Button(top, text="No Insurance", command=lambda: self.answer_insurance("DECLINE"))
+        self.btn_hit.pack(side="left"); self.btn_stand.pack(side="left"); self.btn_hint.pack(side="left"); self.btn_ping.pack(side="left")
+        for b in (self.btn_double, self.btn_split, self.btn_surrender, self.btn_insure, self.btn_decline):
+            b.pack(side="left")
+        self.bet_var = tk.StringVar(value="10")
+        ttk.Entry(top, textvariable=self.bet_var, width=5).pack(side="left", padx=(8, 0))
+        self.btn_bet = ttk.Button(top, text="Bet", command=lambda: self.send(f"BET {self.bet_var.get().strip()}"))
+        self.btn_bet.pack(side="left")
         self.count_var = tk.StringVar()
         ttk.Label(top, textvariable=self.count_var, foreground="white").pack(side="right")
 
         mid = ttk.Frame(self); mid.pack(fill="both", expand=True, padx=8, pady=4)
-        self.tree = ttk.Treeview(mid, columns=("Name","Cards","Value","Status", "Ping"), show="headings", height=14)
-        for c in ("Name","Cards","Value","Status", "Ping"):
+        self.tree = ttk.Treeview(mid, columns=("Name","Cards","Value","Status","Ping","Chips"), show="headings", height=14)
+        for c in ("Name","Cards","Value","Status","Ping","Chips"):
             self.tree.heading(c, text=c)
             self.tree.column(c, width=160 if c=="Cards" else 80, anchor="w")
         self.tree.pack(side="left", fill="both", expand=True)
@@ -70,71 +88,97 @@ class BlackjackGUI(tk.Tk):
         self.log.tag_config("error", foreground="#ff0000", underline=1)
 
 
-        self.after(100, self._pump)
+        self.after(PUMP_INTERVAL_MS, self._pump)
         self._update_buttons()
 
     def ping(self):
         self._ping_start_ns = time.perf_counter_ns()
         self.send("PING")
-        print("Ping sent")
 
-    def on_connect(self):
+    def answer_insurance(self, word):
+        self.insurance_offered = False
+        self._buttons_dirty = True
+        self.send(word)
+
+    def on_connect(self, watch=False):
         if self.connected: return
-        self.client.connect(self.host_var.get(), int(self.port_var.get()), self.name_var.get(), self._on_message)
+        name = P.WATCH if watch else self.name_var.get()
+        self.client.connect(self.host_var.get(), int(self.port_var.get()), name, self._on_message,
+                            binary=self.binary_var.get())
         self.connected = True
+        self.spectating = watch
         self._update_buttons()
 
     def send(self, cmd):
         if not self.connected: return
         self.client.send(cmd.strip())
 
-    def _on_message(self, text):
-        for line in text.splitlines():
-            self.q.append(line)
+    def _on_message(self, msg):
+        # Called on the receive thread; deque.append is atomic.
+        self.q.append(msg)
 
     def _pump(self):
-        while self.q:
-            self._handle_line(self.q.pop(0))
-        self.after(100, self._pump)
+        """Handle queued messages for up to PUMP_BUDGET seconds, then redraw once."""
+        deadline = time.perf_counter() + PUMP_BUDGET
+        while self.q and time.perf_counter() < deadline:
+            self._handle_msg(self.q.popleft())
+        self._flush()
+        # Come straight back if the budget ran out with messages still queued.
+        self.after(1 if self.q else PUMP_INTERVAL_MS, self._pump)
 
-    def _handle_line(self, line):
-        m = COUNTDOWN_RE.match(line)
-        if m:
-            self.count_var.set(f"Starting in {m.group(1)}s")
+    def _handle_msg(self, msg):
+        t = msg[0]
+        if t == P.COUNTDOWN:
+            self.count_var.set(f"Starting in {msg[1]}s")
             return
-        if line == "GAME_START":
+        if t == P.GAME_START:
             self.count_var.set("")
             return
-        tm = TURN_RE.match(line)
-        if tm:
-            self.turn = tm.group(1)
-            self._rebuild()
-            self._update_buttons()
+        if t == P.TURN:
+            self._set_turn(msg[1])
+            return
+        if t == P.SNAPSHOT:
+            self.seq = msg[1]
+            self.players = {}
+            self.dealer = {"cards":[], "value":"", "hidden":True}
+            self.turn = ""
+            self._full = True
+            self._buttons_dirty = True
+            return
+        if t in (P.STATE_PLAYER, P.STATE_DEALER):
+            self._update_state(msg)
+            return
+        if t == P.DELTA:
+            self._apply_delta(msg)
             return
-        sm = STATE_RE.match(line)
-        if sm:
-            self._update_state_line(line)
+        if t == P.CHIPS:
+            _, name, chips, bet = msg
+            self.players.setdefault(name, {"cards":[], "value":"", "ping": ""})["chips"] = f"{chips} ({bet})"
+            self._dirty.add(name)
             return
-        rm = RESULT_RE.match(line)
-        if rm:
+        line = P.to_text(msg)
+        if t == P.RESULT:
             self._log(line, "result_push")
             return
-        if SUMMARY_RE.match(line):
+        if t == P.RESULT_SUMMARY:
             self._log(line, "header")
             return
-        em = EVENT_RE.match(line)
-        if em:
+        if t == P.EVENT:
             self._log(line, "event")
+            if msg[1] == P.JOIN and msg[2] not in self.players:
+                self.players[msg[2]] = {"cards":[], "value":"", "ping": ""}
+                self._dirty.add(msg[2])
+            elif msg[1] == P.LEAVE and self.players.pop(msg[2], None) is not None:
+                self._dirty.add(msg[2])
             return
-        am = ACTION_RE.match(line)
-        if am:
+        if t == P.ACTION:
+            if msg[1] == P.ACT_INSURANCE:
+                self.insurance_offered = True
+                self._buttons_dirty = True
             self._log(line, "action")
             return
-        pm = PING_RE.match(line)
-        if pm:
-            print("Ping returned!")
-            #Set ping value to timer
-            if hasattr(self, "_ping_start_ns"):
+        if t == P.PING:
+            if self._ping_start_ns is not None:
                 elapsed_ns = time.perf_counter_ns() - self._ping_start_ns
                 self.ping_ms = round(elapsed_ns / 1_000_000)  # ns -> ms (float)
             else:
@@ -142,83 +186,142 @@ class BlackjackGUI(tk.Tk):
             my_name = self.name_var.get()
             if my_name in self.players:
                 self.players[my_name]["ping"] = self.ping_ms
-            self._rebuild()
+                self._dirty.add(my_name)
             return
-        nm = NAME_RE.match(line)
-        if nm:
-            self.name_var.set(nm.group(1))
+        if t == P.HINT:
+            self._log(line, "turn")
             return
-        if line in ("ROUND_START","ROUND_END"):
+        if t == P.NAME:
+            self.name_var.set(msg[1])
+            return
+        if t == P.RESUME_TOKEN:
+            return      # the client keeps it for reconnecting
+        if t in (P.ROUND_START, P.ROUND_END):
+            # The snapshot that follows ROUND_START replaces the table contents.
+            self.insurance_offered = False
+            self._buttons_dirty = True
             self._log(line, "header")
-            if line == "ROUND_START":
-                self.players = {}
-                self.dealer = {"cards":"", "value":"", "hidden":True}
-                self.turn = ""
-                self._rebuild()
             return
         self._log(line, "header")
 
-    def _update_state_line(self, line):
-        body = line[len("STATE:"):].strip()
-        parts = [p.strip() for p in body.split("|")]
-        header = parts[0]
-        cards = parts[1] if len(parts) > 1 else ""
-        value_part = parts[2] if len(parts) > 2 else ""
-        tokens = header.split()
-        role = tokens[0].upper()
-        if role == "PLAYER":
-            name = " ".join(tokens[1:])
-            val = ""
-            if value_part.startswith("VALUE="):
-                val = value_part.split("=",1)[1]
-            self.players[name] = {"cards":cards, "value":val, "ping": ""}
-        elif role == "DEALER":
-            hidden = tokens[1].upper() == "HIDDEN"
-            if hidden:
-                self.dealer = {"cards":cards, "value":"", "hidden":True}
+    def _update_state(self, msg):
+        if msg[0] == P.STATE_PLAYER:
+            _, name, cards, val = msg
+            old = self.players.get(name, {})
+            self.players[name] = {"cards":list(cards), "value":str(val), "ping": old.get("ping", ""),
+                                  "chips": old.get("chips", "")}
+            self._dirty.add(name)
+        else:
+            _, hidden, cards, val = msg
+            self.dealer = {"cards":list(cards), "value":"" if hidden else str(val), "hidden":hidden}
+            self._dirty.add("Dealer")
+
+    def _apply_delta(self, msg):
+        _, seq, kind, name, card, val = msg
+        if self.seq is None:
+            return
+        if seq != self.seq + 1:
+            # Missed an update: drop deltas until the requested snapshot arrives.
+            self.seq = None
+            self.send("RESYNC")
+            return
+        self.seq = seq
+        if kind == P.D_TURN:
+            self._set_turn(name)
+            return
+        if kind == P.D_REVEAL:
+            self.dealer["hidden"] = False
+            name = "Dealer"
+        if kind == P.D_SPLIT:
+            # The split-off card leaves the hand whose turn it is for a new hand.
+            source = self.players.get(self.turn)
+            if source is not None and source["cards"]:
+                source["cards"].pop()
+                self._dirty.add(self.turn)
+            self.players[name] = {"cards":[card], "value":str(val), "ping": ""}
+            self._dirty.add(name)
+            return
+        entry = self.dealer if name == "Dealer" else self.players.setdefault(name, {"cards":[], "value":"", "ping": ""})
+        entry["cards"].append(card)
+        entry["value"] = str(val)
+        self._dirty.add(name)
+
+    def _set_turn(self, name):
+        if self.insurance_offered:
+            self.insurance_offered = False     # play has started: the offer is over
+        self._dirty.update((self.turn, name))
+        self.turn = name
+        self._buttons_dirty = True
+
+    def _iid(self, name):
+        return "dealer" if name == "Dealer" else f"p:{name}"
+
+    def _row_values(self, name):
+        mark = " ←" if self.turn == name else ""
+        if name == "Dealer":
+            d = self.dealer
+            return ("Dealer"+mark, P.cards_text(d["cards"]), d["value"], "Hidden" if d["hidden"] else "")
+        p = self.players[name]
+        status = ""
+        if p["value"] and int(p["value"]) > 21:
+            status = "Bust"
+        return (name + mark, P.cards_text(p["cards"]), p["value"], status, p["ping"], p.get("chips", ""))
+
+    def _flush(self):
+        """Apply everything handled this tick in one pass: append buffered log
+        lines, and touch only the table rows whose displayed values changed."""
+        if self._log_buf:
+            self.log.insert("end", *self._log_buf)
+            self.log.see("end")
+            self._log_buf = []
+        if self._buttons_dirty:
+            self._buttons_dirty = False
+            self._update_buttons()
+        if not (self._dirty or self._full):
+            return
+        wanted = ["Dealer"] + sorted(self.players)
+        keep = {self._iid(n) for n in wanted}
+        gone = [iid for iid in self._rendered if iid not in keep]
+        if gone:
+            self.tree.delete(*gone)
+            for iid in gone:
+                del self._rendered[iid]
+        for index, name in enumerate(wanted):
+            if not (self._full or name in self._dirty):
+                continue
+            iid = self._iid(name)
+            values = self._row_values(name)
+            old = self._rendered.get(iid)
+            if old == values:
+                continue
+            if old is None:
+                # Rows are inserted in sorted order, so index is the final position.
+                self.tree.insert("", index, iid=iid, values=values)
             else:
-                val = ""
-                if value_part.startswith("VALUE="):
-                    val = value_part.split("=",1)[1]
-                self.dealer = {"cards":cards, "value":val, "hidden":False}
-        self._rebuild()
-
-    def _rebuild(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        dealer_status = "Hidden" if self.dealer.get("hidden") else ""
-        
-        turn_mark = " ←" if self.turn == "Dealer" else ""
-        self.tree.insert("", "end", values=("Dealer"+turn_mark, self.dealer["cards"], self.dealer["value"], dealer_status))
-        for name in sorted(self.players.keys()):
-            p = self.players[name]
-            status = ""
-            if p["value"] and int(p["value"]) > 21:
-                status = "Bust"
-            mark = " ←" if self.turn == name else ""
-            print(self.players)
-            ping = self.players[name]["ping"]
-            self.tree.insert("", "end", values=(name + mark, p["cards"], p["value"], status, ping))
+                self.tree.item(iid, values=values)
+            self._rendered[iid] = values
+        self._dirty.clear()
+        self._full = False
 
     def _update_buttons(self):
         my_name = self.name_var.get()
-        my_turn = (self.turn == my_name)
-        state_ok = self.connected and my_turn
-        if state_ok:
-            self.btn_hit.state(["!disabled"])
-            self.btn_stand.state(["!disabled"])
-            
-        else:
-            self.btn_hit.state(["disabled"])
-            self.btn_stand.state(["disabled"])
+        my_turn = (P.hand_owner(self.turn) == my_name)
+        state_ok = self.connected and my_turn and not self.spectating
+        for b in (self.btn_hit, self.btn_stand, self.btn_hint, self.btn_double, self.btn_split, self.btn_surrender):
+            b.state(["!disabled"] if state_ok else ["disabled"])
+        insure_ok = self.connected and self.insurance_offered and not self.spectating
+        self.btn_insure.state(["!disabled"] if insure_ok else ["disabled"])
+        self.btn_decline.state(["!disabled"] if insure_ok else ["disabled"])
+        self.btn_bet.state(["!disabled"] if self.connected and not self.spectating else ["disabled"])
         if self.connected:
             self.btn_ping.state(["!disabled"])
+            self.btn_watch.state(["disabled"])
         else:
             self.btn_ping.state(["disabled"])
+            self.btn_watch.state(["!disabled"])
 
     def _log(self, line, font_tag):
-        self.log.insert("end", f"{line}\n", font_tag)
-        self.log.see("end")
+        self._log_buf += (f"{line}\n", font_tag)
 
 def run_gui():
     app = BlackjackGUI()
@@ -16,15 +16,19 @@ def run_text_ui():
         player = Player("Player")
         rnd = Round(deck, player, Dealer())
 
-        result = rnd.play()
+        results = rnd.play()
 
         print("\n" + "-" * 40)
-        if result == "Player":
-            print("Player wins!")
-        elif result == "Dealer":
-            print("Dealer wins!")
-        else:
-            print("Push (tie).")
+        for i, result in enumerate(results, 1):
+            prefix = f"Hand {i}: " if len(results) > 1 else ""
+            if result == "Player":
+                print(prefix + "Player wins!")
+            elif result == "Dealer":
+                print(prefix + "Dealer wins!")
+            elif result == "Surrender":
+                print(prefix + "Surrendered (half the bet back).")
+            else:
+                print(prefix + "Push (tie).")
         print("-" * 40)
 
         again = input("Play again? (y/n): ").strip().lower()